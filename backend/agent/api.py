@@ -13,6 +13,8 @@ from agentpress.thread_manager import ThreadManager
 from services.supabase import DBConnection
 from services import redis
 from agent.run import run_agent
+from agent.run_stream import RunResponseChannel, to_sse_frame, parse_last_event_id
+from agent.redis_run_stream import RedisRunStreamWriter, get_remote_run_channel, load_run_stream, run_stream_backfill
 from agentpress.agent_orchestrator import AgentOrchestrator
 from utils.auth_utils import get_current_user_id, get_user_id_from_stream_auth, verify_thread_access
 from utils.logger import logger
@@ -28,7 +30,7 @@ thread_manager = None
 db = None 
 
 # In-memory storage for active agent runs and their responses
-active_agent_runs: Dict[str, List[Any]] = {}
+active_agent_runs: Dict[str, RunResponseChannel] = {}
 
 # In the original Suna code multiple provider aliases were supported via
 # `MODEL_NAME_ALIASES`.  Iris intentionally removes multi‑model support and
@@ -85,6 +87,13 @@ async def cleanup():
             await stop_agent_run(agent_run_id)
     except Exception as e:
         logger.error(f"Failed to clean up running agent runs: {str(e)}")
+
+    # Write any queued (write-behind) messages before shutting down
+    if thread_manager is not None:
+        try:
+            await thread_manager.flush_messages()
+        except Exception as e:
+            logger.error(f"Failed to flush queued messages on shutdown: {str(e)}")
     
     # Close Redis connection
     await redis.close()
@@ -100,8 +109,7 @@ async def update_agent_run_status(
     client,
     agent_run_id: str,
     status: str,
-    error: Optional[str] = None,
-    responses: Optional[List[Any]] = None
+    error: Optional[str] = None
 ) -> bool:
     """
     Centralized function to update agent run status.
@@ -260,6 +268,8 @@ async def get_agent_run_with_access_check(client, agent_run_id: str, user_id: st
 async def _cleanup_agent_run(agent_run_id: str):
     """Clean up Redis keys when an agent run is done."""
     logger.debug(f"Cleaning up Redis keys for agent run: {agent_run_id}")
+    # The finished run's log stays available from its Redis Stream
+    active_agent_runs.pop(agent_run_id, None)
     try:
         await redis.delete(f"active_run:{instance_id}:{agent_run_id}")
         logger.debug(f"Successfully cleaned up Redis keys for agent run: {agent_run_id}")
@@ -321,8 +331,12 @@ async def start_agent(
     agent_run_id = agent_run.data[0]['id']
     logger.info(f"Created new agent run: {agent_run_id}")
     
-    # Initialize in-memory storage for this agent run
-    active_agent_runs[agent_run_id] = []
+    # Initialize in-memory storage for this agent run, mirrored to a Redis Stream
+    # so other instances can serve the stream
+    active_agent_runs[agent_run_id] = RunResponseChannel(
+        writer=RedisRunStreamWriter(agent_run_id),
+        backfill=run_stream_backfill(agent_run_id)
+    )
     
     # Register this run in Redis with TTL
     try:
@@ -469,10 +483,16 @@ async def get_agent_run(
 async def stream_agent_run(
     agent_run_id: str, 
     token: Optional[str] = None,
+    last_event_id: Optional[str] = None,
     request: Request = None,
     _: bool = Depends(check_resources_initialized)
 ):
-    """Stream the responses of an agent run from in-memory storage or reconnect to ongoing run."""
+    """Stream the responses of an agent run from in-memory storage or reconnect to ongoing run.
+
+    Runs executing on another instance are streamed from their Redis Stream. A
+    reconnecting client only receives the responses after its Last-Event-ID
+    (header, or last_event_id query parameter for clients that can't set it).
+    """
     logger.info(f"Starting stream for agent run: {agent_run_id}")
     client = await db.get_client()
     
@@ -481,62 +501,47 @@ async def stream_agent_run(
     
     # Verify user has access to the agent run and get run data
     agent_run_data = await get_agent_run_with_access_check(client, agent_run_id, user_id)
+
+    header_event_id = request.headers.get("last-event-id") if request else None
+    resume_after = parse_last_event_id(header_event_id or last_event_id)
     
     # Define a streaming generator that uses in-memory responses
     async def stream_generator():
         logger.debug(f"Streaming responses for agent run: {agent_run_id}")
         
         # Recommend client auto-retry interval for SSE reconnects
-        yield "retry: 1000\n\n"
+        yield b"retry: 1000\n\n"
 
-        last_ping_time = datetime.now(timezone.utc)
+        # Check if this is an active run with stored responses, on this instance
+        # or (via its Redis Stream) on another one
+        channel = active_agent_runs.get(agent_run_id)
+        follow = agent_run_data['status'] == 'running'
+        if channel is None:
+            if follow:
+                # The follower closes the channel when the run's end marker arrives
+                channel = await get_remote_run_channel(agent_run_id)
+            else:
+                channel = await load_run_stream(agent_run_id)
+        if channel is not None:
+            logger.debug(f"Sending responses after event {resume_after} for agent run: {agent_run_id}")
 
-        # Check if this is an active run with stored responses
-        if agent_run_id in active_agent_runs:
-            # First, send all existing responses
-            stored_responses = active_agent_runs[agent_run_id]
-            logger.debug(f"Sending {len(stored_responses)} existing responses for agent run: {agent_run_id}")
-            
-            for response in stored_responses:
-                yield f"data: {json.dumps(response)}\n\n"
-            
-            # If the run is still active (status is running), set up to stream new responses
-            if agent_run_data['status'] == 'running':
-                # Get the current length to know where to start watching for new responses
-                current_length = len(stored_responses)
-                
-                # Keep checking for new responses
-                while agent_run_id in active_agent_runs:
-                    # Check if there are new responses
-                    if len(active_agent_runs[agent_run_id]) > current_length:
-                        # Send all new responses
-                        for i in range(current_length, len(active_agent_runs[agent_run_id])):
-                            response = active_agent_runs[agent_run_id][i]
-                            yield f"data: {json.dumps(response)}\n\n"
-                        
-                        # Update current length
-                        current_length = len(active_agent_runs[agent_run_id])
-                    
-                    # Send a heartbeat ping every ~10s to keep connections alive through proxies
-                    now = datetime.now(timezone.utc)
-                    if (now - last_ping_time).total_seconds() >= 10:
-                        try:
-                            yield "data: {\"type\":\"ping\"}\n\n"
-                        except Exception:
-                            # If client disconnected, just allow generator to end naturally
-                            break
-                        last_ping_time = now
-                    
-                    # Brief pause before checking again
-                    await asyncio.sleep(0.1)
+            async def still_running() -> bool:
+                # A run whose instance died never closes its channel
+                result = await client.table('agent_runs').select('status').eq('id', agent_run_id).execute()
+                return bool(result.data) and result.data[0]['status'] == 'running'
+
+            # Send the missed responses, then (while the run is still running) each new
+            # response as soon as it is published, with periodic heartbeat pings
+            async for frame in channel.subscribe(start=resume_after, follow=follow, still_running=still_running):
+                yield frame
         else:
             # If the run is not active or we don't have stored responses,
             # send a message indicating the run is not available for streaming
             logger.warning(f"Agent run {agent_run_id} not found in active runs")
-            yield f"data: {json.dumps({'type': 'status', 'status': agent_run_data['status'], 'message': 'Run data not available for streaming'})}\n\n"
+            yield to_sse_frame({'type': 'status', 'status': agent_run_data['status'], 'message': 'Run data not available for streaming'})
         
         # Always send a completion status at the end
-        yield f"data: {json.dumps({'type': 'status', 'status': 'completed'})}\n\n"
+        yield to_sse_frame({'type': 'status', 'status': 'completed'})
         logger.debug(f"Streaming complete for agent run: {agent_run_id}")
     
     # Return a streaming response
@@ -622,7 +627,9 @@ async def run_agent_background(
                             "mode": "simple"
                         }
                         if agent_run_id in active_agent_runs:
-                            active_agent_runs[agent_run_id].append(completion_message)
+                            active_agent_runs[agent_run_id].publish(completion_message)
+                            active_agent_runs[agent_run_id].close()
+                        await thread_manager.flush_messages()
                         
                         logger.info(f"Simple response completed for thread: {thread_id}")
                         return
@@ -758,27 +765,24 @@ async def run_agent_background(
             enable_context_manager=enable_context_manager
         )
         
-        # Collect all responses to save to database
-        all_responses = []
-        
         async for response in agent_gen:
             # Check if stop signal received
             if stop_signal_received:
                 logger.info(f"Agent run stopped due to stop signal: {agent_run_id} (instance: {instance_id})")
-                await update_agent_run_status(client, agent_run_id, "stopped", responses=all_responses)
+                await update_agent_run_status(client, agent_run_id, "stopped")
                 break
                 
             # Check for billing error status
             if response.get('type') == 'status' and response.get('status') == 'error':
                 error_msg = response.get('message', '')
                 logger.info(f"Agent run failed with error: {error_msg} (instance: {instance_id})")
-                await update_agent_run_status(client, agent_run_id, "failed", error=error_msg, responses=all_responses)
+                await update_agent_run_status(client, agent_run_id, "failed", error=error_msg)
                 break
                 
-            # Store response in memory
+            # Store response in the run log (kept bounded in memory and persisted
+            # incrementally to the run's Redis Stream)
             if agent_run_id in active_agent_runs:
-                active_agent_runs[agent_run_id].append(response)
-                all_responses.append(response)
+                active_agent_runs[agent_run_id].publish(response)
                 total_responses += 1
         
         # Signal all done if we weren't stopped
@@ -793,11 +797,10 @@ async def run_agent_background(
                 "message": "Agent run completed successfully"
             }
             if agent_run_id in active_agent_runs:
-                active_agent_runs[agent_run_id].append(completion_message)
-                all_responses.append(completion_message)
+                active_agent_runs[agent_run_id].publish(completion_message)
             
             # Update the agent run status
-            await update_agent_run_status(client, agent_run_id, "completed", responses=all_responses)
+            await update_agent_run_status(client, agent_run_id, "completed")
             
             # Notify any clients monitoring the control channels that we're done
             try:
@@ -822,19 +825,14 @@ async def run_agent_background(
             "message": error_message
         }
         if agent_run_id in active_agent_runs:
-            active_agent_runs[agent_run_id].append(error_response)
-            if 'all_responses' in locals():
-                all_responses.append(error_response)
-            else:
-                all_responses = [error_response]
+            active_agent_runs[agent_run_id].publish(error_response)
         
         # Update the agent run with the error
         await update_agent_run_status(
             client, 
             agent_run_id, 
             "failed", 
-            error=f"{error_message}\n{traceback_str}",
-            responses=all_responses
+            error=f"{error_message}\n{traceback_str}"
         )
         
         # Notify any clients of the error
@@ -847,6 +845,22 @@ async def run_agent_background(
             logger.warning(f"Failed to publish ERROR signals: {str(e)}")
             
     finally:
+        # End the SSE streams of all subscribers and write the end marker to Redis
+        channel = active_agent_runs.get(agent_run_id)
+        if channel is not None:
+            channel.close()
+            try:
+                if channel.writer is not None:
+                    await channel.writer.wait_closed()
+            except Exception as e:
+                logger.warning(f"Failed to finish Redis stream for agent run {agent_run_id}: {str(e)}")
+
+        # Durably write queued messages, including when the run was cancelled or stopped
+        try:
+            await thread_manager.flush_messages()
+        except Exception as e:
+            logger.error(f"Failed to flush queued messages for agent run {agent_run_id}: {str(e)}")
+
         # Ensure we always clean up the pubsub and stop checker
         if stop_checker:
             try:
@@ -0,0 +1,200 @@
+"""
+Latest browser state of a thread, as shown to the LLM on each iteration.
+
+browser_state messages hold a reference to their screenshot in the blob store
+(see services.blob_store) rather than the image itself. The run loop keeps the
+most recent frame in memory: if no new browser_state was written, the previous
+temporary message is reused as is, and a screenshot is only downloaded when
+its hash differs from the frame already held.
+
+The browser API reports interactive elements as a diff against the previous
+action's state (see dom_version / dom_base_version). The full element list is
+rebuilt here by applying each diff to the list already held, replaying the
+rows since the last full snapshot when a state was missed.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Set
+
+from services.blob_store import BlobStore, get_blob_store
+from utils.logger import logger
+
+# Large fields left out of the text part of the browser state
+_SCREENSHOT_FIELDS = ("screenshot_base64", "screenshot", "screenshot_url", "screenshot_url_base64")
+# Element fields, rendered separately as one line per element
+_DOM_FIELDS = ("interactive_elements", "dom_version", "dom_base_version", "dom_diff")
+_ELEMENT_ATTRIBUTES = ("id", "href", "src", "alt", "placeholder", "name", "role", "title", "type")
+# How far back to look for the last full element snapshot
+DOM_REPLAY_LIMIT = 50
+
+
+def format_elements(elements: Dict[int, Dict[str, Any]], changed: Set[int]) -> str:
+    """One line per interactive element, with new or changed ones marked by *"""
+    lines = []
+    for index in sorted(elements):
+        element = elements[index]
+        tag = element.get("tag_name", "")
+        attributes = "".join(f' {name}="{element[name]}"' for name in _ELEMENT_ATTRIBUTES if element.get(name))
+        text = (element.get("text") or "").replace("\n", " ")
+        marker = "*" if index in changed else ""
+        offscreen = "" if element.get("is_in_viewport", True) else " (offscreen)"
+        lines.append(f"{marker}[{index}]<{tag}{attributes}>{text}</{tag}>{offscreen}")
+    return "\n".join(lines)
+
+
+class LatestBrowserState:
+    """Builds the temporary browser state message for a thread's run loop."""
+
+    def __init__(self, thread_id: str, store: Optional[BlobStore] = None):
+        self.thread_id = thread_id
+        self.store = store
+        self.message_id: Optional[str] = None
+        self.message: Optional[Dict[str, Any]] = None
+        self._screenshot_key: Optional[str] = None
+        self._image_url: Optional[str] = None
+        self.screenshot_downloads = 0
+        # Interactive elements by index as of _dom_version
+        self._elements: Optional[Dict[int, Dict[str, Any]]] = None
+        self._dom_version: Optional[str] = None
+        self.dom_replays = 0
+
+    async def temporary_message(self, client) -> Optional[Dict[str, Any]]:
+        """Return the user message describing the latest browser state, if any."""
+        result = await client.table('messages') \
+            .select('message_id, content') \
+            .eq('thread_id', self.thread_id) \
+            .eq('type', 'browser_state') \
+            .order('created_at', desc=True) \
+            .limit(1) \
+            .execute()
+        if not result.data:
+            return None
+
+        row = result.data[0]
+        if self.message_id is not None and row.get('message_id') == self.message_id:
+            return self.message
+
+        try:
+            content = row['content']
+            content = json.loads(content) if isinstance(content, str) else dict(content)
+        except Exception as e:
+            logger.error(f"Error parsing browser state: {e}")
+            return None
+
+        self.message_id = row.get('message_id')
+        self.message = await self._build_message(client, content)
+        return self.message
+
+    async def _build_message(self, client, content: Dict[str, Any]) -> Dict[str, Any]:
+        browser_state = {k: v for k, v in content.items() if k not in _SCREENSHOT_FIELDS + _DOM_FIELDS}
+        elements_text = await self._elements_text(client, content)
+        image_url = await self._image_url_for(content)
+
+        message: Dict[str, Any] = {"role": "user", "content": []}
+        if browser_state or elements_text:
+            text = f"The following is the current state of the browser:\n{browser_state}"
+            if elements_text:
+                text += f"\n\nInteractive elements ([index]<tag>, * = new or changed since the previous action):\n{elements_text}"
+            message["content"].append({"type": "text", "text": text})
+        if image_url:
+            message["content"].append({
+                "type": "image_url",
+                "image_url": {"url": image_url}
+            })
+        return message
+
+    async def _elements_text(self, client, content: Dict[str, Any]) -> str:
+        if "interactive_elements" not in content and "dom_diff" not in content:
+            return ""
+        changed = self._apply_dom_state(content)
+        if changed is None:
+            changed = await self._replay_dom_states(client, content)
+        return format_elements(self._elements or {}, changed)
+
+    def _apply_dom_state(self, content: Dict[str, Any]) -> Optional[Set[int]]:
+        """Update the held elements from a browser state.
+
+        Returns the indices of new or changed elements, or None if the state is
+        a diff against a version other than the one held.
+        """
+        base_version = content.get("dom_base_version")
+        if base_version is None:
+            elements = content.get("interactive_elements") or []
+            self._elements = {element.get("index"): element for element in elements}
+            changed: Set[int] = set()
+        elif self._elements is not None and base_version == self._dom_version:
+            diff = content.get("dom_diff") or {}
+            for index in diff.get("removed", []):
+                self._elements.pop(index, None)
+            updated: List[Dict[str, Any]] = diff.get("added", []) + diff.get("changed", [])
+            for element in updated:
+                self._elements[element.get("index")] = element
+            changed = {element.get("index") for element in updated}
+        else:
+            return None
+        self._dom_version = content.get("dom_version")
+        return changed
+
+    async def _replay_dom_states(self, client, content: Dict[str, Any]) -> Set[int]:
+        """Rebuild the element list from the last full snapshot onwards."""
+        self.dom_replays += 1
+        result = await client.table('messages') \
+            .select('message_id, content') \
+            .eq('thread_id', self.thread_id) \
+            .eq('type', 'browser_state') \
+            .order('created_at', desc=True) \
+            .limit(DOM_REPLAY_LIMIT) \
+            .execute()
+
+        # Newest first: collect states back to the last full snapshot
+        chain = []
+        for row in result.data or []:
+            try:
+                state = row['content']
+                state = json.loads(state) if isinstance(state, str) else state
+            except Exception:
+                break
+            chain.append(state)
+            if state.get("dom_base_version") is None:
+                break
+
+        self._elements, self._dom_version = None, None
+        changed: Optional[Set[int]] = set()
+        for state in reversed(chain):
+            changed = self._apply_dom_state(state)
+            if changed is None:
+                break
+
+        if changed is None or self._dom_version != content.get("dom_version"):
+            # No complete chain; show what the latest state itself describes
+            logger.warning(f"Could not rebuild browser elements for thread {self.thread_id} from a full snapshot")
+            diff = content.get("dom_diff") or {}
+            updated = diff.get("added", []) + diff.get("changed", [])
+            self._elements = {element.get("index"): element for element in updated}
+            self._dom_version = content.get("dom_version")
+            changed = set(self._elements)
+        return changed
+
+    async def _image_url_for(self, content: Dict[str, Any]) -> Optional[str]:
+        # Rows written before screenshots moved to the blob store carry the image inline
+        if content.get("screenshot_base64"):
+            return f"data:image/jpeg;base64,{content['screenshot_base64']}"
+
+        ref = content.get("screenshot")
+        if not isinstance(ref, dict) or not ref.get("sha256"):
+            return None
+        key = ref["sha256"]
+        if key == self._screenshot_key:
+            return self._image_url
+
+        try:
+            data = await (self.store or get_blob_store()).get(key)
+        except Exception as e:
+            logger.warning(f"Could not load screenshot {key} for thread {self.thread_id}: {str(e)}")
+            return None
+        self.screenshot_downloads += 1
+        content_type = ref.get("content_type", "image/jpeg")
+        self._screenshot_key = key
+        self._image_url = f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+        return self._image_url
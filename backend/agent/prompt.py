@@ -10,12 +10,16 @@ Use only the following XML tags for actions. Do not invent tags like <function-c
 
 **Files:**
 - <create-file file_path="...">CONTENT</create-file> - Create new files
+- <create-files>[{{"file_path": "...", "file_contents": "..."}}, ...]</create-files> - Create many files at once in one upload
 - <str-replace file_path="..."><old_str>...</old_str><new_str>...</new_str></str-replace> - Replace unique strings
+- <apply-patch file_path="...">@@ -10,3 +10,3 @@ ...</apply-patch> - Apply unified diff hunks to a file
+- <replace-lines file_path="..." start_line="N" end_line="M">NEW_LINES</replace-lines> - Replace a range of lines
 - <full-file-rewrite file_path="...">NEW_CONTENT</full-file-rewrite> - Replace entire file content
 - <delete-file file_path="..."></delete-file> - Remove files
 
 **Shell (Daytona):**
-- <execute-command [folder="subdir"] [session_name="default"] [timeout="60"]>ls -la</execute-command> - Run shell commands
+- <execute-command [folder="subdir"] [session_name="default"] [timeout="60"] [background="true"]>ls -la</execute-command> - Run shell commands; use background="true" for long installs, builds and servers
+- <check-command-output command_id="..." [offset="N"] [wait="30"]></check-command-output> - Status and output of a command (tail by default, from a byte offset if given)
 
 **Web search / crawl:**
 - <web-search query="..." [summary="true|false"] [max_results="N"]></web-search> - Search the web
@@ -161,7 +165,9 @@ You have the ability to execute operations using both Python and CLI tools:
 - Avoid commands requiring confirmation; actively use -y or -f flags for automatic confirmation
 - Avoid commands with excessive output; save to files when necessary
 - **IMPORTANT**: Shell commands are blocking by default - they will not return control until the command completes, which can cause timeouts with long-running operations
-- For non-blocking, long-running commands, use these simple approaches:
+- For long-running commands (installs, builds, test suites), prefer <execute-command background="true">: it returns a command_id at once, and <check-command-output command_id="..." wait="60"> follows the output until the command finishes
+- Command output in results is capped to its last part; the full output is kept in /workspace/.iris/logs/<command_id>.log
+- For servers and other processes that should outlive the command, use these simple approaches:
   1. Run a command in the background using `&`: `command &`
   2. Make a process immune to hangups: `nohup command > output.log 2>&1 &`
   3. Start a background process and get its PID: `command & echo $!`
@@ -0,0 +1,229 @@
+"""
+Cross-instance agent run streaming through Redis Streams.
+
+The instance executing a run appends every response to the stream
+agent_run:{agent_run_id}:responses (capped and with a TTL). Any other API
+instance can then serve stream_agent_run for that run: a single follower task
+per run and instance reads the stream with blocking XREAD and feeds a local
+RunResponseChannel, which fans frames out to that instance's SSE clients. One
+XREAD per run rather than per client keeps Redis connection usage bounded.
+The stream also backfills subscribers that fell behind a channel's bounded
+in-memory log (read_run_stream_range).
+
+Entry IDs are explicit so they line up with SSE event IDs:
+- 0-1 marks the start of the run
+- 1-<n> is response n (the SSE event ID), with field data holding its JSON
+- 2-0 marks the end of the run
+Consecutive content chunks queued in the same batch are persisted as one
+entry 1-<last> whose field first holds the first event ID it covers.
+"""
+
+import asyncio
+import functools
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from services import redis
+from agent.run_stream import RunResponseChannel, merge_content_chunk
+from utils.logger import logger
+
+RUN_STREAM_MAXLEN = int(os.getenv("IRIS_RUN_STREAM_MAXLEN", "10000"))
+RUN_STREAM_TTL = int(os.getenv("IRIS_RUN_STREAM_TTL", str(redis.REDIS_KEY_TTL)))
+# Blocking reads must return before the Redis client's 5 s socket timeout
+XREAD_BLOCK_MS = 4000
+XREAD_COUNT = 500
+
+START_ENTRY_ID = "0-1"
+END_ENTRY_ID = "2-0"
+
+# Channels fed from Redis for runs executing on other instances
+remote_run_channels: Dict[str, RunResponseChannel] = {}
+
+
+def run_stream_key(agent_run_id: str) -> str:
+    return f"agent_run:{agent_run_id}:responses"
+
+
+def response_entry_id(event_id: int) -> str:
+    return f"1-{event_id}"
+
+
+class RedisRunStreamWriter:
+    """Appends a run's responses to its Redis Stream from a background task.
+
+    Entries are queued without blocking the agent loop and written in
+    pipelined batches; content chunks waiting in the queue are merged.
+    """
+
+    def __init__(self, agent_run_id: str, maxlen: int = RUN_STREAM_MAXLEN, ttl: int = RUN_STREAM_TTL):
+        self.key = run_stream_key(agent_run_id)
+        self.maxlen = maxlen
+        self.ttl = ttl
+        self._pending: List[Tuple[str, Dict[str, str]]] = [(START_ENTRY_ID, {"start": "1"})]
+        # Content chunks queued after the last pending entry: key, template, first ID, last ID, texts
+        self._chunks: Optional[Tuple[str, Dict[str, Any], int, int, List[str]]] = None
+        self._closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def append(self, event_id: int, data: str) -> None:
+        if not self._closed:
+            self._queue_chunks()
+            self._pending.append((response_entry_id(event_id), {"data": data}))
+            self._wakeup.set()
+
+    def append_chunk(self, event_id: int, key: str, text: str, template: Dict[str, Any]) -> None:
+        if self._closed:
+            return
+        if self._chunks is not None and self._chunks[0] == key:
+            chunk_key, chunk_template, first_id, _, texts = self._chunks
+            texts.append(text)
+            self._chunks = (chunk_key, chunk_template, first_id, event_id, texts)
+        else:
+            self._queue_chunks()
+            self._chunks = (key, template, event_id, event_id, [text])
+        self._wakeup.set()
+
+    def _queue_chunks(self) -> None:
+        if self._chunks is None:
+            return
+        _, template, first_id, last_id, texts = self._chunks
+        self._chunks = None
+        data = json.dumps(merge_content_chunk(template, "".join(texts)))
+        fields = {"data": data}
+        if first_id != last_id:
+            fields["first"] = str(first_id)
+        self._pending.append((response_entry_id(last_id), fields))
+
+    def close(self) -> None:
+        if not self._closed:
+            self._queue_chunks()
+            self._pending.append((END_ENTRY_ID, {"end": "1"}))
+            self._closed = True
+            self._wakeup.set()
+
+    async def wait_closed(self) -> None:
+        """Wait until all queued entries, including the end marker, are written."""
+        await self._task
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            self._queue_chunks()
+            while self._pending:
+                batch = self._pending
+                self._pending = []
+                try:
+                    await redis.xadd_batch(self.key, batch, maxlen=self.maxlen, ex=self.ttl)
+                except Exception as e:
+                    # Local subscribers are unaffected; other instances miss these entries
+                    logger.error(f"Failed to append {len(batch)} entries to {self.key}: {str(e)}")
+            if self._closed:
+                return
+
+
+async def read_run_stream_range(agent_run_id: str, after_id: int, before_id: int) -> List[Tuple[int, str, Optional[int]]]:
+    """Read the persisted responses with after_id < event ID < before_id.
+
+    Returns (event_id, data, first_id) tuples; first_id is set for merged
+    content chunks. Entries trimmed from the stream are simply missing.
+    """
+    if before_id - after_id <= 1:
+        return []
+    entries = await redis.xrange(
+        run_stream_key(agent_run_id),
+        min=response_entry_id(after_id + 1),
+        max=response_entry_id(before_id - 1),
+    )
+    responses = []
+    for entry_id, fields in entries:
+        if "data" in fields:
+            first_id = int(fields["first"]) if "first" in fields else None
+            responses.append((int(entry_id.split("-")[1]), fields["data"], first_id))
+    return responses
+
+
+def run_stream_backfill(agent_run_id: str):
+    """Backfill reader for a RunResponseChannel of the given run."""
+    return functools.partial(read_run_stream_range, agent_run_id)
+
+
+async def get_remote_run_channel(agent_run_id: str) -> Optional[RunResponseChannel]:
+    """Return a channel fed from the run's Redis Stream, or None if there is no stream."""
+    channel = remote_run_channels.get(agent_run_id)
+    if channel is not None:
+        return channel
+
+    try:
+        if not await redis.exists(run_stream_key(agent_run_id)):
+            return None
+    except Exception as e:
+        logger.warning(f"Failed to look up Redis stream for agent run {agent_run_id}: {str(e)}")
+        return None
+
+    # Another request may have started a follower while we were waiting
+    channel = remote_run_channels.get(agent_run_id)
+    if channel is None:
+        channel = remote_run_channels[agent_run_id] = RunResponseChannel(backfill=run_stream_backfill(agent_run_id))
+        asyncio.create_task(_follow_run_stream(agent_run_id, channel))
+    return channel
+
+
+async def load_run_stream(agent_run_id: str) -> Optional[RunResponseChannel]:
+    """Return a closed channel with the persisted responses of a run that is no longer running.
+
+    Unlike get_remote_run_channel no follower is started: a run that ended
+    without writing its end marker (e.g. its instance died) would keep it
+    waiting. Returns None if there is no stream.
+    """
+    try:
+        entries = await redis.xrange(run_stream_key(agent_run_id), min=START_ENTRY_ID, max=END_ENTRY_ID)
+    except Exception as e:
+        logger.warning(f"Failed to read Redis stream for agent run {agent_run_id}: {str(e)}")
+        return None
+    if not entries:
+        return None
+
+    channel = RunResponseChannel(backfill=run_stream_backfill(agent_run_id))
+    for entry_id, fields in entries:
+        if "data" in fields:
+            first_id = int(fields["first"]) if "first" in fields else None
+            channel.append_entry(int(entry_id.split("-")[1]), fields["data"], first_id)
+    channel.close()
+    return channel
+
+
+async def _follow_run_stream(agent_run_id: str, channel: RunResponseChannel) -> None:
+    """Copy a run's Redis Stream into a local channel until the run ends.
+
+    Stops early when the stream disappears (expired) or when no client has been
+    subscribed for a whole blocking read.
+    """
+    key = run_stream_key(agent_run_id)
+    last_id = "0-0"
+    try:
+        while True:
+            result = await redis.xread({key: last_id}, count=XREAD_COUNT, block=XREAD_BLOCK_MS)
+            if not result:
+                if channel.subscribers == 0 or not await redis.exists(key):
+                    return
+                continue
+
+            for _, entries in result:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    if entry_id == END_ENTRY_ID:
+                        return
+                    if "data" in fields:
+                        first_id = int(fields["first"]) if "first" in fields else None
+                        channel.append_entry(int(entry_id.split("-")[1]), fields["data"], first_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Error following Redis stream for agent run {agent_run_id}: {str(e)}")
+    finally:
+        channel.close()
+        if remote_run_channels.get(agent_run_id) is channel:
+            del remote_run_channels[agent_run_id]
@@ -17,7 +17,9 @@ from agent.tools.sb_files_tool import SandboxFilesTool
 from agent.tools.sb_browser_tool import SandboxBrowserTool
 from agent.tools.data_providers_tool import DataProvidersTool
 from agent.prompt import get_system_prompt
-from sandbox.sandbox import create_sandbox, get_or_start_sandbox
+from agent.browser_state import LatestBrowserState
+from sandbox.sandbox import SandboxToolsBase, create_sandbox, get_or_start_sandbox
+from sandbox.executor import run_sandbox_call
 from utils.billing import check_billing_status, get_account_id_from_thread
 from .runner import handle_assistant_message, ensure_tools
 
@@ -74,8 +76,8 @@ async def run_agent(
         else:
             # Acquire pre-warmed or create on demand
             sandbox = await pool.acquire()
-            vnc_link = sandbox.get_preview_link(6080)
-            website_link = sandbox.get_preview_link(8080)
+            vnc_link = await run_sandbox_call(sandbox.id, sandbox.get_preview_link, 6080)
+            website_link = await run_sandbox_call(sandbox.id, sandbox.get_preview_link, 8080)
             vnc_url = vnc_link.url if hasattr(vnc_link, 'url') else str(vnc_link)
             website_url = website_link.url if hasattr(website_link, 'url') else str(website_link)
             token = getattr(vnc_link, 'token', None)
@@ -88,6 +90,7 @@ async def run_agent(
                     'token': token
                 }
             }).eq('project_id', project_id).execute()
+        await SandboxToolsBase.prepare(sandbox)
         thread_manager.add_tool(SandboxShellTool, sandbox=sandbox)
         thread_manager.add_tool(SandboxFilesTool, sandbox=sandbox)
         thread_manager.add_tool(SandboxBrowserTool, sandbox=sandbox, thread_id=thread_id, thread_manager=thread_manager)
@@ -111,6 +114,9 @@ async def run_agent(
         await ensure_sandbox_ready()
     thread_manager.response_processor.pre_tool_hook = pre_tool
 
+    # Keeps the latest browser frame between iterations
+    latest_browser_state = LatestBrowserState(thread_id)
+
     iteration_count = 0
     continue_execution = True
 
@@ -135,6 +141,8 @@ async def run_agent(
             break
 
             # Check for tool execution in assistant messages
+        # Queued (write-behind) messages must be in the database before reading the thread
+        await thread_manager.flush_messages()
         latest_message = await client.table('messages') \
             .select('*') \
             .eq('thread_id', thread_id) \
@@ -169,42 +177,7 @@ async def run_agent(
                 break
 
         # Attach latest browser state (image + JSON) as temporary user message
-        latest_browser_state = await client.table('messages') \
-            .select('*') \
-            .eq('thread_id', thread_id) \
-            .eq('type', 'browser_state') \
-            .order('created_at', desc=True) \
-            .limit(1) \
-            .execute()
-
-        temporary_message = None
-        if latest_browser_state.data and len(latest_browser_state.data) > 0:
-            try:
-                content = json.loads(latest_browser_state.data[0]["content"])
-                screenshot_base64 = content.get("screenshot_base64")
-                # Copy without big fields
-                browser_state = content.copy()
-                browser_state.pop('screenshot_base64', None)
-                browser_state.pop('screenshot_url', None)
-                browser_state.pop('screenshot_url_base64', None)
-
-                temporary_message = {"role": "user", "content": []}
-                if browser_state:
-                    temporary_message["content"].append({
-                        "type": "text",
-                        "text": f"The following is the current state of the browser:\n{browser_state}"
-                    })
-                if screenshot_base64:
-                    temporary_message["content"].append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{screenshot_base64}",
-                        }
-                    })
-                else:
-                    print("@@@@@ THIS TIME NO SCREENSHOT!!")
-            except Exception as e:
-                print(f"Error parsing browser state: {e}")
+        temporary_message = await latest_browser_state.temporary_message(client)
 
         # Token handling: leave None for Gemini (LiteLLM default).
         is_sonnet = "sonnet" in model_name.lower()
@@ -0,0 +1,366 @@
+"""
+In-process fan-out of agent run responses to SSE subscribers.
+
+run_agent_background publishes each response once; every connected
+stream_agent_run client reads the same pre-serialized SSE frame. Subscribers
+sleep until a new frame is published (or the run ends) instead of polling.
+
+Every response carries a sequential event ID (1, 2, ...) so a reconnecting
+client can resume after its Last-Event-ID. The same IDs are used for the run's
+Redis Stream (see agent.redis_run_stream), which lets other instances serve the
+run.
+
+The run log kept in memory is compact and bounded:
+- Consecutive streamed content chunks of an assistant message are merged into
+  one segment; subscribers that are caught up still get each chunk's frame,
+  while late joiners get the merged text (or the part they missed)
+- Only the most recent IRIS_RUN_LOG_MAX_ENTRIES entries are kept; a subscriber
+  that falls behind them is backfilled from the run's Redis Stream, and gets
+  a gap status frame for anything no longer available there either
+"""
+
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_right
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.logger import logger
+
+PING_FRAME = b'data: {"type":"ping"}\n\n'
+# Send a heartbeat ping at this interval to keep connections alive through proxies
+DEFAULT_PING_INTERVAL = 10.0
+# Seconds between still_running checks of a followed run
+DEFAULT_STATUS_CHECK_INTERVAL = 15.0
+DEFAULT_MAX_ENTRIES = int(os.getenv("IRIS_RUN_LOG_MAX_ENTRIES", "1000"))
+
+# Reads persisted entries (event_id, data, first_id) with after_id < event_id < before_id
+Backfill = Callable[[int, int], Awaitable[List[Tuple[int, str, Optional[int]]]]]
+
+
+def sse_frame(data: str, event_id: Optional[int] = None) -> bytes:
+    """Build an SSE frame from already serialized JSON data."""
+    if event_id is None:
+        return f"data: {data}\n\n".encode("utf-8")
+    return f"id: {event_id}\ndata: {data}\n\n".encode("utf-8")
+
+
+def to_sse_frame(response: Any, event_id: Optional[int] = None) -> bytes:
+    """Serialize a response into an SSE data frame."""
+    return sse_frame(json.dumps(response), event_id)
+
+
+def gap_frame(after_id: int, before_id: int) -> bytes:
+    """Frame telling the client that events after_id+1..before_id-1 were lost.
+
+    It carries before_id-1 as its event ID so a reconnect resumes past the gap.
+    """
+    return to_sse_frame({
+        "type": "status",
+        "status": "gap",
+        "message": f"Responses {after_id + 1}-{before_id - 1} are no longer available"
+    }, before_id - 1)
+
+
+def parse_last_event_id(value: Optional[str]) -> int:
+    """Parse a Last-Event-ID header value, treating anything invalid as 0."""
+    try:
+        return max(0, int(value)) if value else 0
+    except ValueError:
+        return 0
+
+
+def parse_content_chunk(response: Any) -> Optional[Tuple[str, str]]:
+    """Return (segment key, text) if the response is a streamed assistant content chunk."""
+    if not isinstance(response, dict) or response.get('type') != 'assistant' or response.get('message_id') is not None:
+        return None
+    metadata = response.get('metadata')
+    if not isinstance(metadata, str) or '"chunk"' not in metadata:
+        return None
+    try:
+        metadata = json.loads(metadata)
+        content = json.loads(response.get('content'))
+    except (TypeError, json.JSONDecodeError):
+        return None
+    if metadata.get('stream_status') != 'chunk' or not isinstance(content, dict):
+        return None
+    text = content.get('content')
+    if not isinstance(text, str):
+        return None
+    return str(metadata.get('thread_run_id')), text
+
+
+def merge_content_chunk(template: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """Build a content chunk response carrying `text`, based on another chunk."""
+    return {**template, "content": json.dumps({"role": "assistant", "content": text})}
+
+
+class _Entry:
+    """A single response in the run log."""
+
+    __slots__ = ("first_id", "last_id", "frame")
+
+    def __init__(self, event_id: int, frame: bytes):
+        self.first_id = event_id
+        self.last_id = event_id
+        self.frame = frame
+
+    def frames_after(self, event_id: int) -> List[bytes]:
+        return [self.frame]
+
+
+class _Segment:
+    """Consecutive content chunks of one assistant message, merged into one entry."""
+
+    __slots__ = ("key", "template", "first_id", "last_id", "parts", "ends", "live_frames", "_frame")
+
+    def __init__(self, key: str, template: Dict[str, Any], first_id: int):
+        self.key = key
+        self.template = template
+        self.first_id = first_id
+        self.last_id = first_id - 1
+        self.parts: List[str] = []
+        # Text length up to and including each event ID of the segment
+        self.ends: List[int] = []
+        # Frames as published, kept only while the segment is still growing
+        self.live_frames: Optional[List[Optional[bytes]]] = []
+        self._frame: Optional[bytes] = None
+
+    def extend(self, first_id: int, last_id: int, text: str, frame: Optional[bytes]) -> None:
+        """Append text covering event IDs first_id..last_id."""
+        previous_end = self.ends[-1] if self.ends else 0
+        self.parts.append(text)
+        self.ends.extend([previous_end] * (last_id - first_id))
+        self.ends.append(previous_end + len(text))
+        if self.live_frames is not None:
+            self.live_frames.extend([None] * (last_id - first_id))
+            self.live_frames.append(frame)
+        self.last_id = last_id
+        self._frame = None
+
+    def seal(self) -> None:
+        """Stop growing; per-chunk frames are dropped in favour of the merged text."""
+        self.live_frames = None
+        if len(self.parts) > 1:
+            self.parts = ["".join(self.parts)]
+
+    def frames_after(self, event_id: int) -> List[bytes]:
+        if event_id < self.first_id:
+            if self._frame is None:
+                self._frame = to_sse_frame(merge_content_chunk(self.template, "".join(self.parts)), self.last_id)
+            return [self._frame]
+
+        start = event_id - self.first_id + 1
+        if self.live_frames is not None and all(self.live_frames[start:]):
+            # Caught-up subscribers share the frames as published
+            return self.live_frames[start:]
+
+        text = "".join(self.parts)[self.ends[start - 1]:]
+        return [to_sse_frame(merge_content_chunk(self.template, text), self.last_id)]
+
+
+class RunResponseChannel:
+    """Broadcast channel and bounded run log for the responses of a single agent run.
+
+    Args:
+        writer: Optional sink for every published response, closed with the
+            channel, e.g. a RedisRunStreamWriter. It must provide
+            append(event_id, data), append_chunk(event_id, key, text, template)
+            and close().
+        max_entries: Number of log entries (responses or merged chunk
+            segments) kept in memory.
+        backfill: Optional reader for entries dropped from memory, e.g.
+            read_run_stream_range bound to the run.
+    """
+
+    def __init__(self, writer=None, max_entries: int = DEFAULT_MAX_ENTRIES, backfill: Optional[Backfill] = None):
+        self._entries: List[Any] = []
+        # last_id of each entry, for bisecting by event ID
+        self._last_ids: List[int] = []
+        self._last_event_id = 0
+        self.max_entries = max(1, max_entries)
+        self.closed = False
+        self.subscribers = 0
+        self.writer = writer
+        self.backfill = backfill
+        self._published = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def last_event_id(self) -> int:
+        return self._last_event_id
+
+    @property
+    def first_event_id(self) -> int:
+        """Oldest event ID still held in memory (0 if the log is empty)."""
+        return self._entries[0].first_id if self._entries else 0
+
+    def publish(self, response: Any) -> None:
+        """Serialize a response once and wake all subscribers."""
+        if self.closed:
+            return
+        event_id = self._last_event_id + 1
+        data = json.dumps(response)
+        chunk = parse_content_chunk(response)
+        if chunk is not None:
+            key, text = chunk
+            if self.writer is not None:
+                self.writer.append_chunk(event_id, key, text, response)
+            self._add_chunk(key, text, response, event_id, event_id, sse_frame(data, event_id))
+        else:
+            if self.writer is not None:
+                self.writer.append(event_id, data)
+            self._add_entry(_Entry(event_id, sse_frame(data, event_id)))
+        self._notify()
+
+    def append_entry(self, event_id: int, data: str, first_id: Optional[int] = None) -> None:
+        """Add an already serialized response (or merged chunks first_id..event_id)."""
+        if self.closed or event_id <= self._last_event_id:
+            return
+        first_id = max(first_id or event_id, self._last_event_id + 1)
+        try:
+            response = json.loads(data)
+        except json.JSONDecodeError:
+            response = None
+        chunk = parse_content_chunk(response)
+        if chunk is not None:
+            key, text = chunk
+            frame = sse_frame(data, event_id) if first_id == event_id else None
+            self._add_chunk(key, text, response, first_id, event_id, frame)
+        else:
+            entry = _Entry(event_id, sse_frame(data, event_id))
+            entry.first_id = first_id
+            self._add_entry(entry)
+        self._notify()
+
+    def _add_chunk(self, key: str, text: str, response: Dict[str, Any], first_id: int, last_id: int, frame: Optional[bytes]) -> None:
+        tail = self._entries[-1] if self._entries else None
+        if not (isinstance(tail, _Segment) and tail.live_frames is not None and tail.key == key):
+            tail = _Segment(key, response, first_id)
+            self._add_entry(tail)
+        tail.extend(first_id, last_id, text, frame)
+        self._last_ids[-1] = last_id
+        self._last_event_id = last_id
+
+    def _add_entry(self, entry) -> None:
+        tail = self._entries[-1] if self._entries else None
+        if isinstance(tail, _Segment):
+            tail.seal()
+        self._entries.append(entry)
+        self._last_ids.append(entry.last_id)
+        self._last_event_id = entry.last_id
+        if len(self._entries) > self.max_entries:
+            del self._entries[0]
+            del self._last_ids[0]
+
+    def close(self) -> None:
+        """Mark the run as finished; subscribers drain remaining frames and stop."""
+        if not self.closed:
+            self.closed = True
+            if self._entries and isinstance(self._entries[-1], _Segment):
+                self._entries[-1].seal()
+            if self.writer is not None:
+                self.writer.close()
+            self._notify()
+
+    def _notify(self) -> None:
+        # Wake everyone waiting on the current event, then arm a fresh one
+        self._published.set()
+        self._published = asyncio.Event()
+
+    async def _read_gap(self, after_id: int, before_id: int) -> List[bytes]:
+        """Frames for events after_id+1..before_id-1, read back from the backfill."""
+        entries: List[Tuple[int, str, Optional[int]]] = []
+        if self.backfill is not None:
+            try:
+                entries = await self.backfill(after_id, before_id)
+            except Exception as e:
+                logger.warning(f"Failed to backfill events {after_id + 1}-{before_id - 1}: {str(e)}")
+
+        frames = []
+        last_id = after_id
+        for event_id, data, first_id in entries:
+            if event_id <= last_id or event_id >= before_id:
+                continue
+            if (first_id or event_id) > last_id + 1:
+                frames.append(gap_frame(last_id, first_id or event_id))
+            frames.append(sse_frame(data, event_id))
+            last_id = event_id
+        if last_id < before_id - 1:
+            frames.append(gap_frame(last_id, before_id))
+        return frames
+
+    async def subscribe(
+        self,
+        start: int = 0,
+        follow: bool = True,
+        ping_interval: Optional[float] = DEFAULT_PING_INTERVAL,
+        still_running: Optional[Callable[[], Awaitable[bool]]] = None,
+        status_check_interval: float = DEFAULT_STATUS_CHECK_INTERVAL
+    ) -> AsyncGenerator[bytes, None]:
+        """Yield SSE frames for events after `start`.
+
+        Args:
+            start: Last event ID the client has seen (0 for all frames).
+            follow: Keep waiting for new frames until the channel is closed.
+                If False, only the frames published so far are sent.
+            ping_interval: Seconds of inactivity before a ping frame is sent.
+            still_running: Optional check, awaited every status_check_interval
+                seconds while following; once it returns False the frames
+                published so far are sent and the subscription ends, even if
+                the channel is never closed.
+            status_check_interval: Seconds between still_running checks.
+        """
+        self.subscribers += 1
+        try:
+            last_sent = start
+            last_check = time.monotonic()
+            while True:
+                while last_sent < self._last_event_id:
+                    position = bisect_right(self._last_ids, last_sent)
+                    if position >= len(self._entries):
+                        break
+                    entry = self._entries[position]
+                    if entry.first_id > last_sent + 1:
+                        # The events in between were dropped from memory
+                        before_id = entry.first_id
+                        for frame in await self._read_gap(last_sent, before_id):
+                            yield frame
+                        last_sent = before_id - 1
+                        # Entries may have been dropped meanwhile; look again
+                        continue
+                    # Snapshot before yielding; a growing segment may be extended meanwhile
+                    upto = entry.last_id
+                    frames = entry.frames_after(last_sent)
+                    last_sent = upto
+                    for frame in frames:
+                        yield frame
+
+                if not follow or self.closed:
+                    return
+
+                if still_running is not None and time.monotonic() - last_check >= status_check_interval:
+                    last_check = time.monotonic()
+                    try:
+                        follow = await still_running()
+                    except Exception as e:
+                        logger.warning(f"Failed to check whether the run is still running: {str(e)}")
+                    if not follow:
+                        # Send what was published up to now, then stop
+                        continue
+
+                published = self._published
+                timeout = ping_interval
+                if timeout is None and still_running is not None:
+                    # Wake up for the status check even without pings
+                    timeout = status_check_interval
+                try:
+                    await asyncio.wait_for(published.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    if ping_interval is not None:
+                        yield PING_FRAME
+        finally:
+            self.subscribers -= 1
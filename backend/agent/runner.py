@@ -121,6 +121,8 @@ async def handle_assistant_message(thread_id: str, content: str, meta: dict, san
                 from .tools import (
                     SandboxFilesTool, SandboxShellTool, SandboxDeployTool, SandboxExposeTool
                 )
+                from sandbox.sandbox import SandboxToolsBase
+                await SandboxToolsBase.prepare(sandbox)
                 tool_registry.register_tool(SandboxFilesTool(sandbox))
                 tool_registry.register_tool(SandboxShellTool(sandbox))
                 tool_registry.register_tool(SandboxDeployTool(sandbox))
@@ -0,0 +1,146 @@
+"""
+Shared async HTTP client for the RapidAPI data providers.
+
+All providers go through one pooled httpx.AsyncClient instead of a blocking
+requests call per endpoint:
+- keep-alive connections are reused across providers and tool calls
+- every request has a timeout (IRIS_RAPID_API_TIMEOUT seconds)
+- at most IRIS_RAPID_API_CONCURRENCY requests run at once per provider host
+- 429 and 5xx responses and connection errors are retried up to
+  IRIS_RAPID_API_RETRIES times with exponential backoff, honouring Retry-After
+"""
+
+import asyncio
+import os
+import random
+from typing import Any, Dict, Optional
+
+import httpx
+
+from utils.logger import logger
+
+RAPID_API_TIMEOUT = float(os.getenv("IRIS_RAPID_API_TIMEOUT", "30"))
+RAPID_API_CONCURRENCY = int(os.getenv("IRIS_RAPID_API_CONCURRENCY", "4"))
+RAPID_API_RETRIES = int(os.getenv("IRIS_RAPID_API_RETRIES", "3"))
+RAPID_API_BACKOFF = float(os.getenv("IRIS_RAPID_API_BACKOFF", "0.5"))
+# Longest Retry-After we are willing to wait before the next attempt
+RAPID_API_MAX_RETRY_AFTER = 30.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RapidApiError(Exception):
+    """A RapidAPI endpoint answered with an error, or its response was not JSON."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RapidApiClient:
+    """Pooled async client with per-host concurrency limits and retries."""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(RAPID_API_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0),
+            transport=transport,
+        )
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(max(1, RAPID_API_CONCURRENCY))
+        return semaphore
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        payload: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> Any:
+        """Send a request and return the decoded JSON body.
+
+        GET sends payload as query parameters, POST as a JSON body.
+
+        Raises:
+            RapidApiError: On an error status (after retries) or a body that is not JSON.
+            httpx.TransportError: If the host stayed unreachable after retries.
+        """
+        host = httpx.URL(url).host
+        kwargs = {"params": payload} if method == "GET" else {"json": payload}
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            async with self._semaphore(host):
+                try:
+                    response = await self._client.request(method, url, headers=headers, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt > RAPID_API_RETRIES:
+                        raise
+                    logger.warning(f"RapidAPI request to {host} failed ({e!r}), attempt {attempt}")
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt > RAPID_API_RETRIES:
+                        return self._decode(response)
+                    logger.warning(f"RapidAPI request to {host} returned {response.status_code}, attempt {attempt}")
+                    retry_after = _retry_after_seconds(response)
+            # Back off outside the semaphore so other requests to the host can proceed
+            delay = RAPID_API_BACKOFF * (2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+            await asyncio.sleep(retry_after if retry_after is not None else delay)
+
+    @staticmethod
+    def _decode(response: httpx.Response) -> Any:
+        if response.status_code >= 400:
+            raise RapidApiError(
+                f"RapidAPI request failed with status {response.status_code}: {response.text[:500]}",
+                status_code=response.status_code,
+            )
+        try:
+            return response.json()
+        except ValueError as e:
+            raise RapidApiError(f"Failed to parse response JSON: {response.text[:500]} {e}", status_code=response.status_code)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    try:
+        return min(max(float(value), 0.0), RAPID_API_MAX_RETRY_AFTER) if value else None
+    except ValueError:
+        return None
+
+
+_client: Optional[RapidApiClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_rapid_api_client() -> RapidApiClient:
+    """Return the client shared by all providers, creating it on first use.
+
+    Connections and semaphores belong to an event loop, so a new client is made
+    when called from a different loop (e.g. a script calling asyncio.run twice).
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.closed or _client_loop is not loop:
+        _client = RapidApiClient()
+        _client_loop = loop
+    return _client
+
+
+async def close_rapid_api_client() -> None:
+    """Close the shared client."""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
@@ -1,6 +1,8 @@
+import asyncio
 import os
-import requests
-from typing import Dict, Any, Optional, TypedDict, Literal
+from typing import Dict, Any, List, Optional, Tuple, TypedDict, Literal
+
+from agent.tools.data_providers.RapidApiClient import get_rapid_api_client
 
 
 class EndpointSchema(TypedDict):
@@ -15,25 +17,27 @@ class RapidDataProviderBase:
     def __init__(self, base_url: str, endpoints: Dict[str, EndpointSchema]):
         self.base_url = base_url
         self.endpoints = endpoints
-    
+
     def get_endpoints(self):
         return self.endpoints
-    
-    def call_endpoint(
+
+    async def call_endpoint_async(
             self,
             route: str,
             payload: Optional[Dict[str, Any]] = None
     ):
         """
         Call an API endpoint with the given parameters and data.
-        
+
         Args:
-            endpoint (EndpointSchema): The endpoint configuration dictionary
-            params (dict, optional): Query parameters for GET requests
-            payload (dict, optional): JSON payload for POST requests
-            
+            route (str): The key of the endpoint to call
+            payload (dict, optional): Query parameters for GET requests, JSON payload for POST requests
+
         Returns:
             dict: The JSON response from the API
+
+        Raises:
+            RapidApiError: If the API answered with an error status
         """
         if route.startswith("/"):
             route = route[1:]
@@ -41,21 +45,45 @@ class RapidDataProviderBase:
         endpoint = self.endpoints.get(route)
         if not endpoint:
             raise ValueError(f"Endpoint {route} not found")
-        
+
         url = f"{self.base_url}{endpoint['route']}"
-        
+
         headers = {
-            "x-rapidapi-key": os.getenv("RAPID_API_KEY"),
+            "x-rapidapi-key": os.getenv("RAPID_API_KEY") or "",
             "x-rapidapi-host": url.split("//")[1].split("/")[0],
             "Content-Type": "application/json"
         }
 
         method = endpoint.get('method', 'GET').upper()
-        
-        if method == 'GET':
-            response = requests.get(url, params=payload, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, json=payload, headers=headers)
-        else:
+        if method not in ('GET', 'POST'):
             raise ValueError(f"Unsupported HTTP method: {method}")
-        return response.json()
+
+        return await get_rapid_api_client().request(method, url, payload, headers)
+
+    async def call_endpoints(
+            self,
+            calls: List[Tuple[str, Optional[Dict[str, Any]]]]
+    ) -> List[Any]:
+        """
+        Call several endpoints concurrently, within the provider's concurrency limit.
+
+        Args:
+            calls (list): (route, payload) pairs
+
+        Returns:
+            list: One entry per call, in order: the JSON response, or the exception it raised
+        """
+        return await asyncio.gather(
+            *[self.call_endpoint_async(route, payload) for route, payload in calls],
+            return_exceptions=True
+        )
+
+    def call_endpoint(
+            self,
+            route: str,
+            payload: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Blocking wrapper around call_endpoint_async for scripts; do not use from async code.
+        """
+        return asyncio.run(self.call_endpoint_async(route, payload))
@@ -1,12 +1,21 @@
 import json
 
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema, cached_result
 from agent.tools.data_providers.LinkedinProvider import LinkedinProvider
 from agent.tools.data_providers.YahooFinanceProvider import YahooFinanceProvider
 from agent.tools.data_providers.AmazonProvider import AmazonProvider
 from agent.tools.data_providers.ZillowProvider import ZillowProvider
 from agent.tools.data_providers.TwitterProvider import TwitterProvider
 
+def _no_failed_calls(result: ToolResult) -> bool:
+    """Whether no call of a (fan-out) result failed; failed calls may succeed when retried."""
+    try:
+        data = json.loads(result.output)
+    except ValueError:
+        return True
+    items = data if isinstance(data, list) else [data]
+    return not any(isinstance(item, dict) and "error" in item for item in items)
+
 class DataProvidersTool(Tool):
     """Tool for making requests to various data providers."""
 
@@ -81,6 +90,7 @@ Use this tool when you need to discover what endpoints are available.
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    @cached_result(ttl=600, cacheable=_no_failed_calls)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -100,6 +110,11 @@ Use this tool when you need to discover what endpoints are available.
                     "payload": {
                         "type": "object",
                         "description": "The payload to send with the API call"
+                    },
+                    "payloads": {
+                        "type": "array",
+                        "items": {"type": "object"},
+                        "description": "Instead of payload: several payloads, calling the endpoint once per payload concurrently"
                     }
                 },
                 "required": ["service_name", "route"]
@@ -124,13 +139,19 @@ Use this tool when you need to discover what endpoints are available.
         <execute-data-provider-call service_name="linkedin" route="person">
             {"link": "https://www.linkedin.com/in/johndoe/"}
         </execute-data-provider-call>
+
+        <!-- A JSON list calls the route once per payload, concurrently -->
+        <execute-data-provider-call service_name="linkedin" route="person">
+            [{"link": "https://www.linkedin.com/in/johndoe/"}, {"link": "https://www.linkedin.com/in/janedoe/"}]
+        </execute-data-provider-call>
         '''
     )
     async def execute_data_provider_call(
         self,
         service_name: str,
         route: str,
-        payload: str # this actually a json string
+        payload: str = None, # this actually a json string
+        payloads: list = None
     ) -> ToolResult:
         """
         Execute a call to a specific data provider endpoint.
@@ -138,10 +159,15 @@ Use this tool when you need to discover what endpoints are available.
         Parameters:
         - service_name: The name of the data provider (e.g., 'linkedin')
         - route: The key of the endpoint to call
-        - payload: The payload to send with the data provider call
+        - payload: The payload to send with the data provider call, or a list of payloads
+          to send in concurrent calls
+        - payloads: A list of payloads, as an alternative to a list in payload
         """
         try:
-            payload = json.loads(payload)
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            if payloads is not None:
+                payload = payloads
 
             if not service_name:
                 return self.fail_response("service_name is required.")
@@ -160,7 +186,14 @@ Use this tool when you need to discover what endpoints are available.
                 return self.fail_response(f"Endpoint '{route}' not found in {service_name} data provider.")
             
             
-            result = data_provider.call_endpoint(route, payload)
+            if isinstance(payload, list):
+                results = await data_provider.call_endpoints([(route, item) for item in payload])
+                return self.success_response([
+                    {"error": str(result)} if isinstance(result, Exception) else result
+                    for result in results
+                ])
+
+            result = await data_provider.call_endpoint_async(route, payload)
             return self.success_response(result)
             
         except Exception as e:
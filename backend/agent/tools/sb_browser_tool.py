@@ -1,11 +1,28 @@
+import base64
+import os
 import traceback
 import json
 
+import httpx
+
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from agentpress.thread_manager import ThreadManager
 from sandbox.sandbox import SandboxToolsBase, Sandbox
+from sandbox.browser_client import (
+    BROWSER_API_PORT,
+    BROWSER_API_PREFIX,
+    BrowserApiError,
+    get_browser_client,
+    invalidate_browser_client,
+)
+from services.blob_store import get_blob_store, screenshot_ref
 from utils.logger import logger
 
+# Call the browser API over a pooled HTTP connection instead of curl in the sandbox
+BROWSER_API_DIRECT = os.getenv("IRIS_BROWSER_API_DIRECT", "true").lower() in ("1", "true", "yes")
+# OCR after each action: eager, lazy (only via browser_get_page_text) or off; empty keeps the sandbox default
+BROWSER_OCR_MODE = os.getenv("IRIS_BROWSER_OCR_MODE", "").lower()
+
 
 class SandboxBrowserTool(SandboxToolsBase):
     """Tool for executing tasks in a Daytona sandbox with browser-use capabilities."""
@@ -14,6 +31,78 @@ class SandboxBrowserTool(SandboxToolsBase):
         super().__init__(sandbox)
         self.thread_id = thread_id
         self.thread_manager = thread_manager
+        # DOM version of the last browser state added to the thread, the base of the next diff
+        self._dom_version = None
+
+    async def _call_browser_api(self, endpoint: str, params: dict = None, method: str = "POST") -> dict:
+        """Call the in-sandbox browser API and return its JSON result.
+
+        Goes straight to port 8002 through the sandbox preview URL on a pooled
+        connection, falling back to curl inside the sandbox when the API cannot
+        be reached that way.
+        """
+        if BROWSER_API_DIRECT:
+            try:
+                client = await get_browser_client(self.sandbox)
+                return await client.request(
+                    endpoint, params, method, ocr_mode=BROWSER_OCR_MODE or None, dom_version=self._dom_version
+                )
+            except BrowserApiError as e:
+                # Rejected by the preview proxy (e.g. stale token); the action did not run
+                if e.status_code not in (401, 403):
+                    raise
+                await invalidate_browser_client(self.sandbox_id)
+                logger.warning(f"Browser API preview access rejected for sandbox {self.sandbox_id}, using exec: {e}")
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                logger.warning(f"Browser API not reachable for sandbox {self.sandbox_id}, using exec: {e}")
+
+        return await self._call_browser_api_via_exec(endpoint, params, method)
+
+    async def _call_browser_api_via_exec(self, endpoint: str, params: dict = None, method: str = "POST") -> dict:
+        """Call the browser API with curl inside the sandbox."""
+        url = f"http://localhost:{BROWSER_API_PORT}{BROWSER_API_PREFIX}/{endpoint}"
+        query = {"ocr": BROWSER_OCR_MODE} if BROWSER_OCR_MODE else {}
+        if self._dom_version:
+            query["dom_version"] = self._dom_version
+
+        if method == "GET" and params:
+            query.update(params)
+        if query:
+            query_params = "&".join([f"{k}={v}" for k, v in query.items()])
+            url = f"{url}?{query_params}"
+        if method == "GET":
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+        else:
+            curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
+            if params:
+                json_data = json.dumps(params)
+                curl_cmd += f" -d '{json_data}'"
+
+        logger.debug(f"Executing curl command: {curl_cmd}")
+
+        response = await self.async_sandbox.exec(curl_cmd, timeout=30)
+        if response.exit_code != 0:
+            raise BrowserApiError(f"Browser automation request failed 2: {response}")
+        try:
+            return json.loads(response.result)
+        except json.JSONDecodeError as e:
+            raise BrowserApiError(f"Failed to parse response JSON: {response.result} {e}")
+
+    async def _store_screenshot(self, result: dict) -> None:
+        """Replace an inline base64 screenshot with a content-addressed reference."""
+        screenshot_base64 = result.get("screenshot_base64")
+        if not screenshot_base64:
+            return
+        try:
+            data = base64.b64decode(screenshot_base64)
+            content_type = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+            key = await get_blob_store().put(data, content_type)
+        except Exception as e:
+            # Keep the screenshot inline rather than losing it
+            logger.warning(f"Failed to store browser screenshot, keeping it inline: {str(e)}")
+            return
+        del result["screenshot_base64"]
+        result["screenshot"] = screenshot_ref(key, data, content_type)
 
     async def _execute_browser_action(self, endpoint: str, params: dict = None, method: str = "POST") -> ToolResult:
         """Execute a browser automation action through the API
@@ -27,75 +116,56 @@ class SandboxBrowserTool(SandboxToolsBase):
             ToolResult: Result of the execution
         """
         try:
-            # Build the curl command
-            url = f"http://localhost:8002/api/automation/{endpoint}"
-            
-            if method == "GET" and params:
-                query_params = "&".join([f"{k}={v}" for k, v in params.items()])
-                url = f"{url}?{query_params}"
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-            else:
-                curl_cmd = f"curl -s -X {method} '{url}' -H 'Content-Type: application/json'"
-                if params:
-                    json_data = json.dumps(params)
-                    curl_cmd += f" -d '{json_data}'"
-            
-            print(f"\033[95mExecuting curl command:\033[0m")
-            print(f"{curl_cmd}")
-            
-            response = self.sandbox.process.exec(curl_cmd, timeout=30)
+            try:
+                result = await self._call_browser_api(endpoint, params, method)
+            except BrowserApiError as e:
+                logger.error(str(e))
+                return self.fail_response(str(e))
+
+            if not "content" in result:
+                result["content"] = ""
             
-            if response.exit_code == 0:
-                try:
-                    result = json.loads(response.result)
-
-                    if not "content" in result:
-                        result["content"] = ""
-                    
-                    if not "role" in result:
-                        result["role"] = "assistant"
-
-                    logger.info("Browser automation request completed successfully")
-
-                    # Add full result to thread messages for state tracking
-                    added_message = await self.thread_manager.add_message(
-                        thread_id=self.thread_id,
-                        type="browser_state",
-                        content=result,
-                        is_llm_message=False
-                    )
-
-                    # Return tool-specific success response
-                    success_response = {
-                        "success": True,
-                        "message": result.get("message", "Browser action completed successfully")
-                    }
+            if not "role" in result:
+                result["role"] = "assistant"
+
+            logger.info("Browser automation request completed successfully")
+
+            # The screenshot goes to the blob store; the message keeps a reference
+            await self._store_screenshot(result)
+
+            # Add full result to thread messages for state tracking
+            added_message = await self.thread_manager.add_message(
+                thread_id=self.thread_id,
+                type="browser_state",
+                content=result,
+                is_llm_message=False
+            )
+            self._dom_version = result.get("dom_version")
+
+            # Return tool-specific success response
+            success_response = {
+                "success": True,
+                "message": result.get("message", "Browser action completed successfully")
+            }
+
+            # Add message ID if available
+            if added_message and 'message_id' in added_message:
+                success_response['message_id'] = added_message['message_id']
+
+            # Add relevant browser-specific info
+            if result.get("url"):
+                success_response["url"] = result["url"]
+            if result.get("title"):
+                success_response["title"] = result["title"]
+            if result.get("element_count"):
+                success_response["elements_found"] = result["element_count"]
+            if result.get("pixels_below"):
+                success_response["scrollable_content"] = result["pixels_below"] > 0
+            # Add OCR text when available
+            if result.get("ocr_text"):
+                success_response["ocr_text"] = result["ocr_text"]
 
-                    # Add message ID if available
-                    if added_message and 'message_id' in added_message:
-                        success_response['message_id'] = added_message['message_id']
-
-                    # Add relevant browser-specific info
-                    if result.get("url"):
-                        success_response["url"] = result["url"]
-                    if result.get("title"):
-                        success_response["title"] = result["title"]
-                    if result.get("element_count"):
-                        success_response["elements_found"] = result["element_count"]
-                    if result.get("pixels_below"):
-                        success_response["scrollable_content"] = result["pixels_below"] > 0
-                    # Add OCR text when available
-                    if result.get("ocr_text"):
-                        success_response["ocr_text"] = result["ocr_text"]
-
-                    return self.success_response(success_response)
-
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse response JSON: {response.result} {e}")
-                    return self.fail_response(f"Failed to parse response JSON: {response.result} {e}")
-            else:
-                logger.error(f"Browser automation request failed 2: {response}")
-                return self.fail_response(f"Browser automation request failed 2: {response}")
+            return self.success_response(success_response)
 
         except Exception as e:
             logger.error(f"Error executing browser action: {e}")
@@ -894,4 +964,37 @@ class SandboxBrowserTool(SandboxToolsBase):
             dict: Result of the execution
         """
         print(f"\033[95mClicking at coordinates: ({x}, {y})\033[0m")
-        return await self._execute_browser_action("click_coordinates", {"x": x, "y": y})
\ No newline at end of file
+        return await self._execute_browser_action("click_coordinates", {"x": x, "y": y})
+
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "browser_get_page_text",
+            "description": "Read the text visible in the browser (OCR of the latest screenshot)",
+            "parameters": {
+                "type": "object",
+                "properties": {}
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="browser-get-page-text",
+        mappings=[],
+        example='''
+        <browser-get-page-text></browser-get-page-text>
+        '''
+    )
+    async def browser_get_page_text(self) -> ToolResult:
+        """Get the OCR text of the latest browser screenshot
+        
+        Returns:
+            dict: Result of the execution
+        """
+        try:
+            result = await self._call_browser_api("ocr_text", {})
+            if not result.get("success"):
+                return self.fail_response(result.get("message") or "No page text available")
+            return self.success_response({"ocr_text": result.get("ocr_text", "")})
+        except Exception as e:
+            logger.error(f"Error getting page text: {e}")
+            return self.fail_response(f"Error getting page text: {e}")
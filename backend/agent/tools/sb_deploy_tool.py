@@ -84,7 +84,7 @@ class SandboxDeployTool(SandboxToolsBase):
             
             # Verify the directory exists
             try:
-                dir_info = self.sandbox.fs.get_file_info(rel_workspace_path)
+                dir_info = await self.async_sandbox.get_file_info(rel_workspace_path)
                 if not dir_info.is_dir:
                     return self.fail_response(f"'{directory_path}' is not a directory")
             except Exception as e:
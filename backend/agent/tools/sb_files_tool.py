@@ -5,13 +5,27 @@ class SessionExecuteRequest:
     def __init__(self, command=None, var_async=False):
         self.command = command
         self.var_async = var_async
-from typing import Optional
+import asyncio
+import json
+import os
+import secrets
+import shlex
+import textwrap
+from typing import Dict, Optional
 
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from sandbox.sandbox import SandboxToolsBase, Sandbox, upload_file_bytes, atomic_write_file_bytes
+from sandbox.archive import upload_files
+from sandbox.scripts import EDIT_SCRIPT, MANIFEST_SCRIPT, SandboxScriptError, run_script
 from utils.files_utils import EXCLUDED_FILES, EXCLUDED_DIRS, EXCLUDED_EXT, should_exclude_file, clean_path
 from utils.logger import logger
 
+# Limits on what get_workspace_state downloads per call; larger files are left out
+WORKSPACE_STATE_MAX_BYTES = int(os.getenv("IRIS_WORKSPACE_STATE_MAX_BYTES", str(32 * 1024 * 1024)))
+WORKSPACE_STATE_MAX_FILE_BYTES = int(os.getenv("IRIS_WORKSPACE_STATE_MAX_FILE_BYTES", str(1024 * 1024)))
+# Edits larger than this are uploaded as a file instead of passed on the command line
+EDIT_INLINE_MAX_BYTES = 64 * 1024
+
 class SandboxFilesTool(SandboxToolsBase):
     """File operations via Daytona SDK under user workspace (~/<user>/workspace)."""
 
@@ -20,23 +34,13 @@ class SandboxFilesTool(SandboxToolsBase):
         self.SNIPPET_LINES = 4
         # Use relative root per Daytona SDK
         self.workspace_rel = "workspace"
-        # Ensure workspace directory exists
-        self._ensure_workspace_directory()
-
-    def _ensure_workspace_directory(self):
-        """Ensure the workspace directory exists in the sandbox."""
-        try:
-            # Try to create the workspace directory if it doesn't exist
-            self.sandbox.fs.create_folder(self.workspace_rel)
-            logger.debug("Workspace directory ensured at ~/workspace")
-        except Exception:
-            # Directory might already exist, which is fine
-            try:
-                # Verify it exists by listing it
-                self.sandbox.fs.list_files(self.workspace_rel)
-                logger.debug("Workspace directory already exists at ~/workspace")
-            except Exception as list_error:
-                logger.warning(f"Could not ensure workspace directory: {str(list_error)}")
+        # Last workspace state, kept to download only changed files next time
+        self._workspace_state: Dict[str, dict] = {}
+        self._binary_files: Dict[str, str] = {}
+        # Edits run in the sandbox; edits to the same file are serialized here.
+        # A lock is dropped once no edit holds or waits for it.
+        self._edit_locks: Dict[str, asyncio.Lock] = {}
+        self._edit_lock_users: Dict[str, int] = {}
 
     def clean_path(self, path: str) -> str:
         return clean_path(path, self.workspace_rel)
@@ -44,37 +48,78 @@ class SandboxFilesTool(SandboxToolsBase):
     def _should_exclude_file(self, rel_path: str) -> bool:
         return should_exclude_file(rel_path)
 
-    def _file_exists(self, rel_path: str) -> bool:
+    async def _file_exists(self, rel_path: str) -> bool:
         try:
-            self.sandbox.fs.get_file_info(rel_path)
+            await self.async_sandbox.get_file_info(rel_path)
             return True
         except Exception:
             return False
 
+    async def get_workspace_manifest(self) -> Dict[str, dict]:
+        """Path, size, mtime and SHA-256 of every workspace file, from one command in the sandbox."""
+        entries = await run_script(
+            self.async_sandbox, MANIFEST_SCRIPT, self.workspace_rel, json.dumps(sorted(EXCLUDED_DIRS))
+        )
+        return {
+            rel_path: {"size": size, "modified": modified, "sha256": sha256}
+            for rel_path, size, modified, sha256 in entries
+            if not self._should_exclude_file(rel_path)
+        }
+
     async def get_workspace_state(self) -> dict:
-        files_state = {}
+        """Contents of the workspace's text files, keyed by path relative to the workspace.
+
+        Compares a fresh manifest with the previous call's and downloads only
+        new or changed files, concurrently and within WORKSPACE_STATE_MAX_BYTES.
+        Binary files and files over WORKSPACE_STATE_MAX_FILE_BYTES are left out.
+        """
         try:
-            files = self.sandbox.fs.list_files(self.workspace_rel)
-            for file_info in files:
-                rel_path = file_info.name
-                if self._should_exclude_file(rel_path) or file_info.is_dir:
-                    continue
-                try:
-                    content = self.sandbox.fs.download_file(f"{self.workspace_rel}/{rel_path}").decode()
-                    files_state[rel_path] = {
-                        "content": content,
-                        "is_dir": file_info.is_dir,
-                        "size": file_info.size,
-                        "modified": file_info.mod_time
-                    }
-                except UnicodeDecodeError:
-                    pass
-                except Exception:
-                    pass
-            return files_state
-        except Exception:
+            manifest = await self.get_workspace_manifest()
+        except Exception as e:
+            logger.warning(f"Could not build workspace manifest: {str(e)}")
             return {}
 
+        previous = self._workspace_state
+        files_state = {
+            rel_path: state for rel_path, state in previous.items()
+            if rel_path in manifest and state["sha256"] == manifest[rel_path]["sha256"]
+        }
+        to_fetch = []
+        budget = WORKSPACE_STATE_MAX_BYTES
+        for rel_path, entry in manifest.items():
+            if rel_path in files_state or self._binary_files.get(rel_path) == entry["sha256"]:
+                continue
+            if entry["size"] > WORKSPACE_STATE_MAX_FILE_BYTES or entry["size"] > budget:
+                continue
+            budget -= entry["size"]
+            to_fetch.append(rel_path)
+        if len(to_fetch) + len(files_state) < len(manifest):
+            logger.info(f"Workspace state skipped {len(manifest) - len(to_fetch) - len(files_state)} binary or oversized files")
+
+        async def fetch(rel_path: str) -> None:
+            entry = manifest[rel_path]
+            try:
+                data = await self.async_sandbox.download_file(f"{self.workspace_rel}/{rel_path}")
+                content = data.decode() if isinstance(data, (bytes, bytearray)) else str(data)
+            except UnicodeDecodeError:
+                self._binary_files[rel_path] = entry["sha256"]
+                return
+            except Exception as e:
+                logger.debug(f"Could not download {rel_path} for workspace state: {str(e)}")
+                return
+            files_state[rel_path] = {
+                "content": content,
+                "is_dir": False,
+                "size": entry["size"],
+                "modified": entry["modified"],
+                "sha256": entry["sha256"],
+            }
+
+        # Per-sandbox concurrency is bounded by the sandbox executor
+        await asyncio.gather(*[fetch(rel_path) for rel_path in to_fetch])
+        self._workspace_state = files_state
+        return dict(files_state)
+
     @openapi_schema({
         "type": "function",
         "function": {
@@ -106,20 +151,77 @@ class SandboxFilesTool(SandboxToolsBase):
         # clean_path already returns a path under workspace_rel (e.g., 'workspace/...')
         full_rel = rel_path
         try:
-            if self._file_exists(full_rel):
+            if await self._file_exists(full_rel):
                 return self.fail_response(f"File '{rel_path}' already exists.")
             parent = "/".join(full_rel.split("/")[:-1])
             if parent:
-                self.sandbox.fs.create_folder(parent, "755")
+                await self.async_sandbox.create_folder(parent, "755")
             # Daytona FS may expect bytes; accept either bytes or str
             data = file_contents if isinstance(file_contents, (bytes, bytearray)) else file_contents.encode()
-            upload_file_bytes(self.sandbox, full_rel, data)
-            self.sandbox.fs.set_file_permissions(full_rel, permissions)
+            await self.async_sandbox.run(upload_file_bytes, self.sandbox, full_rel, data)
+            await self.async_sandbox.set_file_permissions(full_rel, permissions)
             display_path = f"/{full_rel}" if not full_rel.startswith("/") else full_rel
             return self.success_response(f"File '{rel_path}' created. [Uploaded File: {display_path}]")
         except Exception as e:
             return self.fail_response(f"Error creating file: {str(e)}")
 
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "create_files",
+            "description": "Create or overwrite several files under ~/workspace in one transfer. Prefer this over repeated create_file calls when scaffolding a project.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "files": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "file_path": {"type": "string"},
+                                "file_contents": {"type": "string"}
+                            },
+                            "required": ["file_path", "file_contents"]
+                        }
+                    }
+                },
+                "required": ["files"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="create-files",
+        mappings=[
+            {"param_name": "files", "node_type": "content", "path": "."}
+        ],
+        example="""
+        <create-files>[{"file_path": "src/main.py", "file_contents": "print('hi')"}, {"file_path": "README.md", "file_contents": "# Demo"}]</create-files>
+        """
+    )
+    async def create_files(self, files) -> ToolResult:
+        try:
+            if isinstance(files, str):
+                files = json.loads(files)
+            contents = {}
+            for entry in files:
+                rel_path = self.clean_path(entry["file_path"])
+                data = entry.get("file_contents", "")
+                contents[os.path.relpath(rel_path, self.workspace_rel)] = (
+                    data if isinstance(data, (bytes, bytearray)) else str(data).encode()
+                )
+        except (ValueError, TypeError, KeyError) as e:
+            return self.fail_response(f"Invalid files list: {str(e)}")
+        if not contents:
+            return self.fail_response("No files given")
+        try:
+            written = await upload_files(self.async_sandbox, contents, dest=self.workspace_rel)
+            uploaded = ", ".join(f"/{path}" for path in written)
+            return self.success_response(f"{len(written)} files created. [Uploaded Files: {uploaded}]")
+        except SandboxScriptError as e:
+            return self.fail_response(f"Error extracting files: {str(e)}")
+        except Exception as e:
+            return self.fail_response(f"Error creating files: {str(e)}")
+
     @openapi_schema({
         "type": "function",
         "function": {
@@ -145,28 +247,122 @@ class SandboxFilesTool(SandboxToolsBase):
         ]
     )
     async def str_replace(self, file_path: str, old_str: str, new_str: str) -> ToolResult:
+        rel_path = self.clean_path(file_path)
         try:
-            rel_path = self.clean_path(file_path)
-            full_rel = rel_path
-            if not self._file_exists(full_rel):
-                return self.fail_response(f"File '{rel_path}' does not exist")
-
-            content_bytes = self.sandbox.fs.download_file(full_rel)
-            content = content_bytes.decode(errors='replace') if isinstance(content_bytes, (bytes, bytearray)) else str(content_bytes)
-            old_str = old_str.expandtabs()
-            new_str = new_str.expandtabs()
+            result = await self._edit_in_sandbox(
+                rel_path, {"op": "replace", "old_str": old_str, "new_str": new_str}
+            )
+            return self._edit_response("Replacement successful.", result)
+        except Exception as e:
+            return self.fail_response(f"Error replacing string: {str(e)}")
 
-            occurrences = content.count(old_str)
-            if occurrences == 0:
-                return self.fail_response(f"String not found")
-            if occurrences > 1:
-                return self.fail_response("Multiple occurrences found; ensure uniqueness")
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "apply_patch",
+            "description": "Apply a unified diff (one or more @@ hunks) to a file under workspace. Hunks are located by their context lines, so line numbers may be approximate.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {"type": "string"},
+                    "patch": {"type": "string"}
+                },
+                "required": ["file_path", "patch"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="apply-patch",
+        mappings=[
+            {"param_name": "file_path", "node_type": "attribute", "path": "file_path"},
+            {"param_name": "patch", "node_type": "content", "path": "."}
+        ],
+        # The hunk lines start at column 0: the example is copied into the prompt as is
+        example="""
+        <apply-patch file_path="src/main.py">
+@@ -1,2 +1,2 @@
+ import sys
+-print('hi')
++print('hello')
+</apply-patch>
+        """
+    )
+    async def apply_patch(self, file_path: str, patch: str) -> ToolResult:
+        rel_path = self.clean_path(file_path)
+        try:
+            # Hunks are matched from column 0; drop indentation shared by every line
+            result = await self._edit_in_sandbox(rel_path, {"op": "patch", "patch": textwrap.dedent(patch)})
+            return self._edit_response("Patch applied.", result)
+        except Exception as e:
+            return self.fail_response(f"Error applying patch: {str(e)}")
 
-            new_content = content.replace(old_str, new_str)
-            upload_file_bytes(self.sandbox, full_rel, new_content.encode())
-            return self.success_response("Replacement successful.")
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "replace_lines",
+            "description": "Replace lines start_line..end_line (1-based, inclusive) of a file under workspace. Use end_line = start_line - 1 to insert before start_line.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_path": {"type": "string"},
+                    "start_line": {"type": "integer"},
+                    "end_line": {"type": "integer"},
+                    "new_content": {"type": "string"}
+                },
+                "required": ["file_path", "start_line", "end_line", "new_content"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="replace-lines",
+        mappings=[
+            {"param_name": "file_path", "node_type": "attribute", "path": "file_path"},
+            {"param_name": "start_line", "node_type": "attribute", "path": "start_line"},
+            {"param_name": "end_line", "node_type": "attribute", "path": "end_line"},
+            {"param_name": "new_content", "node_type": "content", "path": "."}
+        ]
+    )
+    async def replace_lines(self, file_path: str, start_line: int, end_line: int, new_content: str) -> ToolResult:
+        rel_path = self.clean_path(file_path)
+        try:
+            result = await self._edit_in_sandbox(rel_path, {
+                "op": "lines",
+                "start_line": int(start_line),
+                "end_line": int(end_line),
+                "new_content": new_content,
+            })
+            return self._edit_response("Lines replaced.", result)
         except Exception as e:
-            return self.fail_response(f"Error replacing string: {str(e)}")
+            return self.fail_response(f"Error replacing lines: {str(e)}")
+
+    async def _edit_in_sandbox(self, rel_path: str, edit: dict) -> dict:
+        """Apply an edit with EDIT_SCRIPT next to the file; only a short diff comes back."""
+        spec = json.dumps(edit)
+        # Measured as it goes on the command line: quoting can grow it several times over
+        if len(shlex.quote(spec).encode()) > EDIT_INLINE_MAX_BYTES:
+            staging = f".iris-edit-{secrets.token_hex(8)}.json"
+            await self.async_sandbox.run(upload_file_bytes, self.sandbox, staging, spec.encode())
+            spec = f"@{staging}"
+        lock = self._edit_locks.setdefault(rel_path, asyncio.Lock())
+        self._edit_lock_users[rel_path] = self._edit_lock_users.get(rel_path, 0) + 1
+        try:
+            async with lock:
+                return await run_script(self.async_sandbox, EDIT_SCRIPT, rel_path, spec)
+        finally:
+            users = self._edit_lock_users[rel_path] - 1
+            if users:
+                self._edit_lock_users[rel_path] = users
+            else:
+                del self._edit_lock_users[rel_path]
+                del self._edit_locks[rel_path]
+
+    def _edit_response(self, message: str, result: dict) -> ToolResult:
+        if result.get("error"):
+            return self.fail_response(result["error"])
+        diff = result.get("diff") or "(no changes)"
+        if result.get("truncated"):
+            diff += "\n... (diff truncated)"
+        return self.success_response(f"{message}\n{diff}")
 
     @openapi_schema({
         "type": "function",
@@ -195,12 +391,12 @@ class SandboxFilesTool(SandboxToolsBase):
         try:
             rel_path = self.clean_path(file_path)
             full_rel = rel_path
-            if not self._file_exists(full_rel):
+            if not await self._file_exists(full_rel):
                 return self.fail_response(f"File '{rel_path}' does not exist")
             data = file_contents if isinstance(file_contents, (bytes, bytearray)) else file_contents.encode()
             # Atomic rewrite to prevent partial reads and race conditions
-            atomic_write_file_bytes(self.sandbox, full_rel, data)
-            self.sandbox.fs.set_file_permissions(full_rel, permissions)
+            await self.async_sandbox.run(atomic_write_file_bytes, self.sandbox, full_rel, data)
+            await self.async_sandbox.set_file_permissions(full_rel, permissions)
             display_path = f"/{full_rel}" if not full_rel.startswith("/") else full_rel
             return self.success_response(f"File '{rel_path}' rewritten. [Uploaded File: {display_path}]")
         except Exception as e:
@@ -230,9 +426,9 @@ class SandboxFilesTool(SandboxToolsBase):
         try:
             rel_path = self.clean_path(file_path)
             full_rel = rel_path
-            if not self._file_exists(full_rel):
+            if not await self._file_exists(full_rel):
                 return self.fail_response(f"File '{rel_path}' does not exist")
-            self.sandbox.fs.delete_file(full_rel)
+            await self.async_sandbox.delete_file(full_rel)
             return self.success_response(f"File '{rel_path}' deleted.")
         except Exception as e:
             return self.fail_response(f"Error deleting file: {str(e)}")
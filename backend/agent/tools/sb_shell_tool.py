@@ -1,68 +1,48 @@
-from typing import Optional, Dict, List
+import asyncio
+import os
+from typing import Optional, Dict, List, Any, Union
 from uuid import uuid4
 
 from agentpress.tool import ToolResult, openapi_schema, xml_schema
 from sandbox.sandbox import SandboxToolsBase, Sandbox
+from sandbox.scripts import TAIL_SCRIPT, run_script
+from utils.logger import logger
 
 """
 We pass plain dict payloads to Daytona SDK's execute_session_command to satisfy
 its Pydantic validation (expects dict or SDK SessionExecuteRequest). This keeps
 compatibility with both real SDK and mock.
+
+Commands are started with var_async and write their output to a log file under
+~/workspace/.iris/logs, read back by byte offset: new output is reported as
+tool_progress updates while the command runs, and only the tail is returned.
 """
 
+# Output returned in a tool result; the full log stays in the workspace
+SHELL_OUTPUT_MAX_BYTES = int(os.getenv("IRIS_SHELL_OUTPUT_MAX_BYTES", str(16 * 1024)))
+# Output sent per progress update while a command runs
+SHELL_PROGRESS_MAX_BYTES = int(os.getenv("IRIS_SHELL_PROGRESS_MAX_BYTES", str(4 * 1024)))
+SHELL_POLL_INTERVAL = float(os.getenv("IRIS_SHELL_POLL_INTERVAL", "1.0"))
+# Longest wait in check_command_output, below the response processor's tool timeout
+SHELL_MAX_WAIT = 110
+SHELL_LOG_DIR = "workspace/.iris/logs"
+
 class SandboxShellTool(SandboxToolsBase):
     """
     Run shell commands inside the Daytona sandbox.
-    IMPORTANT: We cd into $HOME/workspace and ensure it exists.
+    IMPORTANT: We cd into $HOME/workspace, which SandboxToolsBase.prepare creates.
     """
 
     def __init__(self, sandbox: Sandbox):
         super().__init__(sandbox)
         self._sessions: Dict[str, str] = {}  # Maps session names to session IDs
-        # Ensure workspace directory exists on initialization
-        self._ensure_workspace_directory()
-
-    def _ensure_workspace_directory(self):
-        """Ensure the workspace directory exists in the sandbox."""
-        try:
-            # Create workspace directory if it doesn't exist
-            session_id = str(uuid4())
-            self.sandbox.process.create_session(session_id)
-            
-            payload = {
-                "command": "mkdir -p $HOME/workspace && cd $HOME/workspace && pwd",
-                "var_async": False,
-            }
-            
-            # Call execute_session_command with broad compatibility across SDKs/mocks
-            try:
-                # Prefer passing timeout to avoid hangs
-                response = self._exec_with_timeout(session_id, payload, timeout=10)
-            except TypeError:
-                try:
-                    response = self.sandbox.process.execute_session_command(session_id=session_id, session_execute_request=payload)
-                except TypeError:
-                    response = self.sandbox.process.execute_session_command(session_id=session_id, request=payload)
-            
-            # Clean up the temporary session
-            try:
-                self.sandbox.process.delete_session(session_id)
-            except:
-                pass  # Ignore cleanup errors
-                
-            if response.exit_code != 0:
-                print(f"Warning: Failed to create workspace directory: {response.exit_code}")
-            else:
-                print("Workspace directory ensured at $HOME/workspace")
-                
-        except Exception as e:
-            print(f"Warning: Could not ensure workspace directory: {str(e)}")
+        self._commands: Dict[str, Dict[str, Any]] = {}  # Maps command IDs to their log and session
 
     async def _ensure_session(self, session_name: str = "default") -> str:
         if session_name not in self._sessions:
             session_id = str(uuid4())
             try:
-                self.sandbox.process.create_session(session_id)
+                await self.async_sandbox.create_session(session_id)
                 self._sessions[session_name] = session_id
             except Exception as e:
                 raise RuntimeError(f"Failed to create session: {str(e)}")
@@ -71,7 +51,7 @@ class SandboxShellTool(SandboxToolsBase):
     async def _cleanup_session(self, session_name: str):
         if session_name in self._sessions:
             try:
-                self.sandbox.process.delete_session(self._sessions[session_name])
+                await self.async_sandbox.delete_session(self._sessions[session_name])
                 del self._sessions[session_name]
             except Exception as e:
                 print(f"Warning: Failed to cleanup session {session_name}: {str(e)}")
@@ -80,14 +60,15 @@ class SandboxShellTool(SandboxToolsBase):
         "type": "function",
         "function": {
             "name": "execute_command",
-            "description": "Execute a shell command under $HOME/workspace. Use named sessions to maintain state.",
+            "description": "Execute a shell command under $HOME/workspace. Use named sessions to maintain state. Output is streamed while the command runs; the result holds the last part of it and the full log stays in the workspace. Set background=true for long-running commands (installs, builds, servers) and follow them with check_command_output.",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "command": {"type": "string", "description": "The shell command to run"},
                     "folder": {"type": "string", "description": "Optional subfolder of workspace"},
                     "session_name": {"type": "string", "default": "default"},
-                    "timeout": {"type": "integer", "default": 60}
+                    "timeout": {"type": "integer", "default": 60},
+                    "background": {"type": "boolean", "default": False, "description": "Return a command_id immediately instead of waiting. Runs in its own session unless session_name is given."}
                 },
                 "required": ["command"]
             }
@@ -99,10 +80,12 @@ class SandboxShellTool(SandboxToolsBase):
             {"param_name": "command", "node_type": "content", "path": "."},
             {"param_name": "folder", "node_type": "attribute", "path": ".", "required": False},
             {"param_name": "session_name", "node_type": "attribute", "path": ".", "required": False},
-            {"param_name": "timeout", "node_type": "attribute", "path": ".", "required": False}
+            {"param_name": "timeout", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "background", "node_type": "attribute", "path": ".", "required": False}
         ],
         example="""
         <execute-command>ls -la</execute-command>
+        <execute-command background="true">npm install</execute-command>
         """
     )
     async def execute_command(
@@ -110,53 +93,194 @@ class SandboxShellTool(SandboxToolsBase):
         command: str,
         folder: Optional[str] = None,
         session_name: str = "default",
-        timeout: int = 60
+        timeout: int = 60,
+        background: Union[bool, str] = False
     ) -> ToolResult:
         try:
-            session_id = await self._ensure_session(session_name)
-
-            # Build 'cd' into $HOME/workspace (and optional subfolder)
-            if folder:
-                # Normalize folder to be relative to workspace (strip leading slashes and optional 'workspace/' prefix)
-                folder = folder.strip("/")
-                if folder.startswith("workspace/"):
-                    folder = folder[len("workspace/"):]
-                cd_prefix = f'cd {self.workspace_abs_for_shell}/{folder}'
-            else:
-                cd_prefix = f'cd {self.workspace_abs_for_shell}'
-
-            full_cmd = f'{cd_prefix} && {command}'
+            background = background if isinstance(background, bool) else str(background).lower() in ("1", "true", "yes")
+            command_id = uuid4().hex[:12]
+            if background and session_name == "default":
+                # A busy default session would hold up the next foreground command
+                session_name = f"bg-{command_id}"
+            await self._start_command(command_id, command, folder, session_name)
 
-            payload = {"command": full_cmd, "var_async": False}
+            if background:
+                return self.success_response({
+                    "command_id": command_id,
+                    "status": "running",
+                    "log_file": f"/{self._commands[command_id]['log']}",
+                    "message": "Command started in the background. Use check_command_output with this command_id to follow it."
+                })
 
-            try:
-                response = self._exec_with_timeout(session_id, payload, timeout=timeout)
-            except TypeError:
-                try:
-                    response = self.sandbox.process.execute_session_command(session_id=session_id, session_execute_request=payload)
-                except TypeError:
-                    response = self.sandbox.process.execute_session_command(session_id=session_id, request=payload)
-
-            logs = self.sandbox.process.get_session_command_logs(
-                session_id=session_id,
-                command_id=response.cmd_id
-            )
-
-            if response.exit_code == 0:
+            exit_code = await self._follow_command(command_id, int(timeout))
+            output = await self._command_output_tail(command_id)
+            if exit_code is None:
+                self._detach_session(command_id, session_name)
+                return self.fail_response(
+                    f"Command timed out after {timeout} seconds and is still running as command_id {command_id}; "
+                    f"use check_command_output to follow it. Later commands in session '{session_name}' "
+                    f"run in a new shell. Output so far: {output}"
+                )
+            if exit_code == 0:
                 return self.success_response({
-                    "output": logs,
-                    "exit_code": response.exit_code
+                    "output": output,
+                    "exit_code": exit_code
                 })
             else:
-                return self.fail_response(f"Command failed with exit code {response.exit_code}: {logs or ''}")
+                return self.fail_response(f"Command failed with exit code {exit_code}: {output}")
 
+        except asyncio.TimeoutError:
+            return self.fail_response(f"Command timed out after {timeout} seconds")
         except Exception as e:
             return self.fail_response(f"Error executing command: {str(e)}")
 
+    @openapi_schema({
+        "type": "function",
+        "function": {
+            "name": "check_command_output",
+            "description": "Get the status and output of a command started by execute_command. Without offset, returns the last part of the output; with offset, returns output from that byte offset (use next_offset to page). wait blocks up to that many seconds for the command to finish while streaming its output.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "command_id": {"type": "string"},
+                    "offset": {"type": "integer", "description": "Byte offset in the command's log to read from"},
+                    "wait": {"type": "integer", "default": 0, "description": f"Seconds to wait for completion (max {SHELL_MAX_WAIT})"}
+                },
+                "required": ["command_id"]
+            }
+        }
+    })
+    @xml_schema(
+        tag_name="check-command-output",
+        mappings=[
+            {"param_name": "command_id", "node_type": "attribute", "path": "."},
+            {"param_name": "offset", "node_type": "attribute", "path": ".", "required": False},
+            {"param_name": "wait", "node_type": "attribute", "path": ".", "required": False}
+        ],
+        example="""
+        <check-command-output command_id="3f2a9c1b7e4d" wait="30"></check-command-output>
+        """
+    )
+    async def check_command_output(
+        self,
+        command_id: str,
+        offset: Optional[int] = None,
+        wait: int = 0
+    ) -> ToolResult:
+        info = self._commands.get(command_id)
+        if info is None:
+            return self.fail_response(f"Unknown command_id '{command_id}'")
+        try:
+            wait = min(max(int(wait or 0), 0), SHELL_MAX_WAIT)
+            if wait:
+                await self._follow_command(command_id, wait)
+            if offset is None:
+                state = await self._read_log(info["log"], -SHELL_OUTPUT_MAX_BYTES, SHELL_OUTPUT_MAX_BYTES, "tail")
+            else:
+                state = await self._read_log(info["log"], int(offset), SHELL_OUTPUT_MAX_BYTES, "head")
+            return self.success_response({
+                "command_id": command_id,
+                "status": "running" if state["exit_code"] is None else "completed",
+                "exit_code": state["exit_code"],
+                "output": state["output"],
+                "offset": state["offset"],
+                "next_offset": state["next_offset"],
+                "size": state["size"],
+                "log_file": f"/{info['log']}"
+            })
+        except Exception as e:
+            return self.fail_response(f"Error reading command output: {str(e)}")
+
     async def cleanup(self):
         for session_name in list(self._sessions.keys()):
             await self._cleanup_session(session_name)
 
+    async def _start_command(self, command_id: str, command: str, folder: Optional[str], session_name: str) -> None:
+        """Start command asynchronously in the session, writing its output and exit code to log files."""
+        session_id = await self._ensure_session(session_name)
+
+        # Build 'cd' into $HOME/workspace (and optional subfolder)
+        if folder:
+            # Normalize folder to be relative to workspace (strip leading slashes and optional 'workspace/' prefix)
+            folder = folder.strip("/")
+            if folder.startswith("workspace/"):
+                folder = folder[len("workspace/"):]
+            cd_prefix = f'cd {self.workspace_abs_for_shell}/{folder}'
+        else:
+            cd_prefix = f'cd {self.workspace_abs_for_shell}'
+
+        log = f"{SHELL_LOG_DIR}/{command_id}.log"
+        # A group rather than a subshell, so cd and exports persist in the session;
+        # the EXIT trap still records the exit code if the command exits the shell
+        full_cmd = (
+            f'mkdir -p $HOME/{SHELL_LOG_DIR}; '
+            f"trap 'echo $? > $HOME/{log}.exit' EXIT; "
+            f'{{ {cd_prefix} && {{\n{command}\n}}; }} > $HOME/{log} 2>&1; '
+            f'echo $? > $HOME/{log}.exit; trap - EXIT'
+        )
+        payload = {"command": full_cmd, "var_async": True}
+
+        response = await self.async_sandbox.run(self._exec_with_timeout, session_id, payload, 30, timeout=60)
+        self._commands[command_id] = {
+            "log": log,
+            "session_id": session_id,
+            "cmd_id": getattr(response, "cmd_id", None),
+            "progress_offset": 0,
+        }
+        logger.debug(f"Started command {command_id} in session {session_name}")
+
+    def _detach_session(self, command_id: str, session_name: str) -> None:
+        """Hand the session of a timed-out command over to that command.
+
+        Commands in a session run one after another, so the next command in
+        session_name gets a fresh session instead of queueing behind this one.
+        The old session is still deleted by cleanup().
+        """
+        session_id = self._commands[command_id]["session_id"]
+        if self._sessions.get(session_name) == session_id:
+            del self._sessions[session_name]
+            self._sessions[f"bg-{command_id}"] = session_id
+
+    async def _read_log(self, log: str, offset: int, limit: int, mode: str) -> Dict[str, Any]:
+        return await run_script(self.async_sandbox, TAIL_SCRIPT, log, str(offset), str(limit), mode, timeout=30)
+
+    async def _follow_command(self, command_id: str, wait: int) -> Optional[int]:
+        """Report new output as progress until the command exits or wait seconds pass.
+
+        Returns:
+            The exit code, or None if the command is still running
+        """
+        info = self._commands[command_id]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        # Short commands finish within the first polls; back off for long ones
+        delay = min(0.1, SHELL_POLL_INTERVAL)
+        while True:
+            state = await self._read_log(info["log"], info["progress_offset"], SHELL_PROGRESS_MAX_BYTES, "tail")
+            if state["output"]:
+                self.report_progress(
+                    command_id=command_id,
+                    output=state["output"],
+                    offset=state["offset"],
+                    size=state["size"]
+                )
+            info["progress_offset"] = state["next_offset"]
+            if state["exit_code"] is not None:
+                return state["exit_code"]
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, SHELL_POLL_INTERVAL)
+
+    async def _command_output_tail(self, command_id: str) -> str:
+        """The last SHELL_OUTPUT_MAX_BYTES of output, pointing at the full log if cut."""
+        info = self._commands[command_id]
+        state = await self._read_log(info["log"], -SHELL_OUTPUT_MAX_BYTES, SHELL_OUTPUT_MAX_BYTES, "tail")
+        if state["offset"] > 0:
+            return f"[{state['offset']} earlier bytes omitted; full output in /{info['log']}]\n{state['output']}"
+        return state["output"]
+
     # Internal helper to execute with timeout across SDK signatures
     def _exec_with_timeout(self, session_id: str, payload: dict, timeout: int):
         try:
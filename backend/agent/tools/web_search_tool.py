@@ -1,14 +1,82 @@
 from tavily import AsyncTavilyClient
 import httpx
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
+import asyncio
 import os
+import re
 from dotenv import load_dotenv
-from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema
+from agentpress.tool import Tool, ToolResult, openapi_schema, xml_schema, cached_result
+from utils.logger import logger
 import json
 
 # TODO: add subpages, etc... in filters as sometimes its necessary 
 
+TAVILY_EXTRACT_URL = "https://api.tavily.com/extract"
+# URLs of one crawl_webpage call extracted at the same time
+CRAWL_CONCURRENCY = int(os.getenv("IRIS_CRAWL_CONCURRENCY", "5"))
+CRAWL_MAX_URLS = 20
+# Extract responses are read up to this size; longer pages are cut while downloading
+CRAWL_MAX_BYTES = int(os.getenv("IRIS_CRAWL_MAX_BYTES", str(1024 * 1024)))
+CRAWL_TIMEOUT = float(os.getenv("IRIS_CRAWL_TIMEOUT", "60"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_crawl_client: Optional[httpx.AsyncClient] = None
+_crawl_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_crawl_client() -> httpx.AsyncClient:
+    """Process-wide pooled client for extract requests (HTTP/2 when h2 is installed).
+
+    Connections belong to an event loop, so a new client is made when called
+    from a different loop.
+    """
+    global _crawl_client, _crawl_client_loop
+    loop = asyncio.get_running_loop()
+    if _crawl_client is None or _crawl_client.is_closed or _crawl_client_loop is not loop:
+        _crawl_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(CRAWL_TIMEOUT, connect=10.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0),
+        )
+        _crawl_client_loop = loop
+    return _crawl_client
+
+
+async def close_crawl_client() -> None:
+    """Close the shared crawl client."""
+    global _crawl_client, _crawl_client_loop
+    if _crawl_client is not None:
+        await _crawl_client.aclose()
+    _crawl_client = None
+    _crawl_client_loop = None
+
+
+def _salvage_truncated_extract(body: str) -> dict:
+    """Best effort for an extract response cut at CRAWL_MAX_BYTES: its url, title and start of raw_content."""
+    item = {}
+    for field in ("url", "title"):
+        match = re.search(r'"%s"\s*:\s*"((?:[^"\\]|\\.)*)"' % field, body)
+        if match:
+            item[field] = json.loads(f'"{match.group(1)}"')
+    match = re.search(r'"raw_content"\s*:\s*"', body)
+    if match:
+        fragment = body[match.end():]
+        # Drop an escape sequence cut in half, then close the string
+        partial = re.search(r'(\\+)(u[0-9a-fA-F]{0,3})?$', fragment)
+        if partial and len(partial.group(1)) % 2 == 1:
+            fragment = fragment[:partial.start() + len(partial.group(1)) - 1]
+        try:
+            item["raw_content"], _ = json.JSONDecoder().raw_decode(f'"{fragment}"')
+        except ValueError:
+            pass
+    return item
+
 class WebSearchTool(Tool):
     """Tool for performing web searches using the Exa API."""
 
@@ -24,6 +92,7 @@ class WebSearchTool(Tool):
         # Tavily asynchronous search client
         self.tavily_client = AsyncTavilyClient(api_key=self.api_key)
 
+    @cached_result(ttl=900)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -158,6 +227,7 @@ class WebSearchTool(Tool):
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    @cached_result(ttl=3600)
     @openapi_schema({
         "type": "function",
         "function": {
@@ -168,7 +238,7 @@ class WebSearchTool(Tool):
                 "properties": {
                     "url": {
                         "type": "string",
-                        "description": "The complete URL of the webpage to crawl. This should be a valid, accessible web address including the protocol (http:// or https://). The tool will attempt to extract all text content from this URL."
+                        "description": "The complete URL of the webpage to crawl. This should be a valid, accessible web address including the protocol (http:// or https://). The tool will attempt to extract all text content from this URL. Several URLs (up to 20), separated by whitespace or newlines, are crawled concurrently."
                     }
                 },
                 "required": ["url"]
@@ -190,16 +260,21 @@ class WebSearchTool(Tool):
         <crawl-webpage 
             url="https://example.com/article/technology-trends">
         </crawl-webpage>
+
+        <!-- Several pages at once, separated by spaces -->
+        <crawl-webpage 
+            url="https://example.com/a https://example.com/b">
+        </crawl-webpage>
         '''
     )
     async def crawl_webpage(
         self,
-        url: str
+        url: Union[str, List[str]]
     ) -> ToolResult:
         """
-        Retrieve the complete text content of a webpage using the Exa API.
+        Retrieve the complete text content of one or more webpages using the Tavily extract API.
         
-        This function crawls the specified URL and extracts the full text content from the page.
+        This function crawls the specified URLs and extracts the full text content from the pages.
         The extracted text is returned in the response, making it available for further analysis,
         processing, or reference.
         
@@ -208,12 +283,17 @@ class WebSearchTool(Tool):
         - URL: The URL of the crawled page
         - Published Date: When the content was published (if available)
         - Text: The complete text content of the webpage
+        - Truncated: Set when the page exceeded IRIS_CRAWL_MAX_BYTES and was cut
+        
+        Several URLs are extracted concurrently (at most IRIS_CRAWL_CONCURRENCY at a
+        time) over the shared pooled client; a page that fails is reported in place.
         
         Note that some pages may have limitations on access due to paywalls, 
         access restrictions, or dynamic content loading.
         
         Parameters:
-        - url: The URL of the webpage to crawl
+        - url: The URL of the webpage to crawl, several separated by whitespace, or a list.
+          Commas are left alone since they can be part of a URL.
         """
         try:
             # Parse the URL parameter exactly as it would appear in XML
@@ -222,58 +302,32 @@ class WebSearchTool(Tool):
                 
             # Handle url parameter (as it would appear in XML)
             if isinstance(url, str):
-                # Add protocol if missing
-                if not (url.startswith('http://') or url.startswith('https://')):
-                    url = 'https://' + url
+                # Whitespace can't appear in a URL; commas can (?ids=1,2)
+                urls = url.split()
+            elif isinstance(url, list) and all(isinstance(u, str) for u in url):
+                urls = [u.strip() for u in url if u.strip()]
             else:
                 return self.fail_response("URL must be a string.")
-                
-            # ---------- Tavily extract endpoint ----------
-            async with httpx.AsyncClient() as client:
-                headers = {
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json",
-                }
-                payload = {
-                    "urls": url,
-                    "include_images": False,
-                    "extract_depth": "basic",
-                }
-                response = await client.post(
-                    "https://api.tavily.com/extract",
-                    json=payload,
-                    headers=headers,
-                    timeout=60,
-                )
-                response.raise_for_status()
-                data = response.json()
-                print(f"--- Raw Tavily Response ---")
-                print(data)
-                print(f"--------------------------")
+            if not urls:
+                return self.fail_response("A valid URL is required.")
+            if len(urls) > CRAWL_MAX_URLS:
+                return self.fail_response(f"At most {CRAWL_MAX_URLS} URLs can be crawled at once.")
+            # Add protocol if missing
+            urls = [u if u.startswith(('http://', 'https://')) else 'https://' + u for u in urls]
 
-            # Normalise Tavily extract output to a list of dicts
-            extracted = []
-            if isinstance(data, list):
-                extracted = data
-            elif isinstance(data, dict):
-                if "results" in data and isinstance(data["results"], list):
-                    extracted = data["results"]
-                elif "urls" in data and isinstance(data["urls"], dict):
-                    extracted = list(data["urls"].values())
-                else:
-                    extracted = [data]
+            semaphore = asyncio.Semaphore(max(1, CRAWL_CONCURRENCY))
 
-            formatted_results = []
-            for item in extracted:
-                formatted_result = {
-                    "Title": item.get("title"),
-                    "URL": item.get("url") or url,
-                    "Text":item.get("raw_content") or item.get("content") or item.get("text")
-                }
-                if item.get("published_date"):
-                    formatted_result["Published Date"] = item["published_date"]
-                formatted_results.append(formatted_result)
-            
+            async def crawl(page_url: str) -> List[dict]:
+                async with semaphore:
+                    try:
+                        return await self._extract(page_url)
+                    except Exception as e:
+                        if len(urls) == 1:
+                            raise
+                        return [{"URL": page_url, "Error": str(e)[:200]}]
+
+            pages = await asyncio.gather(*[crawl(u) for u in urls])
+            formatted_results = [result for page in pages for result in page]
             return self.success_response(formatted_results)
         
         except Exception as e:
@@ -284,6 +338,63 @@ class WebSearchTool(Tool):
                 simplified_message += "..."
             return self.fail_response(simplified_message)
 
+    async def _extract(self, url: str) -> List[dict]:
+        """Extract one page, reading at most CRAWL_MAX_BYTES of the response."""
+        # ---------- Tavily extract endpoint ----------
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        payload = {
+            "urls": url,
+            "include_images": False,
+            "extract_depth": "basic",
+        }
+        body = bytearray()
+        truncated = False
+        async with get_crawl_client().stream("POST", TAVILY_EXTRACT_URL, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= CRAWL_MAX_BYTES:
+                    # Stop downloading; the connection is closed rather than drained
+                    del body[CRAWL_MAX_BYTES:]
+                    truncated = True
+                    break
+        text = body.decode("utf-8", errors="replace")
+
+        if truncated:
+            logger.info(f"Crawl of {url} cut at {CRAWL_MAX_BYTES} bytes")
+            data = _salvage_truncated_extract(text)
+        else:
+            data = json.loads(text)
+
+        # Normalise Tavily extract output to a list of dicts
+        extracted = []
+        if isinstance(data, list):
+            extracted = data
+        elif isinstance(data, dict):
+            if "results" in data and isinstance(data["results"], list):
+                extracted = data["results"]
+            elif "urls" in data and isinstance(data["urls"], dict):
+                extracted = list(data["urls"].values())
+            else:
+                extracted = [data]
+
+        formatted_results = []
+        for item in extracted:
+            formatted_result = {
+                "Title": item.get("title"),
+                "URL": item.get("url") or url,
+                "Text":item.get("raw_content") or item.get("content") or item.get("text")
+            }
+            if item.get("published_date"):
+                formatted_result["Published Date"] = item["published_date"]
+            if truncated:
+                formatted_result["Truncated"] = True
+            formatted_results.append(formatted_result)
+        return formatted_results
+
 
 if __name__ == "__main__":
     import asyncio
@@ -239,7 +239,8 @@ The above is a summary of the conversation history. The conversation continues b
         thread_id: str, 
         add_message_callback, 
         model: str = "gpt-4o-mini",
-        force: bool = False
+        force: bool = False,
+        token_count: Optional[int] = None
     ) -> bool:
         """Check if thread needs summarization and summarize if so.
         
@@ -248,13 +249,16 @@ The above is a summary of the conversation history. The conversation continues b
             add_message_callback: Callback to add the summary message to the thread
             model: LLM model to use for summarization
             force: Whether to force summarization regardless of token count
+            token_count: Current token count of the thread if the caller already
+                tracks it (e.g. ThreadManager's running total); skips recounting
             
         Returns:
             True if summarization was performed, False otherwise
         """
         try:
             # Get token count using LiteLLM (accurate model-specific counting)
-            token_count = await self.get_thread_token_count(thread_id)
+            if token_count is None:
+                token_count = await self.get_thread_token_count(thread_id)
             
             # If token count is below threshold and not forcing, no summarization needed
             if token_count < self.token_threshold and not force:
@@ -0,0 +1,160 @@
+"""
+Incremental per-thread cache of LLM-formatted messages.
+
+Each agent iteration needs the thread's LLM messages. Instead of re-running
+get_llm_formatted_messages (which aggregates the whole thread) every turn, the
+cache loads the thread once and afterwards only fetches rows created since the
+newest row it has seen:
+- Messages added through ThreadManager.add_message are appended directly
+- Rows written by other processes are picked up by the delta fetch
+- A new summary message invalidates the cache, since it starts a new window
+
+The cache also keeps a running token total per model. Each cached message is
+tokenized once (memoized by message ID and model) and only messages added since
+the last count are summed, so checking the context size is O(new messages).
+"""
+
+import json
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable
+
+from utils.logger import logger
+
+MESSAGE_COLUMNS = 'message_id, type, content, created_at'
+
+
+def parse_message_content(content: Any) -> Any:
+    """Parse message content stored as a JSON string, as get_llm_formatted_messages does."""
+    if isinstance(content, str):
+        return json.loads(content)
+    return content
+
+
+def is_summary_row(row: Dict[str, Any]) -> bool:
+    """Return True for rows that start a new context window."""
+    return row.get('type') == 'summary' and row.get('is_llm_message', True)
+
+
+class ThreadMessageCache:
+    """LLM messages of one thread plus the cursor for incremental refreshes."""
+
+    def __init__(self, thread_id: str):
+        self.thread_id = thread_id
+        self.messages: List[Dict[str, Any]] = []
+        self.message_ids: List[str] = []
+        self._message_ids: Set[str] = set()
+        # (model, message_id) -> token count; kept across invalidation since
+        # messages after a summary are counted again after the reload, then
+        # pruned to the messages that are still cached
+        self._message_tokens: Dict[Tuple[str, str], int] = {}
+        # model -> (number of messages counted, running total)
+        self._token_totals: Dict[str, Tuple[int, int]] = {}
+        # created_at of the newest row read from the database
+        self.cursor: Optional[str] = None
+        self.loaded = False
+        # Incremented whenever messages change
+        self.version = 0
+        # Counters for observability
+        self.full_loads = 0
+        self.delta_loads = 0
+
+    def invalidate(self) -> None:
+        """Drop cached messages; the next refresh reloads the thread."""
+        self.messages = []
+        self.message_ids = []
+        self._message_ids = set()
+        self._token_totals = {}
+        self.cursor = None
+        self.loaded = False
+        self.version += 1
+
+    def append(self, message_id: str, content: Any) -> bool:
+        """Append a message unless it is already cached.
+
+        Returns:
+            True if the message was added.
+        """
+        if message_id in self._message_ids:
+            return False
+        try:
+            parsed = parse_message_content(content)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse message: {content}")
+            return False
+        self._message_ids.add(message_id)
+        self.message_ids.append(message_id)
+        self.messages.append(parsed)
+        self.version += 1
+        return True
+
+    def token_count(self, model: str, count_message_tokens: Callable[[Dict[str, Any]], int]) -> int:
+        """Return the token total of the cached messages for a model.
+
+        Args:
+            model: Model whose tokenizer count_message_tokens uses
+            count_message_tokens: Returns the token count of a single message
+
+        Returns:
+            Sum of the per-message token counts. Only messages added since the
+            previous call for this model are tokenized.
+        """
+        counted, total = self._token_totals.get(model, (0, 0))
+        for message_id, message in zip(self.message_ids[counted:], self.messages[counted:]):
+            key = (model, message_id)
+            tokens = self._message_tokens.get(key)
+            if tokens is None:
+                tokens = self._message_tokens[key] = count_message_tokens(message)
+            total += tokens
+        self._token_totals[model] = (len(self.messages), total)
+        return total
+
+    async def refresh(self, client) -> List[Dict[str, Any]]:
+        """Bring the cache up to date and return the cached messages."""
+        if self.loaded:
+            rows = await self._fetch_since(client, self.cursor)
+            self.delta_loads += 1
+            if any(is_summary_row(row) and row['message_id'] not in self._message_ids for row in rows):
+                logger.debug(f"New summary in thread {self.thread_id}, reloading message cache")
+                self.invalidate()
+            else:
+                self._apply(rows)
+                return self.messages
+
+        await self._load(client)
+        return self.messages
+
+    async def _load(self, client) -> None:
+        """Load the latest summary and every LLM message after it."""
+        self.invalidate()
+        summary_result = await client.table('messages').select('created_at') \
+            .eq('thread_id', self.thread_id) \
+            .eq('type', 'summary') \
+            .eq('is_llm_message', True) \
+            .order('created_at', desc=True) \
+            .limit(1) \
+            .execute()
+
+        since = summary_result.data[0]['created_at'] if summary_result.data else None
+        rows = await self._fetch_since(client, since)
+        self._apply(rows)
+        self._message_tokens = {
+            key: tokens for key, tokens in self._message_tokens.items() if key[1] in self._message_ids
+        }
+        self.loaded = True
+        self.full_loads += 1
+
+    async def _fetch_since(self, client, since: Optional[str]) -> List[Dict[str, Any]]:
+        # gte rather than gt: rows sharing the cursor timestamp are deduplicated by ID
+        query = client.table('messages').select(MESSAGE_COLUMNS) \
+            .eq('thread_id', self.thread_id) \
+            .eq('is_llm_message', True)
+        if since is not None:
+            query = query.gte('created_at', since)
+        result = await query.order('created_at').execute()
+        return result.data or []
+
+    def _apply(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self.append(row['message_id'], row['content'])
+        if rows:
+            # Rows are ordered by created_at
+            self.cursor = rows[-1]['created_at']
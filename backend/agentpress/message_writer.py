@@ -0,0 +1,189 @@
+"""
+Write-behind persistence for thread messages.
+
+This module batches inserts into the messages table so that status events,
+tool results and assistant messages do not each pay a database round trip:
+- Message IDs are assigned client-side so callers get the message immediately
+- Inserts are flushed in batches, by count or after a short delay
+- flush() is the durable barrier used before reading a thread back, at the
+  end of a run and on cancellation
+- A row the database rejects (e.g. its thread was deleted) is dropped so it
+  cannot hold up the rows queued behind it
+"""
+
+import asyncio
+import os
+from typing import List, Dict, Any, Optional, Set, Callable
+
+from utils.logger import logger
+try:
+    from postgrest.exceptions import APIError as PostgrestAPIError  # type: ignore
+except Exception:  # pragma: no cover
+    PostgrestAPIError = None  # type: ignore
+
+# Flush when this many rows are pending ...
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("IRIS_MESSAGE_BATCH_SIZE", "50"))
+# ... or this long after the first pending row was queued
+DEFAULT_FLUSH_INTERVAL_MS = int(os.getenv("IRIS_MESSAGE_FLUSH_INTERVAL_MS", "5"))
+# Status types that only matter to live subscribers
+TRANSIENT_STATUS_TYPES: Set[str] = {"heartbeat"}
+MAX_INSERT_RETRIES = 3
+# SQLSTATE classes of errors caused by the row itself: data exceptions and
+# integrity constraint violations. Retrying such a row can never succeed.
+REJECTED_ROW_SQLSTATE_CLASSES = ("22", "23")
+
+
+def is_rejected_row_error(error: Exception) -> bool:
+    """Return True if the database refused the rows themselves, rather than being unavailable."""
+    if PostgrestAPIError is None or not isinstance(error, PostgrestAPIError):
+        return False
+    return str(error.code or "").startswith(REJECTED_ROW_SQLSTATE_CLASSES)
+
+
+class MessageWriter:
+    """Queues message rows and inserts them into the messages table in batches."""
+
+    def __init__(
+        self,
+        db_connection,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+        on_rejected: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+    ):
+        """Initialize the MessageWriter.
+
+        Args:
+            db_connection: DBConnection used to obtain the Supabase client
+            max_batch_size: Maximum number of rows per insert
+            flush_interval_ms: Delay before a partial batch is flushed
+            on_rejected: Called with rows the database rejected; they are dropped
+        """
+        self.db = db_connection
+        self.max_batch_size = max(1, max_batch_size)
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self.on_rejected = on_rejected
+        # Counters for observability
+        self.rows_written = 0
+        self.rows_rejected = 0
+        self.round_trips = 0
+
+    @property
+    def pending_count(self) -> int:
+        """Number of rows waiting to be written."""
+        return len(self._pending)
+
+    def enqueue(self, row: Dict[str, Any]) -> None:
+        """Queue a row for insertion and schedule a flush."""
+        self._pending.append(row)
+        if len(self._pending) >= self.max_batch_size:
+            self._spawn(self._background_flush())
+        elif self._timer is None or self._timer.done():
+            self._timer = self._spawn(self._delayed_flush())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self._background_flush()
+
+    async def _background_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            # Rows stay queued; the next flush retries them
+            logger.error(f"Background message flush failed: {str(e)}", exc_info=True)
+
+    async def flush(self) -> bool:
+        """Write all queued rows to the database.
+
+        When the database rejects a batch it is retried row by row: rows it
+        still rejects are dropped and reported to on_rejected, the others are
+        written.
+
+        Returns:
+            True if the queue was fully drained, False if the database could not
+            be reached (unwritten rows are kept at the head of the queue).
+        """
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:len(batch)]
+                error = await self._insert_batch(batch)
+                if error is None:
+                    continue
+                if not is_rejected_row_error(error):
+                    self._pending[:0] = batch
+                    return False
+                # Some row is at fault; find it so it doesn't hold up the others
+                if not await self._insert_rows(batch):
+                    return False
+        return True
+
+    async def _insert_rows(self, batch: List[Dict[str, Any]]) -> bool:
+        """Insert rows one at a time, dropping the ones the database rejects.
+
+        Returns:
+            False if the database could not be reached; the rows not yet
+            written are put back at the head of the queue.
+        """
+        for i, row in enumerate(batch):
+            error = await self._insert_batch([row])
+            if error is None:
+                continue
+            if not is_rejected_row_error(error):
+                self._pending[:0] = batch[i:]
+                return False
+            self._reject([row], error)
+        return True
+
+    def _reject(self, rows: List[Dict[str, Any]], error: Exception) -> None:
+        self.rows_rejected += len(rows)
+        for row in rows:
+            logger.error(
+                f"Dropping message {row.get('message_id')} of thread {row.get('thread_id')} "
+                f"rejected by the database: {str(error)}"
+            )
+        if self.on_rejected is not None:
+            try:
+                self.on_rejected(rows)
+            except Exception as e:
+                logger.error(f"Error handling rejected messages: {str(e)}", exc_info=True)
+
+    async def _insert_batch(self, batch: List[Dict[str, Any]]) -> Optional[Exception]:
+        """Insert rows in one round trip, retrying transient errors.
+
+        Returns:
+            None on success, otherwise the last error.
+        """
+        error = None
+        for retry in range(MAX_INSERT_RETRIES):
+            try:
+                client = await self.db.get_client()
+                await client.table('messages').insert(batch, returning='minimal').execute()
+                self.round_trips += 1
+                self.rows_written += len(batch)
+                logger.debug(f"Flushed {len(batch)} messages ({self.round_trips} round trips, {self.rows_written} rows total)")
+                return None
+            except Exception as e:
+                error = e
+                logger.error(f"Failed to flush {len(batch)} messages (retry {retry}): {str(e)}")
+                if is_rejected_row_error(e):
+                    break
+                if retry < MAX_INSERT_RETRIES - 1:
+                    await asyncio.sleep(0.1 * (2 ** retry))
+        return error
+
+    async def close(self) -> bool:
+        """Flush remaining rows and stop any scheduled flush."""
+        drained = await self.flush()
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        return drained
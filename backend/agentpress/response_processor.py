@@ -11,6 +11,7 @@ This module handles processing of LLM responses including:
 import json
 import asyncio
 import re
+import time
 import uuid
 from typing import List, Dict, Any, Optional, Tuple, AsyncGenerator, Callable, Union, Literal
 from dataclasses import dataclass
@@ -18,9 +19,9 @@ from datetime import datetime, timezone
 
 from litellm import completion_cost, token_counter
 
-from agentpress.tool import Tool, ToolResult
+from agentpress.tool import Tool, ToolResult, set_progress_sink
 from agentpress.tool_registry import ToolRegistry
-from agentpress.xml_parser import XMLToolParser
+from agentpress.xml_parser import XMLToolParser, StreamingXMLScanner
 from agentpress.tool_executor import ToolExecutor
 from utils.logger import logger
 
@@ -80,6 +81,49 @@ class ProcessorConfig:
         if self.max_xml_tool_calls < 0:
             raise ValueError("max_xml_tool_calls must be a non-negative integer (0 = no limit)")
 
+class StreamingContentBuffer:
+    """Append-only buffer for streamed assistant content.
+
+    Deltas are kept as a list of parts with a running length so appends never
+    copy the text received so far; the parts are joined once when the final
+    message is built. End offsets of detected XML tool chunks are recorded as
+    they stream in, so truncating at the XML tool limit needs no search.
+    """
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._length = 0
+        self._joined: Optional[str] = None
+        self.tool_chunk_ends: List[int] = []
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def append(self, text: str) -> int:
+        """Append text and return the offset at which it starts."""
+        offset = self._length
+        if text:
+            self._parts.append(text)
+            self._length += len(text)
+            self._joined = None
+        return offset
+
+    def mark_tool_chunk_end(self, offset: int) -> None:
+        """Record the end offset of a completed XML tool chunk."""
+        self.tool_chunk_ends.append(offset)
+
+    def getvalue(self, end: Optional[int] = None) -> str:
+        """Return the accumulated content, optionally truncated at end."""
+        if self._joined is None:
+            self._joined = "".join(self._parts)
+            self._parts = [self._joined] if self._joined else []
+        if end is None or end >= self._length:
+            return self._joined
+        return self._joined[:max(0, end)]
+
 class ResponseProcessor:
     """Processes LLM responses, extracting and executing tool calls."""
     
@@ -120,11 +164,14 @@ class ResponseProcessor:
         Yields:
             Complete message objects matching the DB schema, except for content chunks.
         """
-        accumulated_content = ""
+        content_buffer = StreamingContentBuffer()
         tool_calls_buffer = {}
-        current_xml_content = ""
+        # Resumable scanner: each delta is scanned once, only the unterminated tail is kept
+        xml_scanner = StreamingXMLScanner(list(self.xml_parser.tool_name_mapping.keys()))
         xml_chunks_buffer = []
         pending_tool_executions = []
+        # (context, update) pairs reported by streamed tool executions via Tool.report_progress
+        progress_queue: asyncio.Queue = asyncio.Queue()
         yielded_tool_indices = set() # Stores indices of tools whose *status* has been yielded
         tool_index = 0
         xml_tool_call_count = 0
@@ -155,6 +202,9 @@ class ResponseProcessor:
             # --- End Start Events ---
 
             async for chunk in llm_response:
+                while not progress_queue.empty():
+                    yield self._tool_progress_message(*progress_queue.get_nowait(), thread_id, thread_run_id)
+
                 if hasattr(chunk, 'choices') and chunk.choices and hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
                     finish_reason = chunk.choices[0].finish_reason
                     logger.debug(f"Detected finish_reason: {finish_reason}")
@@ -166,13 +216,12 @@ class ResponseProcessor:
                     if delta and hasattr(delta, 'reasoning_content') and delta.reasoning_content:
                         logger.info(f"[THINKING]: {delta.reasoning_content}")
                         # Append reasoning to main content to be saved in the final message
-                        accumulated_content += delta.reasoning_content
+                        content_buffer.append(delta.reasoning_content)
 
                     # Process content chunk
                     if delta and hasattr(delta, 'content') and delta.content:
                         chunk_content = delta.content
-                        accumulated_content += chunk_content
-                        current_xml_content += chunk_content
+                        chunk_offset = content_buffer.append(chunk_content)
 
                         if not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
                             # Yield ONLY content chunk (don't save)
@@ -189,10 +238,12 @@ class ResponseProcessor:
 
                         # --- Process XML Tool Calls (if enabled and limit not reached) ---
                         if config.xml_tool_calling and not (config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls):
-                            xml_chunks = self._extract_xml_chunks(current_xml_content)
-                            for xml_chunk in xml_chunks:
-                                current_xml_content = current_xml_content.replace(xml_chunk, "", 1)
+                            scanner_offset = xml_scanner.consumed
+                            for streamed_chunk in xml_scanner.feed(chunk_content):
+                                xml_chunk = streamed_chunk.xml_content
                                 xml_chunks_buffer.append(xml_chunk)
+                                # Map the chunk end from scanner offsets to content offsets
+                                content_buffer.mark_tool_chunk_end(chunk_offset + streamed_chunk.end - scanner_offset)
                                 result = self._parse_xml_tool_call(xml_chunk)
                                 if result:
                                     tool_call, parsing_details = result
@@ -221,7 +272,9 @@ class ResponseProcessor:
                                         if started_msg_obj: yield started_msg_obj
                                         yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                        execution_task = asyncio.create_task(self._execute_tool(tool_call))
+                                        execution_task = asyncio.create_task(
+                                            self._execute_tool_with_progress(tool_call, context, progress_queue)
+                                        )
                                         pending_tool_executions.append({
                                             "task": execution_task, "tool_call": tool_call,
                                             "tool_index": tool_index, "context": context
@@ -304,7 +357,9 @@ class ResponseProcessor:
                                 if started_msg_obj: yield started_msg_obj
                                 yielded_tool_indices.add(tool_index) # Mark status as yielded
 
-                                execution_task = asyncio.create_task(self._execute_tool(tool_call_data))
+                                execution_task = asyncio.create_task(
+                                    self._execute_tool_with_progress(tool_call_data, context, progress_queue)
+                                )
                                 pending_tool_executions.append({
                                     "task": execution_task, "tool_call": tool_call_data,
                                     "tool_index": tool_index, "context": context
@@ -322,12 +377,19 @@ class ResponseProcessor:
             if pending_tool_executions:
                 logger.info(f"Waiting for {len(pending_tool_executions)} pending streamed tool executions")
                 pending_tasks = [execution["task"] for execution in pending_tool_executions]
-                # Heartbeat loop: wait in slices and emit a heartbeat event
+                last_heartbeat = time.monotonic()
+                # Heartbeat loop: wait in slices, forward tool progress and emit a heartbeat event
                 while True:
+                    while not progress_queue.empty():
+                        yield self._tool_progress_message(*progress_queue.get_nowait(), thread_id, thread_run_id)
                     if not pending_tasks:
                         break
-                    done, pending = await asyncio.wait(pending_tasks, timeout=2.0, return_when=asyncio.FIRST_COMPLETED)
+                    done, pending = await asyncio.wait(pending_tasks, timeout=0.25, return_when=asyncio.FIRST_COMPLETED)
                     if not done:
+                        pending_tasks = list(pending)
+                        if time.monotonic() - last_heartbeat < 2.0:
+                            continue
+                        last_heartbeat = time.monotonic()
                         # Emit heartbeat status message
                         hb_content = {"status_type": "heartbeat", "message": "Working..."}
                         hb_msg_obj = await self.add_message(
@@ -336,7 +398,6 @@ class ResponseProcessor:
                         )
                         if hb_msg_obj:
                             yield hb_msg_obj
-                        pending_tasks = list(pending)
                         continue
                     # Process finished tasks
                     finished_map = {t: i for i, t in enumerate([e["task"] for e in pending_tool_executions])}
@@ -385,13 +446,13 @@ class ResponseProcessor:
                 logger.info(f"Stream finished with reason: xml_tool_limit_reached after {xml_tool_call_count} XML tool calls")
 
             # --- SAVE and YIELD Final Assistant Message ---
-            if accumulated_content:
-                # ... (Truncate accumulated_content logic) ...
-                if config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls and xml_chunks_buffer:
-                    last_xml_chunk = xml_chunks_buffer[-1]
-                    last_chunk_end_pos = accumulated_content.find(last_xml_chunk) + len(last_xml_chunk)
-                    if last_chunk_end_pos > 0:
-                        accumulated_content = accumulated_content[:last_chunk_end_pos]
+            accumulated_content = ""
+            if content_buffer:
+                # Truncate at the recorded end of the last processed XML tool chunk
+                if config.max_xml_tool_calls > 0 and xml_tool_call_count >= config.max_xml_tool_calls and content_buffer.tool_chunk_ends:
+                    accumulated_content = content_buffer.getvalue(end=content_buffer.tool_chunk_ends[-1])
+                else:
+                    accumulated_content = content_buffer.getvalue()
 
                 # ... (Extract complete_native_tool_calls logic) ...
                 complete_native_tool_calls = []
@@ -453,8 +514,8 @@ class ResponseProcessor:
                  # Gather XML tool calls from buffer (up to limit)
                 parsed_xml_data = []
                 if config.xml_tool_calling:
-                    # Reparse remaining content just in case (should be empty if processed correctly)
-                    xml_chunks = self._extract_xml_chunks(current_xml_content)
+                    # Reparse the scanner's unterminated tail just in case (should yield nothing)
+                    xml_chunks = self._extract_xml_chunks(xml_scanner.pending_text())
                     xml_chunks_buffer.extend(xml_chunks)
                     # Process only chunks not already handled in the stream loop
                     remaining_limit = config.max_xml_tool_calls - xml_tool_call_count if config.max_xml_tool_calls > 0 else len(xml_chunks_buffer)
@@ -1091,6 +1152,32 @@ class ResponseProcessor:
             logger.error(f"Error executing tool {tool_call.get('function_name', '?')}: {str(e)}", exc_info=True)
             return ToolResult(success=False, output=None, error=f"Error executing tool: {str(e)}")
 
+    async def _execute_tool_with_progress(
+        self, tool_call: Dict[str, Any], context: ToolExecutionContext, progress_queue: asyncio.Queue
+    ) -> ToolResult:
+        """Execute a streamed tool call, queueing the updates it reports for the stream."""
+        # Runs in its own task, so the sink only applies to this tool call
+        set_progress_sink(lambda update: progress_queue.put_nowait((context, update)))
+        return await self._execute_tool(tool_call)
+
+    def _tool_progress_message(
+        self, context: ToolExecutionContext, update: Dict[str, Any], thread_id: str, thread_run_id: str
+    ) -> Dict[str, Any]:
+        """Format a tool progress update as a transient status message (not saved)."""
+        now = datetime.now(timezone.utc).isoformat()
+        content = {
+            "role": "assistant", "status_type": "tool_progress",
+            "function_name": context.function_name, "xml_tag_name": context.xml_tag_name,
+            "tool_index": context.tool_index, "tool_call_id": context.tool_call.get("id"),
+            **update
+        }
+        return {
+            "message_id": None, "thread_id": thread_id, "type": "status", "is_llm_message": False,
+            "content": json.dumps(content),
+            "metadata": json.dumps({"thread_run_id": thread_run_id}),
+            "created_at": now, "updated_at": now
+        }
+
     async def process_xml_tools_with_canonical_events(
         self, 
         xml_content: str,
@@ -10,12 +10,20 @@ This module provides comprehensive conversation management, including:
 - Context summarization to manage token limits
 """
 
+import copy
+import hashlib
 import json
-from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Type, Union, AsyncGenerator, Literal, Tuple
 from services.llm import make_llm_api_call
 from agentpress.tool import Tool
 from agentpress.tool_registry import ToolRegistry
 from agentpress.context_manager import ContextManager
+from agentpress.message_writer import MessageWriter, TRANSIENT_STATUS_TYPES
+from agentpress.message_cache import ThreadMessageCache
 from agentpress.response_processor import (
     ResponseProcessor, 
     ProcessorConfig    
@@ -26,6 +34,32 @@ from utils.logger import logger
 # Type alias for tool choice
 ToolChoice = Literal["auto", "required", "none"]
 
+XML_TOOL_CALLING_HEADER = """
+--- XML TOOL CALLING ---
+
+In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
+Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
+String and scalar parameters should be specified as attributes, while content goes between tags.
+Note that spaces for string values are not stripped. The output is parsed with regular expressions.
+
+Here are the XML tools available with examples:
+"""
+
+# Threads whose message cache and token count are kept; the least recently
+# used thread is dropped beyond this (the ThreadManager is process-wide)
+MESSAGE_CACHE_MAX_THREADS = int(os.getenv("IRIS_MESSAGE_CACHE_THREADS", "256"))
+
+# Final system prompts, shared by all ThreadManagers since the ToolRegistry is
+# a singleton: (registry version, include examples, prompt hash) -> prompt
+SYSTEM_PROMPT_CACHE_SIZE = 32
+_system_prompt_cache: Dict[Tuple[int, bool, str], Dict[str, Any]] = {}
+# (model, prompt hash) -> token count of the system prompt
+_system_prompt_tokens: Dict[Tuple[str, str], int] = {}
+
+
+def _prompt_hash(prompt: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(prompt, sort_keys=True).encode()).hexdigest()
+
 class ThreadManager:
     """Manages conversation threads with LLM models and tool execution.
     
@@ -34,13 +68,39 @@ class ThreadManager:
     XML-based tool execution patterns.
     """
 
-    def __init__(self, db_connection=None):
+    def __init__(
+        self,
+        db_connection=None,
+        write_behind: Optional[bool] = None,
+        persist_transient_status: Optional[bool] = None,
+        cache_messages: Optional[bool] = None
+    ):
         """Initialize ThreadManager.
 
         Args:
             db_connection: Optional DBConnection instance. If not provided, creates a new one.
+            write_behind: Batch message inserts in the background instead of one round
+                trip per message. Defaults to IRIS_MESSAGE_WRITE_BEHIND (enabled).
+            persist_transient_status: Store transient status rows such as heartbeats.
+                Defaults to IRIS_PERSIST_TRANSIENT_STATUS (disabled).
+            cache_messages: Keep each thread's LLM messages in memory and only fetch
+                new rows on later turns. Defaults to IRIS_MESSAGE_CACHE (enabled).
+                At most IRIS_MESSAGE_CACHE_THREADS threads are cached, least
+                recently used first out.
         """
         self.db = db_connection or DBConnection()
+        if write_behind is None:
+            write_behind = os.getenv("IRIS_MESSAGE_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+        if persist_transient_status is None:
+            persist_transient_status = os.getenv("IRIS_PERSIST_TRANSIENT_STATUS", "false").lower() in ("1", "true", "yes")
+        if cache_messages is None:
+            cache_messages = os.getenv("IRIS_MESSAGE_CACHE", "true").lower() in ("1", "true", "yes")
+        self.message_writer = MessageWriter(self.db, on_rejected=self._forget_rejected_messages) if write_behind else None
+        self.persist_transient_status = persist_transient_status
+        self.cache_messages = cache_messages
+        self._message_caches: "OrderedDict[str, ThreadMessageCache]" = OrderedDict()
+        # thread_id -> token count of the context sent on the latest turn
+        self.thread_token_counts: "OrderedDict[str, int]" = OrderedDict()
         self.tool_registry = ToolRegistry()
         self.response_processor = ResponseProcessor(
             tool_registry=self.tool_registry,
@@ -74,6 +134,10 @@ class ThreadManager:
             metadata: Optional dictionary for additional message metadata.
                       Defaults to None, stored as an empty JSONB object if None.
             message_type: Legacy alias for 'type' parameter for backward compatibility.
+
+        Returns:
+            The message object. With write-behind enabled the message ID is assigned
+            here and the row is inserted by the MessageWriter on its next flush.
         """
         # Resolve type parameter - prefer 'type' over 'message_type' for backward compatibility
         resolved_type = type or message_type
@@ -81,7 +145,6 @@ class ThreadManager:
             raise ValueError("Either 'type' or 'message_type' parameter must be provided")
 
         logger.debug(f"Adding message of type '{resolved_type}' to thread {thread_id}")
-        client = await self.db.get_client()
 
         # Prepare data for insertion
         data_to_insert = {
@@ -91,15 +154,33 @@ class ThreadManager:
             'is_llm_message': is_llm_message,
             'metadata': json.dumps(metadata or {}), # Ensure metadata is always a JSON object
         }
-        
+
+        if self.message_writer is not None:
+            data_to_insert['message_id'] = str(uuid.uuid4())
+            now = datetime.now(timezone.utc).isoformat()
+            message = {**data_to_insert, 'created_at': now, 'updated_at': now}
+
+            is_transient = (
+                resolved_type == 'status'
+                and isinstance(content, dict)
+                and content.get('status_type') in TRANSIENT_STATUS_TYPES
+            )
+            if is_transient and not self.persist_transient_status:
+                return message
+
+            # created_at is left to the database so ordering follows insertion order
+            self.message_writer.enqueue(data_to_insert)
+            self._update_message_cache(message)
+            return message
+
+        client = await self.db.get_client()
         try:
             # Add returning='representation' to get the inserted row data including the id
             result = await client.table('messages').insert(data_to_insert, returning='representation').execute()
             logger.info(f"Successfully added message to thread {thread_id}")
 
-            print(f"MESSAGE RESULT: {result}")
-            
             if result.data and len(result.data) > 0 and isinstance(result.data[0], dict) and 'message_id' in result.data[0]:
+                self._update_message_cache(result.data[0])
                 return result.data[0]
             else:
                 logger.error(f"Insert operation failed or did not return expected data structure for thread {thread_id}. Result data: {result.data}")
@@ -108,39 +189,194 @@ class ThreadManager:
             logger.error(f"Failed to add message to thread {thread_id}: {str(e)}", exc_info=True)
             raise
 
+    def _update_message_cache(self, message: Dict[str, Any]):
+        """Reflect a newly added message in the thread's message cache."""
+        cache = self._message_caches.get(message['thread_id'])
+        if cache is None or not cache.loaded or not message.get('is_llm_message'):
+            return
+        if message.get('type') == 'summary':
+            # A summary replaces the messages before it; reload on the next read
+            cache.invalidate()
+        else:
+            cache.append(message['message_id'], message['content'])
+
+    def _forget_rejected_messages(self, rows: List[Dict[str, Any]]):
+        """Drop the caches that hold messages the database refused to store."""
+        for thread_id in {row.get('thread_id') for row in rows}:
+            self.invalidate_message_cache(thread_id)
+
+    def invalidate_message_cache(self, thread_id: Optional[str] = None):
+        """Drop cached messages for a thread, or for all threads."""
+        if thread_id is None:
+            self._message_caches.clear()
+        else:
+            self._message_caches.pop(thread_id, None)
+
+    def build_system_prompt(self, system_prompt: Dict[str, Any], include_xml_examples: bool = False) -> Dict[str, Any]:
+        """Return the final system prompt, with XML tool examples if requested.
+
+        The result is cached per tool registry version and returns the same
+        object, with byte-identical content, on every turn so provider-side
+        prompt caching can hit. Callers must not modify it.
+
+        Args:
+            system_prompt: The base system message.
+            include_xml_examples: Whether to append the XML tool examples.
+
+        Returns:
+            The system message to send to the LLM.
+        """
+        key = (self.tool_registry.version, include_xml_examples, _prompt_hash(system_prompt))
+        cached = _system_prompt_cache.get(key)
+        if cached is not None:
+            return cached
+
+        working_system_prompt = copy.deepcopy(system_prompt)
+        xml_examples = self.tool_registry.get_xml_examples() if include_xml_examples else {}
+        if xml_examples:
+            examples_content = XML_TOOL_CALLING_HEADER + "".join(
+                f"<{tag_name}> Example: {example}\\n" for tag_name, example in xml_examples.items()
+            )
+
+            system_content = working_system_prompt.get('content')
+
+            if isinstance(system_content, str):
+                working_system_prompt['content'] += examples_content
+                logger.debug("Appended XML examples to string system prompt content.")
+            elif isinstance(system_content, list):
+                appended = False
+                for item in working_system_prompt['content']:
+                    if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
+                        item['text'] += examples_content
+                        logger.debug("Appended XML examples to the first text block in list system prompt content.")
+                        appended = True
+                        break
+                if not appended:
+                    logger.warning("System prompt content is a list but no text block found to append XML examples.")
+            else:
+                logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
+
+        if len(_system_prompt_cache) >= SYSTEM_PROMPT_CACHE_SIZE:
+            _system_prompt_cache.pop(next(iter(_system_prompt_cache)))
+        _system_prompt_cache[key] = working_system_prompt
+        return working_system_prompt
+
+    def _count_system_prompt_tokens(self, llm_model: str, system_prompt: Dict[str, Any]) -> int:
+        """Count system prompt tokens, memoized by the prompt's content hash."""
+        from litellm import token_counter
+        key = (llm_model, _prompt_hash(system_prompt))
+        if key not in _system_prompt_tokens:
+            if len(_system_prompt_tokens) >= SYSTEM_PROMPT_CACHE_SIZE:
+                _system_prompt_tokens.pop(next(iter(_system_prompt_tokens)))
+            _system_prompt_tokens[key] = token_counter(model=llm_model, messages=[system_prompt])
+        return _system_prompt_tokens[key]
+
+    def count_tokens(
+        self,
+        thread_id: str,
+        llm_model: str,
+        system_prompt: Dict[str, Any],
+        messages: List[Dict[str, Any]]
+    ) -> int:
+        """Count the tokens of the system prompt plus the thread's LLM messages.
+
+        With the message cache enabled each message is tokenized once and the
+        total is updated incrementally. Messages are counted one at a time, so
+        the total includes litellm's per-request overhead once per message and
+        slightly overestimates a single token_counter call over the whole list.
+
+        Args:
+            thread_id: The thread the messages belong to.
+            llm_model: Model whose tokenizer to use.
+            system_prompt: The system message sent with the thread.
+            messages: Messages returned by get_llm_messages for the thread.
+
+        Returns:
+            The token count, also stored in thread_token_counts[thread_id].
+        """
+        from litellm import token_counter
+        cache = self._message_caches.get(thread_id)
+        if cache is not None and cache.loaded and len(cache.messages) == len(messages):
+            message_tokens = cache.token_count(
+                llm_model,
+                lambda message: token_counter(model=llm_model, messages=[message])
+            )
+            token_count = self._count_system_prompt_tokens(llm_model, system_prompt) + message_tokens
+        else:
+            token_count = token_counter(model=llm_model, messages=[system_prompt] + messages)
+        self.thread_token_counts[thread_id] = token_count
+        self.thread_token_counts.move_to_end(thread_id)
+        while len(self.thread_token_counts) > MESSAGE_CACHE_MAX_THREADS:
+            self.thread_token_counts.popitem(last=False)
+        return token_count
+
+    async def flush_messages(self) -> bool:
+        """Write any queued messages to the database.
+
+        Must be awaited before reading the thread back from the database and
+        when a run ends or is cancelled.
+
+        Returns:
+            True if the queue was drained, False if the database could not be
+            reached and messages are still queued.
+        """
+        if self.message_writer is None:
+            return True
+        flushed = await self.message_writer.flush()
+        if not flushed:
+            logger.error(f"{self.message_writer.pending_count} messages could not be written and are still queued")
+        return flushed
+
     async def get_llm_messages(self, thread_id: str) -> List[Dict[str, Any]]:
         """Get all messages for a thread.
         
         This method uses the SQL function which handles context truncation
-        by considering summary messages.
+        by considering summary messages. With the message cache enabled the
+        thread is loaded once and later calls only fetch newer rows.
         
         Args:
             thread_id: The ID of the thread to get messages for.
             
         Returns:
             List of message objects.
+
+        Raises:
+            RuntimeError: If queued messages could not be written first.
         """
         logger.debug(f"Getting messages for thread {thread_id}")
+        if not await self.flush_messages():
+            # The database would return the thread without the queued messages
+            raise RuntimeError(f"Queued messages could not be written; not reading thread {thread_id}")
         client = await self.db.get_client()
         
         try:
-            result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
-            
-            # Parse the returned data which might be stringified JSON
-            if not result.data:
-                return []
+            if self.cache_messages:
+                cache = self._message_caches.get(thread_id)
+                if cache is None:
+                    cache = self._message_caches[thread_id] = ThreadMessageCache(thread_id)
+                    while len(self._message_caches) > MESSAGE_CACHE_MAX_THREADS:
+                        self._message_caches.popitem(last=False)
+                self._message_caches.move_to_end(thread_id)
+                # Copy the list so callers can't modify the cache
+                messages = list(await cache.refresh(client))
+            else:
+                result = await client.rpc('get_llm_formatted_messages', {'p_thread_id': thread_id}).execute()
                 
-            # Return properly parsed JSON objects
-            messages = []
-            for item in result.data:
-                if isinstance(item, str):
-                    try:
-                        parsed_item = json.loads(item)
-                        messages.append(parsed_item)
-                    except json.JSONDecodeError:
-                        logger.error(f"Failed to parse message: {item}")
-                else:
-                    messages.append(item)
+                # Parse the returned data which might be stringified JSON
+                if not result.data:
+                    return []
+                    
+                # Return properly parsed JSON objects
+                messages = []
+                for item in result.data:
+                    if isinstance(item, str):
+                        try:
+                            parsed_item = json.loads(item)
+                            messages.append(parsed_item)
+                        except json.JSONDecodeError:
+                            logger.error(f"Failed to parse message: {item}")
+                    else:
+                        messages.append(item)
 
             # Ensure tool_calls have properly formatted function arguments
             for message in messages:
@@ -155,6 +391,7 @@ class ThreadManager:
             
         except Exception as e:
             logger.error(f"Failed to get messages for thread {thread_id}: {str(e)}", exc_info=True)
+            self.invalidate_message_cache(thread_id)
             return []
 
     async def run_thread(
@@ -211,44 +448,13 @@ class ThreadManager:
         if max_xml_tool_calls > 0 and not processor_config.max_xml_tool_calls:
             processor_config.max_xml_tool_calls = max_xml_tool_calls
             
-        # Create a working copy of the system prompt to potentially modify
-        working_system_prompt = system_prompt.copy()
-
-        # Add XML examples to system prompt if requested, do this only ONCE before the loop
-        if include_xml_examples and processor_config.xml_tool_calling:
-            xml_examples = self.tool_registry.get_xml_examples()
-            if xml_examples:
-                examples_content = """
---- XML TOOL CALLING ---
-
-In this environment you have access to a set of tools you can use to answer the user's question. The tools are specified in XML format.
-Format your tool calls using the specified XML tags. Place parameters marked as 'attribute' within the opening tag (e.g., `<tag attribute='value'>`). Place parameters marked as 'content' between the opening and closing tags. Place parameters marked as 'element' within their own child tags (e.g., `<tag><element>value</element></tag>`). Refer to the examples provided below for the exact structure of each tool.
-String and scalar parameters should be specified as attributes, while content goes between tags.
-Note that spaces for string values are not stripped. The output is parsed with regular expressions.
+        # Build the final system prompt (with XML examples if requested) once; it is
+        # cached per registry version so every turn sends byte-identical content
+        working_system_prompt = self.build_system_prompt(
+            system_prompt,
+            include_xml_examples=include_xml_examples and processor_config.xml_tool_calling
+        )
 
-Here are the XML tools available with examples:
-"""
-                for tag_name, example in xml_examples.items():
-                    examples_content += f"<{tag_name}> Example: {example}\\n"
-
-                system_content = working_system_prompt.get('content')
-
-                if isinstance(system_content, str):
-                    working_system_prompt['content'] += examples_content
-                    logger.debug("Appended XML examples to string system prompt content.")
-                elif isinstance(system_content, list):
-                    appended = False
-                    for item in working_system_prompt['content']: # Modify the copy
-                        if isinstance(item, dict) and item.get('type') == 'text' and 'text' in item:
-                            item['text'] += examples_content
-                            logger.debug("Appended XML examples to the first text block in list system prompt content.")
-                            appended = True
-                            break
-                    if not appended:
-                        logger.warning("System prompt content is a list but no text block found to append XML examples.")
-                else:
-                    logger.warning(f"System prompt content is of unexpected type ({type(system_content)}), cannot add XML examples.")
-        
         # Control whether we need to auto-continue due to tool_calls finish reason
         auto_continue = True
         auto_continue_count = 0
@@ -266,9 +472,8 @@ Here are the XML tools available with examples:
                 # 2. Check token count before proceeding
                 token_count = 0
                 try:
-                    from litellm import token_counter
                     # Use the potentially modified working_system_prompt for token counting
-                    token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages) 
+                    token_count = self.count_tokens(thread_id, llm_model, working_system_prompt, messages)
                     token_threshold = self.context_manager.token_threshold
                     logger.info(f"Thread {thread_id} token count: {token_count}/{token_threshold} ({(token_count/token_threshold)*100:.1f}%)")
                     
@@ -278,13 +483,14 @@ Here are the XML tools available with examples:
                             thread_id=thread_id,
                             add_message_callback=self.add_message,
                             model=llm_model,
-                            force=True
+                            force=True,
+                            token_count=token_count
                         )
                         if summarized:
                             logger.info("Summarization complete, fetching updated messages with summary")
                             messages = await self.get_llm_messages(thread_id)
                             # Recount tokens after summarization, using the modified prompt
-                            new_token_count = token_counter(model=llm_model, messages=[working_system_prompt] + messages) 
+                            new_token_count = self.count_tokens(thread_id, llm_model, working_system_prompt, messages)
                             logger.info(f"After summarization: token count reduced from {token_count} to {new_token_count}")
                         else:
                             logger.warning("Summarization failed or wasn't needed - proceeding with original messages")
@@ -7,13 +7,16 @@ This module defines the base classes and decorators for creating tools in AgentP
 - Result containers for standardized tool outputs
 """
 
-from typing import Dict, Any, Union, Optional, List, Type
+from typing import Dict, Any, Union, Optional, List, Type, Callable
 from dataclasses import dataclass, field
 from abc import ABC
+from contextvars import ContextVar, Token
 import json
 import inspect
+import functools
 from enum import Enum
 from utils.logger import logger
+from agentpress.tool_cache import TOOL_CACHE_ENABLED, cache_key, get_tool_cache
 
 class SchemaType(Enum):
     """Enumeration of supported schema types for tool definitions."""
@@ -93,6 +96,17 @@ class ToolResult:
     success: bool
     output: str
 
+# Receives intermediate updates from the tool call running in the current task
+_progress_sink: ContextVar[Optional[Callable[[Dict[str, Any]], None]]] = ContextVar("tool_progress_sink", default=None)
+
+def set_progress_sink(sink: Optional[Callable[[Dict[str, Any]], None]]) -> Token:
+    """Route report_progress calls made in the current context to sink.
+
+    Returns:
+        Token for resetting the previous sink with _progress_sink.reset
+    """
+    return _progress_sink.set(sink)
+
 class Tool(ABC):
     """Abstract base class for all tools.
     
@@ -106,6 +120,7 @@ class Tool(ABC):
         get_schemas: Get all registered tool schemas
         success_response: Create a successful result
         fail_response: Create a failed result
+        report_progress: Send an intermediate update while running
     """
     
     def __init__(self):
@@ -145,6 +160,19 @@ class Tool(ABC):
         logger.debug(f"Created success response for {self.__class__.__name__}")
         return ToolResult(success=True, output=text)
 
+    def report_progress(self, **data: Any) -> None:
+        """Send an intermediate update for the running tool call.
+        
+        Delivered as a tool_progress status event when the call runs while
+        the response is streamed; a no-op otherwise.
+        
+        Args:
+            **data: JSON-serializable fields of the update
+        """
+        sink = _progress_sink.get()
+        if sink is not None:
+            sink(data)
+
     def fail_response(self, msg: str) -> ToolResult:
         """Create a failed tool result.
         
@@ -229,6 +257,63 @@ def xml_schema(
         ))
     return decorator
 
+def cached_result(
+    ttl: float,
+    max_bytes: Optional[int] = None,
+    cacheable: Optional[Callable[[ToolResult], bool]] = None
+):
+    """
+    Decorator caching successful results of an idempotent tool method.
+    
+    Results are keyed by tool class and method name plus the normalized call
+    arguments (see agentpress.tool_cache); failed results are never cached.
+    
+    Args:
+        ttl: Seconds a result stays valid
+        max_bytes: Largest output to cache (default IRIS_TOOL_CACHE_MAX_BYTES)
+        cacheable: Optional check of a successful result, e.g. to skip results
+            that are only partly successful
+    
+    Example:
+        @cached_result(ttl=900)
+        @openapi_schema({...})
+        @xml_schema(tag_name="web-search", ...)
+        async def web_search(self, query: str) -> ToolResult:
+            ...
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            if not TOOL_CACHE_ENABLED or ttl <= 0:
+                return await func(self, *args, **kwargs)
+            try:
+                bound = signature.bind(self, *args, **kwargs)
+            except TypeError:
+                # Let the method report the bad call
+                return await func(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            arguments.pop(next(iter(signature.parameters)), None)
+
+            cache = get_tool_cache()
+            key = cache_key(f"{self.__class__.__name__}.{func.__name__}", arguments)
+            output = await cache.get(key)
+            if output is not None:
+                logger.debug(f"Tool cache hit for {self.__class__.__name__}.{func.__name__}")
+                return ToolResult(success=True, output=output)
+
+            result = await func(self, *args, **kwargs)
+            if (isinstance(result, ToolResult) and result.success and isinstance(result.output, str)
+                    and (cacheable is None or cacheable(result))):
+                await cache.put(key, result.output, ttl, max_bytes)
+            return result
+
+        wrapper.cache_ttl = ttl
+        return wrapper
+    return decorator
+
 def custom_schema(schema: Dict[str, Any]):
     """Decorator for custom schema tools."""
     def decorator(func):
@@ -0,0 +1,179 @@
+"""
+Result cache for idempotent tools.
+
+Research tools (web search, crawling, data provider calls) are often called
+again with the same arguments, within a run and across runs, e.g. after the
+context was summarized. Tools opt in per method with the cached_result
+decorator (see agentpress.tool), next to their schema decorators:
+
+    @cached_result(ttl=900)
+    @openapi_schema({...})
+    @xml_schema(...)
+    async def web_search(self, query: str, ...) -> ToolResult:
+
+Successful results are cached by tool name plus normalized arguments:
+- in process, in an LRU of up to IRIS_TOOL_CACHE_SIZE entries
+- in Redis as well when IRIS_TOOL_CACHE_REDIS is set, shared across workers
+  and runs
+Outputs larger than IRIS_TOOL_CACHE_MAX_BYTES are not cached.
+IRIS_TOOL_CACHE=false turns caching off.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logger import logger
+
+TOOL_CACHE_ENABLED = os.getenv("IRIS_TOOL_CACHE", "true").lower() in ("1", "true", "yes")
+TOOL_CACHE_SIZE = int(os.getenv("IRIS_TOOL_CACHE_SIZE", "512"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("IRIS_TOOL_CACHE_MAX_BYTES", str(256 * 1024)))
+TOOL_CACHE_REDIS = os.getenv("IRIS_TOOL_CACHE_REDIS", "false").lower() in ("1", "true", "yes")
+REDIS_KEY_PREFIX = "tool_cache:"
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        text = value.strip()
+        # XML attributes arrive as strings, native calls as typed values
+        if text.lower() in ("true", "false"):
+            return text.lower() == "true"
+        # Only canonical integers: "007" or a zip code like "02134" stay strings
+        try:
+            number = int(text)
+        except ValueError:
+            number = None
+        if number is not None and str(number) == text:
+            return number
+        # JSON payloads: key order and whitespace do not matter
+        if text[:1] in ("{", "["):
+            try:
+                return _normalize(json.loads(text))
+            except ValueError:
+                pass
+        return text
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(tool_name: str, arguments: Dict[str, Any]) -> str:
+    """Key for a tool call: the tool name plus a digest of its normalized arguments."""
+    normalized = json.dumps(_normalize(arguments), sort_keys=True, ensure_ascii=False, default=str)
+    return f"{tool_name}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+
+class ToolResultCache:
+    """LRU of successful tool outputs with per-entry expiry, optionally backed by Redis."""
+
+    def __init__(
+        self,
+        max_entries: int = TOOL_CACHE_SIZE,
+        max_bytes: int = TOOL_CACHE_MAX_BYTES,
+        use_redis: bool = TOOL_CACHE_REDIS
+    ):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.use_redis = use_redis
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.oversized = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached output for key, or None on a miss."""
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, output = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return output
+            del self._entries[key]
+
+        if self.use_redis:
+            entry = await self._redis_get(key)
+            if entry is not None and entry[0] > now:
+                self._remember(key, *entry)
+                self.hits += 1
+                self.redis_hits += 1
+                return entry[1]
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, output: str, ttl: float, max_bytes: Optional[int] = None) -> bool:
+        """Cache output for ttl seconds; returns False if it is too large to cache."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        if len(output.encode("utf-8", "replace")) > limit:
+            self.oversized += 1
+            return False
+        expires_at = time.time() + ttl
+        self._remember(key, expires_at, output)
+        self.stores += 1
+        if self.use_redis:
+            await self._redis_set(key, expires_at, output, ttl)
+        return True
+
+    def _remember(self, key: str, expires_at: float, output: str) -> None:
+        self._entries[key] = (expires_at, output)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _redis_get(self, key: str) -> Optional[Tuple[float, str]]:
+        try:
+            from services import redis
+            raw = await redis.get(REDIS_KEY_PREFIX + key)
+            if raw is None:
+                return None
+            if isinstance(raw, bytes):
+                raw = raw.decode()
+            data = json.loads(raw)
+            return float(data["expires_at"]), data["output"]
+        except Exception as e:
+            logger.warning(f"Tool cache Redis read failed: {e}")
+            return None
+
+    async def _redis_set(self, key: str, expires_at: float, output: str, ttl: float) -> None:
+        try:
+            from services import redis
+            value = json.dumps({"expires_at": expires_at, "output": output})
+            await redis.set(REDIS_KEY_PREFIX + key, value, ex=max(1, int(ttl)))
+        except Exception as e:
+            logger.warning(f"Tool cache Redis write failed: {e}")
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": TOOL_CACHE_ENABLED,
+            "redis": self.use_redis,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "stores": self.stores,
+            "oversized": self.oversized,
+        }
+
+
+_cache: Optional[ToolResultCache] = None
+
+
+def get_tool_cache() -> ToolResultCache:
+    global _cache
+    if _cache is None:
+        _cache = ToolResultCache()
+    return _cache
@@ -12,6 +12,7 @@ class ToolRegistry:
     Attributes:
         tools (Dict[str, Dict[str, Any]]): OpenAPI-style tools and schemas
         xml_tools (Dict[str, Dict[str, Any]]): XML-style tools and schemas
+        version (int): Incremented whenever the set of registered schemas changes
         
     Methods:
         register_tool: Register a tool with optional function filtering
@@ -29,6 +30,7 @@ class ToolRegistry:
             cls._instance = super().__new__(cls)
             cls._instance.tools = {}
             cls._instance.xml_tools = {}
+            cls._instance.version = 0
             logger.debug("Initialized new ToolRegistry instance")
         return cls._instance
     
@@ -52,11 +54,14 @@ class ToolRegistry:
         
         registered_openapi = 0
         registered_xml = 0
+        schemas_changed = False
         
         for func_name, schema_list in schemas.items():
             if function_names is None or func_name in function_names:
                 for schema in schema_list:
                     if schema.schema_type == SchemaType.OPENAPI:
+                        if self.tools.get(func_name, {}).get("schema") is not schema:
+                            schemas_changed = True
                         self.tools[func_name] = {
                             "instance": tool_instance,
                             "schema": schema
@@ -65,6 +70,8 @@ class ToolRegistry:
                         logger.debug(f"Registered OpenAPI function {func_name} from {tool_class.__name__}")
                     
                     if schema.schema_type == SchemaType.XML and schema.xml_schema:
+                        if self.xml_tools.get(schema.xml_schema.tag_name, {}).get("schema") is not schema:
+                            schemas_changed = True
                         self.xml_tools[schema.xml_schema.tag_name] = {
                             "instance": tool_instance,
                             "method": func_name,
@@ -73,6 +80,10 @@ class ToolRegistry:
                         registered_xml += 1
                         logger.debug(f"Registered XML tag {schema.xml_schema.tag_name} -> {func_name} from {tool_class.__name__}")
         
+        if schemas_changed:
+            # Re-registering the same tool with a new instance keeps the version
+            self.version += 1
+
         logger.debug(f"Tool registration complete for {tool_class.__name__}: {registered_openapi} OpenAPI functions, {registered_xml} XML tags")
 
     def get_available_functions(self) -> Dict[str, Callable]:
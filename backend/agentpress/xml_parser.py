@@ -24,6 +24,201 @@ class ParsedToolCall:
     xml_content: str  # Original XML content
 
 
+@dataclass
+class StreamedXMLChunk:
+    """A complete tool-call chunk detected by the StreamingXMLScanner."""
+    tag_name: str  # XML tag that opened the chunk (e.g., "create-file")
+    xml_content: str  # Complete chunk text from '<tag' through its closing tag
+    start: int  # Offset of the chunk start in the scanned stream
+    end: int  # Offset just past the chunk end in the scanned stream
+
+
+class StreamingXMLScanner:
+    """
+    Resumable scanner that detects complete XML tool-call chunks in a stream.
+
+    Each delta is scanned exactly once: outside a tool call only a short tail
+    that could still become an opening tag is retained, and inside a tool call
+    the body is kept as a list of parts that is joined once when the closing
+    tag arrives. Nested tags of the same name are tracked with a depth counter,
+    mirroring XMLToolParser._extract_complete_tag.
+    """
+
+    _SEARCHING = 0
+    _IN_OPENING_TAG = 1
+    _IN_BODY = 2
+
+    def __init__(self, tag_names: Optional[List[str]] = None):
+        """
+        Args:
+            tag_names: Tool tags to detect. Defaults to the tags known by
+                XMLToolParser.tool_name_mapping.
+        """
+        if tag_names is None:
+            tag_names = list(XMLToolParser().tool_name_mapping.keys())
+        # Longest first so alternation prefers the most specific tag
+        self.tag_names = sorted(set(tag_names), key=len, reverse=True)
+        self._open_pattern = re.compile(
+            '<(' + '|'.join(re.escape(t) for t in self.tag_names) + r')(?=[\s/>])'
+        ) if self.tag_names else None
+        self._max_open_len = max((len(t) for t in self.tag_names), default=0) + 2
+        self._body_patterns: Dict[str, re.Pattern] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard all scanner state."""
+        self._state = self._SEARCHING
+        self._consumed = 0  # Total characters fed so far
+        self._pending = ""  # SEARCHING: tail that may still become an opening tag
+        self._pending_start = 0  # Stream offset of _pending
+        self._parts: List[str] = []  # IN_TAG: chunk text received so far
+        self._chunk_start = 0
+        self._tag_name: Optional[str] = None
+        self._depth = 0
+        self._window = ""  # IN_BODY: unresolved tail carried between deltas
+        self._window_start = 0
+        self._scan_from = 0  # Stream offset below which the body is fully scanned
+
+    @property
+    def consumed(self) -> int:
+        """Total number of characters fed into the scanner."""
+        return self._consumed
+
+    @property
+    def in_tool_call(self) -> bool:
+        """Whether the scanner is currently inside an unterminated tool call."""
+        return self._state != self._SEARCHING
+
+    def pending_text(self) -> str:
+        """Return the retained, not yet completed tail of the stream."""
+        if self._state == self._SEARCHING:
+            return self._pending
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> List[StreamedXMLChunk]:
+        """
+        Consume a delta and return any tool-call chunks it completed.
+
+        Args:
+            delta: Newly streamed text
+
+        Returns:
+            List of StreamedXMLChunk in stream order
+        """
+        if isinstance(delta, bytes):
+            delta = delta.decode('utf-8', errors='replace')
+        if not delta or self._open_pattern is None:
+            self._consumed += len(delta or "")
+            return []
+
+        chunks: List[StreamedXMLChunk] = []
+        text = delta
+        text_start = self._consumed
+        self._consumed += len(delta)
+
+        while text:
+            if self._state == self._SEARCHING:
+                text, text_start = self._feed_searching(text, text_start)
+            elif self._state == self._IN_OPENING_TAG:
+                text, text_start, chunk = self._feed_opening_tag(text, text_start)
+                if chunk:
+                    chunks.append(chunk)
+            else:
+                text, text_start, chunk = self._feed_body(text, text_start)
+                if chunk:
+                    chunks.append(chunk)
+        return chunks
+
+    def _feed_searching(self, text: str, text_start: int) -> Tuple[str, int]:
+        combined = self._pending + text
+        combined_start = self._pending_start if self._pending else text_start
+        match = self._open_pattern.search(combined)
+        if not match:
+            # Keep only a suffix that could still grow into an opening tag
+            last_lt = combined.rfind('<')
+            if last_lt != -1 and len(combined) - last_lt <= self._max_open_len:
+                self._pending = combined[last_lt:]
+                self._pending_start = combined_start + last_lt
+            else:
+                self._pending = ""
+            return "", 0
+
+        self._pending = ""
+        self._state = self._IN_OPENING_TAG
+        self._tag_name = match.group(1)
+        self._chunk_start = combined_start + match.start()
+        self._parts = []
+        return combined[match.start():], self._chunk_start
+
+    def _feed_opening_tag(self, text: str, text_start: int) -> Tuple[str, int, Optional[StreamedXMLChunk]]:
+        gt = text.find('>')
+        if gt == -1:
+            self._parts.append(text)
+            return "", 0, None
+
+        self._parts.append(text[:gt + 1])
+        previous = text[gt - 1] if gt > 0 else (self._parts[-2][-1:] if len(self._parts) > 1 else "")
+        if previous == '/':
+            # Self-closing tag: the chunk is complete
+            return text[gt + 1:], text_start + gt + 1, self._complete(text_start + gt + 1)
+
+        self._state = self._IN_BODY
+        self._depth = 0
+        self._window = ""
+        self._window_start = text_start + gt + 1
+        self._scan_from = self._window_start
+        return text[gt + 1:], text_start + gt + 1, None
+
+    def _feed_body(self, text: str, text_start: int) -> Tuple[str, int, Optional[StreamedXMLChunk]]:
+        pattern = self._body_patterns.get(self._tag_name)
+        if pattern is None:
+            tag = re.escape(self._tag_name)
+            pattern = re.compile(rf'</{tag}>|<{tag}(?=[\s/>])')
+            self._body_patterns[self._tag_name] = pattern
+
+        window = self._window + text
+        window_start = self._window_start
+        pos = self._scan_from - window_start
+
+        while True:
+            match = pattern.search(window, pos)
+            if not match:
+                break
+            if match.group(0).startswith('</'):
+                if self._depth == 0:
+                    end_in_text = window_start + match.end() - text_start
+                    self._parts.append(text[:end_in_text])
+                    end = window_start + match.end()
+                    return text[end_in_text:], end, self._complete(end)
+                self._depth -= 1
+            else:
+                self._depth += 1
+            pos = match.end()
+
+        self._parts.append(text)
+        # Keep just enough of the tail to recognise a token split across deltas
+        keep = len(self._tag_name) + 3
+        resolved = max(pos, len(window) - keep)
+        self._window = window[resolved:]
+        self._window_start = window_start + resolved
+        self._scan_from = window_start + max(pos, resolved)
+        return "", 0, None
+
+    def _complete(self, end: int) -> StreamedXMLChunk:
+        chunk = StreamedXMLChunk(
+            tag_name=self._tag_name,
+            xml_content="".join(self._parts),
+            start=self._chunk_start,
+            end=end
+        )
+        self._state = self._SEARCHING
+        self._parts = []
+        self._tag_name = None
+        self._window = ""
+        self._pending = ""
+        return chunk
+
+
 class XMLToolParser:
     """
     Robust XML parser for tool calls with proper error handling and normalization.
@@ -39,12 +234,16 @@ class XMLToolParser:
             'ask': 'ask',
             'create-file': 'file_write',
             'str-replace': 'str_replace',
+            'apply-patch': 'apply_patch',
+            'replace-lines': 'replace_lines',
+            'create-files': 'create_files',
             'browser-navigate-to': 'browser_navigate',
             'browser-click-element': 'browser_click',
             'browser-input-text': 'browser_input',
             'browser-scroll-down': 'browser_scroll_down',
             'browser-scroll-up': 'browser_scroll_up',
             'execute-command': 'execute_bash',
+            'check-command-output': 'check_command_output',
         }
         
         # Cache for de-duplication
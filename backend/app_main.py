@@ -141,10 +141,22 @@ async def lifespan(app: FastAPI):
         await pool.stop()
     except Exception:
         pass
-    
+
+    # Close pooled HTTP connections and stop the sandbox SDK thread pool
+    from sandbox.browser_client import close_browser_clients
+    from sandbox.executor import shutdown_executor
+    from agent.tools.data_providers.RapidApiClient import close_rapid_api_client
+    from agent.tools.web_search_tool import close_crawl_client
+    await close_browser_clients()
+    await close_rapid_api_client()
+    await close_crawl_client()
+    shutdown_executor()
+
     # Clean up database connection
     logger.info("Disconnecting from database")
     await db.disconnect()
+    from services.db import close_user_clients
+    await close_user_clients()
 
 app = create_app()
 
@@ -45,3 +45,9 @@ async def schema_check():
             "error": str(e),
             "schema": os.environ.get("SUPABASE_DB_SCHEMA", "public")
         }
+
+@router.get("/tool-cache")
+async def tool_cache_stats():
+    """Hit/miss counters of the tool result cache in this process"""
+    from agentpress.tool_cache import get_tool_cache
+    return get_tool_cache().stats()
@@ -1,14 +1,20 @@
+import json
 import os
 from typing import List, Optional
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, APIRouter, Form, Depends, Request
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from utils.logger import logger
-from utils.auth_utils import get_current_user_id, get_user_id_from_stream_auth, get_optional_user_id
-from sandbox.sandbox import get_or_start_sandbox, upload_file_bytes
+from utils.auth_utils import get_current_user_id, get_user_id_from_stream_auth, get_optional_user_id, verify_thread_access
+from sandbox.sandbox import get_or_start_sandbox, invalidate_sandbox_handle, is_sandbox_unavailable_error, upload_file_bytes
+from sandbox.executor import AsyncSandbox
+from sandbox.archive import ARCHIVE_SUFFIXES, archive_suffix, stream_folder, upload_files
+from sandbox.scripts import SandboxScriptError
+from sandbox.pool import get_pool
 from services.supabase import DBConnection
+from services.blob_store import get_blob_store, is_blob_key
 try:
     from postgrest.exceptions import APIError as PostgrestAPIError  # type: ignore
 except Exception:  # pragma: no cover
@@ -147,14 +153,14 @@ async def get_sandbox_status(
                 return None
 
         preview = {
-            "vnc": _try_preview(6080),
-            "site": _try_preview(8080),
+            "vnc": await AsyncSandbox(sb).run(_try_preview, 6080),
+            "site": await AsyncSandbox(sb).run(_try_preview, 8080),
         }
 
         # Workspace readiness
         workspace_ready = False
         try:
-            files = sb.fs.list_files("workspace")
+            files = await AsyncSandbox(sb).list_files("workspace")
             workspace_ready = True if files is not None else False
         except Exception:
             workspace_ready = False
@@ -167,6 +173,9 @@ async def get_sandbox_status(
         }
     except Exception as e:
         logger.error(f"Error getting sandbox status for {sandbox_id}: {e}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sandbox/diagnostics")
@@ -197,6 +206,7 @@ async def sandbox_diagnostics(
         "server_url": os.getenv("DAYTONA_SERVER_URL"),
         "target": os.getenv("DAYTONA_TARGET"),
         "has_api_key": bool(os.getenv("DAYTONA_API_KEY")),
+        "pool": get_pool().stats(),
     }
 
     # Resolve sandbox id via project if provided
@@ -227,9 +237,12 @@ async def sandbox_diagnostics(
                     return getattr(link, 'url', str(link))
                 except Exception as _e:
                     return f"error: {_e}"
-            resp["preview"] = {"vnc": _try_preview(6080), "site": _try_preview(8080)}
+            resp["preview"] = {
+                "vnc": await AsyncSandbox(sb).run(_try_preview, 6080),
+                "site": await AsyncSandbox(sb).run(_try_preview, 8080),
+            }
             try:
-                files = sb.fs.list_files("workspace")
+                files = await AsyncSandbox(sb).list_files("workspace")
                 resp["workspace_ok"] = bool(files is not None)
             except Exception as _e:
                 resp["workspace_ok"] = False
@@ -267,7 +280,7 @@ async def create_file(
         
         # Normalize path for SDK and upload
         sdk_path = _normalize_sdk_path(path)
-        upload_file_bytes(sandbox, sdk_path, content)
+        await AsyncSandbox(sandbox).run(upload_file_bytes, sandbox, sdk_path, content)
         duration_ms = int((time.time() - t0) * 1000)
         try:
             logger.info(
@@ -279,6 +292,9 @@ async def create_file(
         return {"status": "success", "created": True, "path": path}
     except Exception as e:
         logger.error(f"Error creating file in sandbox {sandbox_id}: {str(e)}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 # For backward compatibility, keep the JSON version too
@@ -314,7 +330,7 @@ async def create_file_json(
         
         # Create file
         sdk_path = _normalize_sdk_path(path)
-        upload_file_bytes(sandbox, sdk_path, content)
+        await AsyncSandbox(sandbox).run(upload_file_bytes, sandbox, sdk_path, content)
         duration_ms = int((time.time() - t0) * 1000)
         try:
             logger.info(
@@ -326,8 +342,97 @@ async def create_file_json(
         return {"status": "success", "created": True, "path": path}
     except Exception as e:
         logger.error(f"Error creating file in sandbox {sandbox_id}: {str(e)}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/sandboxes/{sandbox_id}/files/batch")
+async def create_files_batch(
+    sandbox_id: str,
+    files: List[UploadFile] = File(...),
+    paths: Optional[List[str]] = Form(None),
+    base_path: str = Form("workspace"),
+    request: Request = None,
+    user_id: Optional[str] = Depends(get_optional_user_id)
+):
+    """Create many files in one transfer, packed into a tar archive and extracted in the sandbox.
+
+    Each file is written to its entry in paths (or its filename) under base_path.
+    """
+    client = await db.get_client()
+    
+    # Verify the user has access to this sandbox
+    await verify_sandbox_access(client, sandbox_id, user_id)
+
+    if paths is not None and len(paths) != len(files):
+        raise HTTPException(status_code=400, detail="paths must list one target path per file")
+    names = paths if paths is not None else [f.filename for f in files]
+    if not all(names):
+        raise HTTPException(status_code=400, detail="Every file needs a path")
+    
+    try:
+        import time
+        t0 = time.time()
+        sandbox = await get_or_start_sandbox(sandbox_id)
+        dest = _normalize_sdk_path(base_path)
+        contents = {name: await f.read() for name, f in zip(names, files)}
+        written = await upload_files(AsyncSandbox(sandbox), contents, dest=dest)
+        duration_ms = int((time.time() - t0) * 1000)
+        logger.info(
+            f"BATCH_UPLOAD: {{'sandboxId': '{sandbox_id}', 'files': {len(written)}, 'dest': '{dest}', 'bytesUploaded': {sum(len(c) for c in contents.values())}, 'durationMs': {duration_ms}}}"
+        )
+        return {"status": "success", "created": len(written), "paths": written}
+    except SandboxScriptError as e:
+        logger.error(f"Error extracting batch upload in sandbox {sandbox_id}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating files in sandbox {sandbox_id}: {str(e)}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/sandboxes/{sandbox_id}/files/archive")
+async def download_folder_archive(
+    sandbox_id: str,
+    path: str,
+    compression: Optional[str] = None,
+    request: Request = None,
+    user_id: Optional[str] = Depends(get_optional_user_id)
+):
+    """Download a folder as a tar archive (gzip, or zstd if requested), packed in the sandbox"""
+    client = await db.get_client()
+    
+    # Verify the user has access to this sandbox
+    await verify_sandbox_access(client, sandbox_id, user_id)
+
+    if compression is not None and compression not in ARCHIVE_SUFFIXES:
+        raise HTTPException(status_code=400, detail=f"compression must be one of {sorted(ARCHIVE_SUFFIXES)}")
+    
+    try:
+        sandbox = await get_or_start_sandbox(sandbox_id)
+        sdk_path = _normalize_sdk_path(path).rstrip("/")
+        size, chunks = await stream_folder(AsyncSandbox(sandbox), sdk_path, compression)
+    except Exception as e:
+        logger.error(f"Error archiving folder in sandbox {sandbox_id}: {str(e)}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    suffix = archive_suffix(compression)
+    filename = f"{os.path.basename(sdk_path) or 'workspace'}{suffix}"
+
+    return StreamingResponse(
+        chunks,
+        media_type="application/zstd" if suffix.endswith(".zst") else "application/gzip",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(size),
+        }
+    )
+
 @router.get("/sandboxes/{sandbox_id}/files")
 async def list_files(
     sandbox_id: str, 
@@ -347,7 +452,7 @@ async def list_files(
         
         # List files from normalized path
         sdk_path = _normalize_sdk_path(path)
-        files = sandbox.fs.list_files(sdk_path)
+        files = await AsyncSandbox(sandbox).list_files(sdk_path)
         result = []
         
         for file in files:
@@ -367,6 +472,9 @@ async def list_files(
         return {"files": [file.dict() for file in result]}
     except Exception as e:
         logger.error(f"Error listing files in sandbox {sandbox_id}: {str(e)}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sandboxes/{sandbox_id}/files/content")
@@ -388,7 +496,7 @@ async def read_file(
         
         # Read file
         sdk_path = _normalize_sdk_path(path)
-        content = sandbox.fs.download_file(sdk_path)
+        content = await AsyncSandbox(sandbox).download_file(sdk_path)
         if isinstance(content, str):
             content_bytes = content.encode('utf-8')
         else:
@@ -423,8 +531,78 @@ async def read_file(
         )
     except Exception as e:
         logger.error(f"Error reading file in sandbox {sandbox_id}: {str(e)}")
+        if is_sandbox_unavailable_error(e):
+            # The sandbox has stopped or gone away; check its state again on the next request
+            invalidate_sandbox_handle(sandbox_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _referenced_screenshot(content) -> Optional[str]:
+    """SHA-256 of the screenshot a browser_state message references, if any."""
+    try:
+        content = json.loads(content) if isinstance(content, str) else content
+        return content.get("screenshot", {}).get("sha256")
+    except Exception:
+        return None
+
+async def verify_screenshot_access(client, thread_id: str, key: str, user_id: Optional[str] = None):
+    """
+    Verify that a screenshot belongs to a thread the user can see.
+
+    Screenshots of public projects are visible without authentication, like
+    the rest of a shared thread.
+
+    Raises:
+        HTTPException: If the thread is not accessible or does not reference the screenshot
+    """
+    thread_result = await client.table('threads').select('project_id').eq('thread_id', thread_id).execute()
+    if not thread_result.data:
+        raise HTTPException(status_code=404, detail="Thread not found")
+
+    is_public = False
+    project_id = thread_result.data[0].get('project_id')
+    if project_id:
+        project_result = await client.table('projects').select('is_public').eq('project_id', project_id).execute()
+        is_public = bool(project_result.data and project_result.data[0].get('is_public'))
+
+    if not is_public:
+        if not user_id:
+            raise HTTPException(status_code=401, detail="Authentication required for this resource")
+        await verify_thread_access(client, thread_id, user_id)
+
+    messages_result = await client.table('messages').select('content') \
+        .eq('thread_id', thread_id) \
+        .eq('type', 'browser_state') \
+        .execute()
+    if not any(_referenced_screenshot(row.get('content')) == key for row in messages_result.data or []):
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+
+@router.get("/threads/{thread_id}/screenshots/{key}")
+async def get_screenshot(
+    thread_id: str,
+    key: str,
+    user_id: Optional[str] = Depends(get_optional_user_id)
+):
+    """Serve a browser screenshot of a thread from the blob store by its SHA-256."""
+    if not is_blob_key(key):
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    client = await db.get_client()
+    await verify_screenshot_access(client, thread_id, key, user_id)
+    try:
+        data = await get_blob_store().get(key)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    except Exception as e:
+        logger.error(f"Error reading screenshot {key}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    media_type = "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+    # Content-addressed: the bytes behind a key never change
+    return Response(
+        content=data,
+        media_type=media_type,
+        headers={"Cache-Control": "private, max-age=31536000, immutable"}
+    )
+
 @router.post("/project/{project_id}/sandbox/ensure-active")
 async def ensure_project_sandbox_active(
     project_id: str,
@@ -474,7 +652,8 @@ async def ensure_project_sandbox_active(
     try:
         # Get or start sandbox instance
         logger.info(f"Ensuring sandbox {sandbox_id} is active for project {project_id}")
-        sandbox = await get_or_start_sandbox(sandbox_id)
+        # Always check the actual state rather than a cached handle
+        sandbox = await get_or_start_sandbox(sandbox_id, refresh=True)
         
         return {
             "status": "success", 
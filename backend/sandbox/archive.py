@@ -0,0 +1,155 @@
+"""
+Batch file transfer with a sandbox as a single tar archive.
+
+Moving many files one SDK call at a time costs a round trip per file. Instead:
+- upload_files packs the files into one archive here, uploads it, and extracts
+  it in the sandbox with one exec
+- stream_folder packs a directory in the sandbox with one exec and reads the
+  archive back in IRIS_ARCHIVE_CHUNK_BYTES ranges, so it is never held in
+  memory as a whole
+
+Archives are gzip-compressed by default. IRIS_ARCHIVE_COMPRESSION=zstd uses
+zstd instead; it needs the zstd CLI in the sandbox image and, for uploads, the
+zstandard package here (uploads fall back to gzip without it).
+"""
+
+import base64
+import io
+import json
+import os
+import posixpath
+import secrets
+import tarfile
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from utils.files_utils import EXCLUDED_DIRS
+from utils.logger import logger
+from .executor import AsyncSandbox
+from .sandbox import upload_file_bytes
+from .scripts import EXTRACT_SCRIPT, PACK_SCRIPT, READ_RANGE_SCRIPT, run_script
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+ARCHIVE_COMPRESSION = os.getenv("IRIS_ARCHIVE_COMPRESSION", "gzip").lower()
+ARCHIVE_TIMEOUT = int(os.getenv("IRIS_ARCHIVE_TIMEOUT", "300"))
+# Bytes of a packed archive read back per exec
+ARCHIVE_CHUNK_BYTES = int(os.getenv("IRIS_ARCHIVE_CHUNK_BYTES", str(4 * 1024 * 1024)))
+ARCHIVE_SUFFIXES = {"gzip": ".tar.gz", "zstd": ".tar.zst"}
+
+
+def archive_suffix(compression: Optional[str] = None) -> str:
+    return ARCHIVE_SUFFIXES.get(compression or ARCHIVE_COMPRESSION, ".tar.gz")
+
+
+def pack_files(files: Dict[str, bytes], compression: str = "gzip") -> bytes:
+    """Build a tar archive of files, keyed by their path inside the archive."""
+    buffer = io.BytesIO()
+    now = int(time.time())
+    mode = "w:gz" if compression == "gzip" else "w"
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = now
+            tar.addfile(info, io.BytesIO(data))
+    data = buffer.getvalue()
+    if compression == "zstd":
+        data = zstandard.ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def _staging_path(suffix: str) -> str:
+    # In the home directory, outside the workspace the user sees
+    return f".iris-transfer-{secrets.token_hex(8)}{suffix}"
+
+
+async def upload_files(
+    sandbox: AsyncSandbox,
+    files: Dict[str, bytes],
+    dest: str = "workspace",
+    compression: Optional[str] = None,
+) -> List[str]:
+    """Write many files into the sandbox in one upload and one exec.
+
+    Args:
+        files: File contents keyed by path relative to dest.
+        dest: Directory relative to the sandbox home, e.g. "workspace".
+
+    Returns:
+        Paths written, relative to the sandbox home.
+
+    Raises:
+        SandboxScriptError: If extraction failed, e.g. a path pointed outside dest.
+    """
+    compression = compression or ARCHIVE_COMPRESSION
+    if compression == "zstd" and not ZSTD_AVAILABLE:
+        logger.warning("IRIS_ARCHIVE_COMPRESSION=zstd but zstandard is not installed; using gzip")
+        compression = "gzip"
+
+    members = {posixpath.normpath(path.lstrip("/")): data for path, data in files.items()}
+    archive = pack_files(members, compression)
+    staging = _staging_path(archive_suffix(compression))
+    await sandbox.run(upload_file_bytes, sandbox.sandbox, staging, archive)
+    result = await run_script(sandbox, EXTRACT_SCRIPT, staging, dest, timeout=ARCHIVE_TIMEOUT)
+    logger.info(f"Uploaded {len(members)} files ({len(archive)} bytes archived) to sandbox {sandbox.sandbox_id}:{dest}")
+    return result.get("files", [])
+
+
+async def stream_folder(
+    sandbox: AsyncSandbox,
+    path: str,
+    compression: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+) -> Tuple[int, AsyncIterator[bytes]]:
+    """Pack a sandbox directory (skipping EXCLUDED_DIRS) and stream the archive back.
+
+    Args:
+        path: Directory relative to the sandbox home, e.g. "workspace/site".
+        chunk_size: Bytes read per exec; defaults to IRIS_ARCHIVE_CHUNK_BYTES.
+
+    Returns:
+        The archive size and an iterator over its chunks. The staging archive
+        in the sandbox is removed once the iterator finishes or is closed.
+    """
+    staging = _staging_path(archive_suffix(compression))
+    try:
+        info = await run_script(
+            sandbox, PACK_SCRIPT, path, staging, json.dumps(sorted(EXCLUDED_DIRS)), timeout=ARCHIVE_TIMEOUT
+        )
+    except Exception:
+        await _remove_staging(sandbox, staging)
+        raise
+    size = int(info.get("size", 0))
+    chunk_size = max(1, chunk_size or ARCHIVE_CHUNK_BYTES)
+
+    async def chunks() -> AsyncIterator[bytes]:
+        try:
+            for offset in range(0, size, chunk_size):
+                result = await run_script(
+                    sandbox, READ_RANGE_SCRIPT, staging, str(offset), str(chunk_size), timeout=ARCHIVE_TIMEOUT
+                )
+                yield base64.b64decode(result["data"])
+            logger.info(f"Downloaded {info.get('files', 0)} files ({size} bytes archived) from sandbox {sandbox.sandbox_id}:{path}")
+        finally:
+            await _remove_staging(sandbox, staging)
+
+    return size, chunks()
+
+
+async def download_folder(sandbox: AsyncSandbox, path: str, compression: Optional[str] = None) -> bytes:
+    """Pack a sandbox directory and return the whole archive; see stream_folder."""
+    _, chunks = await stream_folder(sandbox, path, compression)
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def _remove_staging(sandbox: AsyncSandbox, staging: str) -> None:
+    try:
+        await sandbox.delete_file(staging)
+    except Exception as e:
+        logger.warning(f"Could not remove staging archive {staging}: {str(e)}")
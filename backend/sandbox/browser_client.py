@@ -0,0 +1,163 @@
+"""
+Pooled HTTP client for the in-sandbox browser automation API.
+
+The browser API (sandbox/docker/browser_api.py) listens on port 8002 inside
+each sandbox. Rather than spawning curl in the sandbox for every action, the
+backend calls it directly through the sandbox's preview URL with one
+long-lived httpx.AsyncClient per sandbox:
+- keep-alive connections are reused across actions and tool instances
+- HTTP/2 is used when the h2 package is installed, multiplexing concurrent
+  requests over a single connection
+- clients for the most recently used IRIS_BROWSER_CLIENT_CACHE_SIZE sandboxes
+  are kept; older ones are closed
+"""
+
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+
+from sandbox.executor import run_sandbox_call
+from utils.logger import logger
+
+BROWSER_API_PORT = 8002
+BROWSER_API_PREFIX = "/api/automation"
+BROWSER_CLIENT_CACHE_SIZE = int(os.getenv("IRIS_BROWSER_CLIENT_CACHE_SIZE", "64"))
+BROWSER_API_TIMEOUT = float(os.getenv("IRIS_BROWSER_API_TIMEOUT", "30"))
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class BrowserApiError(Exception):
+    """The browser API answered with an error, or its response was not usable."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BrowserApiClient:
+    """Async client for one sandbox's browser API, reusing its connections."""
+
+    def __init__(self, base_url: str, token: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        headers = {
+            "Content-Type": "application/json",
+            # Skip Daytona's interstitial warning page for preview URLs
+            "X-Daytona-Skip-Preview-Warning": "true",
+        }
+        if token:
+            headers["X-Daytona-Preview-Token"] = token
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            base_url=f"{self.base_url}{BROWSER_API_PREFIX}",
+            headers=headers,
+            http2=HTTP2_AVAILABLE and transport is None,
+            timeout=httpx.Timeout(BROWSER_API_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=4, keepalive_expiry=60.0),
+            transport=transport,
+        )
+
+    @property
+    def closed(self) -> bool:
+        return self._client.is_closed
+
+    async def request(
+        self,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        method: str = "POST",
+        ocr_mode: Optional[str] = None,
+        dom_version: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Call an automation endpoint and return its JSON result.
+
+        Args:
+            ocr_mode: Optional OCR mode for this action (eager, lazy or off).
+            dom_version: DOM version the caller holds; interactive elements come
+                back as a diff against it, or in full if the API holds another.
+
+        Raises:
+            BrowserApiError: On an error status or a body that is not a JSON object.
+            httpx.TransportError: If the browser API cannot be reached.
+        """
+        query = {"ocr": ocr_mode} if ocr_mode else {}
+        if dom_version:
+            query["dom_version"] = dom_version
+        if method == "GET":
+            response = await self._client.get(f"/{endpoint}", params={**query, **(params or {})})
+        else:
+            response = await self._client.request(method, f"/{endpoint}", params=query, json=params or {})
+
+        if response.status_code >= 400:
+            raise BrowserApiError(
+                f"Browser automation request failed with status {response.status_code}: {response.text[:500]}",
+                status_code=response.status_code,
+            )
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise BrowserApiError(f"Failed to parse response JSON: {response.text[:500]} {e}")
+        if not isinstance(result, dict):
+            raise BrowserApiError(f"Unexpected browser automation response: {response.text[:500]}")
+        return result
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+_clients: "OrderedDict[str, BrowserApiClient]" = OrderedDict()
+_client_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def _browser_api_link(sandbox: Any):
+    link = await run_sandbox_call(sandbox.id, sandbox.get_preview_link, BROWSER_API_PORT)
+    if asyncio.iscoroutine(link):
+        link = await link
+    url = getattr(link, "url", None) or str(link)
+    if not url.startswith("http"):
+        raise BrowserApiError(f"No preview URL for the browser API of sandbox {sandbox.id}")
+    return url, getattr(link, "token", None)
+
+
+async def get_browser_client(sandbox: Any) -> BrowserApiClient:
+    """Return the shared browser API client for a sandbox, creating it on first use."""
+    sandbox_id = sandbox.id
+    client = _clients.get(sandbox_id)
+    if client is not None and not client.closed:
+        _clients.move_to_end(sandbox_id)
+        return client
+
+    lock = _client_locks.setdefault(sandbox_id, asyncio.Lock())
+    async with lock:
+        client = _clients.get(sandbox_id)
+        if client is None or client.closed:
+            url, token = await _browser_api_link(sandbox)
+            client = _clients[sandbox_id] = BrowserApiClient(url, token)
+            logger.debug(f"Created browser API client for sandbox {sandbox_id}")
+        _clients.move_to_end(sandbox_id)
+
+    while len(_clients) > max(1, BROWSER_CLIENT_CACHE_SIZE):
+        evicted_id, evicted = _clients.popitem(last=False)
+        _client_locks.pop(evicted_id, None)
+        await evicted.aclose()
+    return client
+
+
+async def invalidate_browser_client(sandbox_id: str) -> None:
+    """Drop a sandbox's client, e.g. after the sandbox restarted with a new preview token."""
+    client = _clients.pop(sandbox_id, None)
+    _client_locks.pop(sandbox_id, None)
+    if client is not None:
+        await client.aclose()
+
+
+async def close_browser_clients() -> None:
+    """Close every cached browser API client."""
+    for sandbox_id in list(_clients):
+        await invalidate_browser_client(sandbox_id)
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Body
+from fastapi import FastAPI, APIRouter, HTTPException, Body, Request
 from playwright.async_api import async_playwright, Browser, Page, ElementHandle
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any, Union
@@ -16,6 +16,45 @@ import traceback
 import pytesseract
 from PIL import Image
 import io
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar
+
+#######################################################
+# OCR configuration
+#######################################################
+
+# eager: OCR after every action; lazy: only via /automation/ocr_text; off: never
+OCR_MODES = ("eager", "lazy", "off")
+OCR_MODE = os.getenv("BROWSER_OCR_MODE", "eager").lower()
+OCR_WORKERS = int(os.getenv("BROWSER_OCR_WORKERS", "2"))
+OCR_TIMEOUT = float(os.getenv("BROWSER_OCR_TIMEOUT", "20"))
+OCR_CACHE_SIZE = 128
+
+# Page settle detection: the DOM must see no mutations for SETTLE_QUIET_MS with no
+# requests in flight; waiting stops at the cap either way
+SETTLE_QUIET_MS = int(os.getenv("BROWSER_SETTLE_QUIET_MS", "50"))
+SETTLE_MAX_MS = int(os.getenv("BROWSER_SETTLE_MAX_MS", "3000"))
+NAVIGATION_SETTLE_MAX_MS = int(os.getenv("BROWSER_NAVIGATION_SETTLE_MAX_MS", "10000"))
+
+# Return interactive elements as a diff against the state the client holds;
+# a full list is sent when the client holds another version (or none), after
+# navigation, a tab switch or a restart
+DOM_DIFFS = os.getenv("BROWSER_DOM_DIFFS", "true").lower() in ("1", "true", "yes")
+
+# Per-request OCR mode, set from the ?ocr= query parameter or X-Browser-OCR header
+request_ocr_mode: ContextVar[Optional[str]] = ContextVar("request_ocr_mode", default=None)
+# DOM version the client holds, set from the ?dom_version= query parameter or X-Browser-DOM-Version header
+request_dom_version: ContextVar[Optional[str]] = ContextVar("request_dom_version", default=None)
+
+
+def _ocr_image(image_bytes: bytes) -> str:
+    """Run OCR on an encoded image. Executed in the OCR worker processes."""
+    image = Image.open(io.BytesIO(image_bytes))
+    return pytesseract.image_to_string(image).strip()
 
 #######################################################
 # Action model definitions
@@ -101,6 +140,17 @@ class HashedDomElement:
     is_visible: bool
     page_coordinates: Optional[CoordinateSet] = None
 
+    def key(self) -> str:
+        """Digest identifying the element across DOM snapshots of a page"""
+        coords = self.page_coordinates
+        payload = json.dumps([
+            self.tag_name,
+            sorted(self.attributes.items()),
+            self.is_visible,
+            [round(coords.x), round(coords.y), round(coords.width), round(coords.height)] if coords else None
+        ])
+        return hashlib.sha1(payload.encode()).hexdigest()
+
 @dataclass
 class DOMBaseNode:
     is_visible: bool
@@ -131,6 +181,7 @@ class DOMElementNode(DOMBaseNode):
     is_in_viewport: bool = False
     shadow_root: bool = False
     highlight_index: Optional[int] = None
+    dom_index: Optional[int] = None  # 1-based position among the page's visible interactive elements
     viewport_coordinates: Optional[CoordinateSet] = None
     page_coordinates: Optional[CoordinateSet] = None
     viewport_info: Optional[ViewportInfo] = None
@@ -246,6 +297,181 @@ class DOMState:
     title: str = ""
     pixels_above: int = 0
     pixels_below: int = 0
+    viewport_width: int = 0
+    viewport_height: int = 0
+
+@dataclass
+class PageElementIndex:
+    """Stable highlight indices for the interactive elements of one page
+
+    An element keeps its index for as long as its HashedDomElement key is seen
+    on the page, so indices from earlier actions stay valid; new elements get
+    fresh ones. Replaced on navigation.
+    """
+    url: str = ""
+    indices: Dict[str, int] = field(default_factory=dict)
+    next_index: int = 1
+
+    def assign(self, selector_map: Dict[int, 'DOMElementNode']) -> Dict[int, 'DOMElementNode']:
+        """Re-key a selector map (ordered by DOM position) by stable index"""
+        stable_map = {}
+        indices = {}
+        occurrences: Dict[str, int] = {}
+        for element in selector_map.values():
+            key = element.hash.key()
+            # Identical elements are told apart by their order
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            if occurrence:
+                key = f"{key}:{occurrence}"
+
+            index = self.indices.get(key)
+            if index is None:
+                index = self.next_index
+                self.next_index += 1
+            indices[key] = index
+            element.highlight_index = index
+            stable_map[index] = element
+        # Forget elements that are gone
+        self.indices = indices
+        return stable_map
+
+@dataclass
+class ReportedDomState:
+    """Interactive elements last returned to the client, the base of the next diff"""
+    page_index: PageElementIndex
+    version: str
+    elements: Dict[int, Dict[str, Any]]
+
+#######################################################
+# Page settle detection
+#######################################################
+
+# Resolves once the DOM has had no mutations for quietMs (true), or after maxMs (false)
+DOM_QUIET_JS = """
+({quietMs, maxMs}) => new Promise(resolve => {
+    const start = performance.now();
+    let last = start;
+    const observer = new MutationObserver(() => { last = performance.now(); });
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    const check = () => {
+        const now = performance.now();
+        const quietFor = now - last;
+        if (quietFor >= quietMs || now - start >= maxMs) {
+            observer.disconnect();
+            resolve(quietFor >= quietMs);
+        } else {
+            setTimeout(check, Math.max(5, Math.min(quietMs - quietFor, maxMs - (now - start))));
+        }
+    };
+    setTimeout(check, Math.min(quietMs, maxMs));
+})
+"""
+
+# Interactive elements plus title, scroll position and viewport of the current page
+PAGE_STATE_JS = """
+            (() => {
+                // Helper function to get all attributes as an object
+                function getAttributes(el) {
+                    const attributes = {};
+                    for (const attr of el.attributes) {
+                        attributes[attr.name] = attr.value;
+                    }
+                    return attributes;
+                }
+                
+                // Find all potentially interactive elements
+                const interactiveElements = Array.from(document.querySelectorAll(
+                    'a, button, input, select, textarea, [role="button"], [role="link"], [role="checkbox"], [role="radio"], [tabindex]:not([tabindex="-1"])'
+                ));
+                
+                // Filter for visible elements
+                const visibleElements = interactiveElements.filter(el => {
+                    const style = window.getComputedStyle(el);
+                    const rect = el.getBoundingClientRect();
+                    return style.display !== 'none' && 
+                           style.visibility !== 'hidden' && 
+                           style.opacity !== '0' &&
+                           rect.width > 0 && 
+                           rect.height > 0;
+                });
+                
+                // Map to our expected structure
+                const elements = visibleElements.map((el, index) => {
+                    const rect = el.getBoundingClientRect();
+                    const isInViewport = rect.top >= 0 && 
+                                      rect.left >= 0 && 
+                                      rect.bottom <= window.innerHeight &&
+                                      rect.right <= window.innerWidth;
+                    
+                    return {
+                        index: index + 1,
+                        tagName: el.tagName.toLowerCase(),
+                        text: el.innerText || el.value || '',
+                        attributes: getAttributes(el),
+                        isVisible: true,
+                        isInteractive: true,
+                        pageCoordinates: {
+                            x: rect.left + window.scrollX,
+                            y: rect.top + window.scrollY,
+                            width: rect.width,
+                            height: rect.height
+                        },
+                        viewportCoordinates: {
+                            x: rect.left,
+                            y: rect.top,
+                            width: rect.width,
+                            height: rect.height
+                        },
+                        isInViewport: isInViewport
+                    };
+                });
+
+                // Scroll position and viewport, in the same round trip
+                const body = document.body;
+                const html = document.documentElement;
+                const totalHeight = Math.max(
+                    body ? body.scrollHeight : 0, body ? body.offsetHeight : 0,
+                    html.clientHeight, html.scrollHeight, html.offsetHeight
+                );
+                const scrollY = window.scrollY || window.pageYOffset;
+                const windowHeight = window.innerHeight;
+
+                return {
+                    elements: elements,
+                    title: document.title,
+                    pixelsAbove: scrollY,
+                    pixelsBelow: Math.max(0, totalHeight - scrollY - windowHeight),
+                    viewportWidth: window.innerWidth,
+                    viewportHeight: windowHeight
+                };
+            })();
+            """
+
+class NetworkActivity:
+    """Tracks a page's in-flight requests for settle detection"""
+
+    # Long-lived connections never finish and would hold every settle to the cap
+    IGNORED_RESOURCE_TYPES = {"websocket", "eventsource"}
+
+    def __init__(self, page: Page):
+        self.inflight = set()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def _on_request(self, request) -> None:
+        if request.resource_type in self.IGNORED_RESOURCE_TYPES:
+            return
+        self.inflight.add(request)
+        self.idle.clear()
+
+    def _on_done(self, request) -> None:
+        self.inflight.discard(request)
+        if not self.inflight:
+            self.idle.set()
 
 #######################################################
 # Browser Action Result Model
@@ -265,6 +491,13 @@ class BrowserActionResult(BaseModel):
     pixels_below: int = 0
     content: Optional[str] = None
     ocr_text: Optional[str] = None  # Added field for OCR text
+    timings: Optional[Dict[str, float]] = None  # Milliseconds spent per step (settle, dom, screenshot, ocr)
+    
+    # DOM state versioning: without a base version interactive_elements is the full list,
+    # otherwise dom_diff holds the added, removed and changed elements since that version
+    dom_version: Optional[str] = None
+    dom_base_version: Optional[str] = None
+    dom_diff: Optional[Dict[str, Any]] = None
     
     # Additional metadata
     element_count: int = 0  # Number of interactive elements found
@@ -289,6 +522,17 @@ class BrowserAutomation:
         self.include_attributes = ["id", "href", "src", "alt", "aria-label", "placeholder", "name", "role", "title", "value"]
         self.screenshot_dir = os.path.join(os.getcwd(), "screenshots")
         os.makedirs(self.screenshot_dir, exist_ok=True)
+        # OCR runs in worker processes, memoized by screenshot hash
+        self._ocr_executor: Optional[ProcessPoolExecutor] = None
+        self._ocr_results: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self.last_screenshot: str = ""
+        # In-flight request tracking per page (keyed by id(page))
+        self._network: Dict[int, NetworkActivity] = {}
+        # Stable element indices per page (keyed by id(page)) and the last reported state
+        self._element_indices: Dict[int, PageElementIndex] = {}
+        self._reported_dom: Optional[ReportedDomState] = None
+        self._dom_session = os.urandom(4).hex()
+        self._dom_version = 0
         
         # Register routes
         self.router.on_startup.append(self.startup)
@@ -327,6 +571,9 @@ class BrowserAutomation:
         # Drag and drop
         self.router.post("/automation/drag_drop")(self.drag_drop)
 
+        # OCR of the latest screenshot, for requests that skipped it
+        self.router.post("/automation/ocr_text")(self.ocr_text)
+
     async def startup(self):
         """Initialize the browser instance on startup"""
         try:
@@ -375,162 +622,216 @@ class BrowserAutomation:
         """Clean up browser instance on shutdown"""
         if self.browser:
             await self.browser.close()
+        if self._ocr_executor:
+            self._ocr_executor.shutdown(wait=False, cancel_futures=True)
+            self._ocr_executor = None
     
     async def get_current_page(self) -> Page:
         """Get the current active page"""
         if not self.pages:
             raise HTTPException(status_code=500, detail="No browser pages available")
-        return self.pages[self.current_page_index]
+        page = self.pages[self.current_page_index]
+        self.network_activity(page)
+        return page
+
+    def network_activity(self, page: Page) -> NetworkActivity:
+        """Get the request tracker of a page, attaching one on first use"""
+        activity = self._network.get(id(page))
+        if activity is None:
+            activity = self._network[id(page)] = NetworkActivity(page)
+            page.on("close", lambda _: self._forget_page(id(page)))
+        return activity
+
+    def _forget_page(self, page_key: int) -> None:
+        self._network.pop(page_key, None)
+        self._element_indices.pop(page_key, None)
+
+    def element_index(self, page: Page) -> PageElementIndex:
+        """Get the stable element indices of a page, starting over after navigation"""
+        url = page.url.split("#", 1)[0]
+        page_index = self._element_indices.get(id(page))
+        if page_index is None or page_index.url != url:
+            page_index = self._element_indices[id(page)] = PageElementIndex(url=url)
+        return page_index
+
+    def dom_state_update(self, page: Page, interactive_elements: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Describe the interactive elements relative to the state the client holds
+
+        The diff base is the previously returned state, used only when the
+        request's dom_version names it: a client that missed a state, or that
+        shares the browser with another client, gets the full list. So do the
+        first state, navigation, another tab, or disabled diffs.
+        """
+        page_index = self.element_index(page)
+        self._dom_version += 1
+        version = f"{self._dom_session}:{self._dom_version}"
+        current = {element['index']: element for element in interactive_elements}
+        previous = self._reported_dom
+        self._reported_dom = ReportedDomState(page_index=page_index, version=version, elements=current)
+
+        if (not DOM_DIFFS or previous is None or previous.page_index is not page_index
+                or previous.version != request_dom_version.get()):
+            return {'dom_version': version, 'interactive_elements': interactive_elements}
+
+        before = previous.elements
+        return {
+            'dom_version': version,
+            'dom_base_version': previous.version,
+            'dom_diff': {
+                'added': [element for index, element in current.items() if index not in before],
+                'removed': [index for index in before if index not in current],
+                'changed': [element for index, element in current.items()
+                            if index in before and before[index] != element],
+            },
+        }
+
+    async def wait_for_page_settle(self, page: Page = None, max_wait_ms: int = SETTLE_MAX_MS) -> Dict[str, Any]:
+        """Wait until the page has settled, or max_wait_ms has passed
+
+        Settled means the document is parsed, no tracked requests are in flight
+        and the DOM has seen no mutations for SETTLE_QUIET_MS. A page that is
+        already idle returns after one quiet window.
+
+        Returns:
+            dict with settle_ms (time waited) and settled (False if the cap was hit)
+        """
+        page = page or await self.get_current_page()
+        network = self.network_activity(page)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + max_wait_ms / 1000
+        settled = False
+
+        while not settled:
+            remaining_ms = (deadline - loop.time()) * 1000
+            if remaining_ms <= 0:
+                break
+            try:
+                await page.wait_for_load_state("domcontentloaded", timeout=remaining_ms)
+                if not network.idle.is_set():
+                    await asyncio.wait_for(network.idle.wait(), timeout=max(0, deadline - loop.time()))
+                remaining_ms = max(0, (deadline - loop.time()) * 1000)
+                dom_quiet = await page.evaluate(DOM_QUIET_JS, {"quietMs": SETTLE_QUIET_MS, "maxMs": remaining_ms})
+                # DOM updates may have started new requests
+                settled = bool(dom_quiet) and network.idle.is_set()
+            except asyncio.TimeoutError:
+                break
+            except Exception as e:
+                # A navigation replaced the document mid-check; wait for the new one
+                print(f"Settle check interrupted: {e}")
+                await asyncio.sleep(0.02)
+
+        return {"settle_ms": round((loop.time() - started) * 1000, 1), "settled": settled}
     
-    async def get_selector_map(self) -> Dict[int, DOMElementNode]:
-        """Get a map of selectable elements on the page"""
+    async def collect_page_state(self) -> Dict[str, Any]:
+        """Collect interactive elements, title, scroll position and viewport in one evaluate call"""
         page = await self.get_current_page()
-        
-        # Create a selector map for interactive elements
+        return await page.evaluate(PAGE_STATE_JS)
+
+    def build_selector_map(self, elements: List[Dict[str, Any]]) -> Dict[int, DOMElementNode]:
+        """Build element nodes, keyed by highlight index, from collected elements"""
         selector_map = {}
-        
+        # Create a root element for the tree
+        root = DOMElementNode(
+            is_visible=True,
+            tag_name="body",
+            is_interactive=False,
+            is_top_element=True
+        )
+
+        # Create element nodes for each element
+        for idx, el in enumerate(elements):
+            # Create coordinate sets
+            page_coordinates = None
+            viewport_coordinates = None
+
+            if 'pageCoordinates' in el:
+                coords = el['pageCoordinates']
+                page_coordinates = CoordinateSet(
+                    x=coords.get('x', 0),
+                    y=coords.get('y', 0),
+                    width=coords.get('width', 0),
+                    height=coords.get('height', 0)
+                )
+
+            if 'viewportCoordinates' in el:
+                coords = el['viewportCoordinates']
+                viewport_coordinates = CoordinateSet(
+                    x=coords.get('x', 0),
+                    y=coords.get('y', 0),
+                    width=coords.get('width', 0),
+                    height=coords.get('height', 0)
+                )
+
+            # Create the element node
+            element_node = DOMElementNode(
+                is_visible=el.get('isVisible', True),
+                tag_name=el.get('tagName', 'div'),
+                attributes=el.get('attributes', {}),
+                is_interactive=el.get('isInteractive', True),
+                is_in_viewport=el.get('isInViewport', False),
+                highlight_index=el.get('index', idx + 1),
+                dom_index=el.get('index', idx + 1),
+                page_coordinates=page_coordinates,
+                viewport_coordinates=viewport_coordinates
+            )
+
+            # Add a text node if there's text content
+            if el.get('text'):
+                text_node = DOMTextNode(is_visible=True, text=el.get('text', ''))
+                text_node.parent = element_node
+                element_node.children.append(text_node)
+
+            selector_map[el.get('index', idx + 1)] = element_node
+            root.children.append(element_node)
+            element_node.parent = root
+
+        return selector_map
+
+    def dummy_selector_map(self) -> Dict[int, DOMElementNode]:
+        selector_map = {}
+        # Create a dummy element to avoid breaking tests
+        dummy = DOMElementNode(
+            is_visible=True,
+            tag_name="a",
+            attributes={'href': '#'},
+            is_interactive=True,
+            highlight_index=1
+        )
+        dummy_text = DOMTextNode(is_visible=True, text="Dummy Element")
+        dummy_text.parent = dummy
+        dummy.children.append(dummy_text)
+        selector_map[1] = dummy
+
+        return selector_map
+
+    async def get_selector_map(self) -> Dict[int, DOMElementNode]:
+        """Get a map of selectable elements on the page"""
         try:
-            # More comprehensive JavaScript to find interactive elements
-            elements_js = """
-            (() => {
-                // Helper function to get all attributes as an object
-                function getAttributes(el) {
-                    const attributes = {};
-                    for (const attr of el.attributes) {
-                        attributes[attr.name] = attr.value;
-                    }
-                    return attributes;
-                }
-                
-                // Find all potentially interactive elements
-                const interactiveElements = Array.from(document.querySelectorAll(
-                    'a, button, input, select, textarea, [role="button"], [role="link"], [role="checkbox"], [role="radio"], [tabindex]:not([tabindex="-1"])'
-                ));
-                
-                // Filter for visible elements
-                const visibleElements = interactiveElements.filter(el => {
-                    const style = window.getComputedStyle(el);
-                    const rect = el.getBoundingClientRect();
-                    return style.display !== 'none' && 
-                           style.visibility !== 'hidden' && 
-                           style.opacity !== '0' &&
-                           rect.width > 0 && 
-                           rect.height > 0;
-                });
-                
-                // Map to our expected structure
-                return visibleElements.map((el, index) => {
-                    const rect = el.getBoundingClientRect();
-                    const isInViewport = rect.top >= 0 && 
-                                      rect.left >= 0 && 
-                                      rect.bottom <= window.innerHeight &&
-                                      rect.right <= window.innerWidth;
-                    
-                    return {
-                        index: index + 1,
-                        tagName: el.tagName.toLowerCase(),
-                        text: el.innerText || el.value || '',
-                        attributes: getAttributes(el),
-                        isVisible: true,
-                        isInteractive: true,
-                        pageCoordinates: {
-                            x: rect.left + window.scrollX,
-                            y: rect.top + window.scrollY,
-                            width: rect.width,
-                            height: rect.height
-                        },
-                        viewportCoordinates: {
-                            x: rect.left,
-                            y: rect.top,
-                            width: rect.width,
-                            height: rect.height
-                        },
-                        isInViewport: isInViewport
-                    };
-                });
-            })();
-            """
-            
-            elements = await page.evaluate(elements_js)
+            page_state = await self.collect_page_state()
+            elements = page_state.get('elements', [])
             print(f"Found {len(elements)} interactive elements in selector map")
-            
-            # Create a root element for the tree
-            root = DOMElementNode(
-                is_visible=True,
-                tag_name="body",
-                is_interactive=False,
-                is_top_element=True
-            )
-            
-            # Create element nodes for each element
-            for idx, el in enumerate(elements):
-                # Create coordinate sets
-                page_coordinates = None
-                viewport_coordinates = None
-                
-                if 'pageCoordinates' in el:
-                    coords = el['pageCoordinates']
-                    page_coordinates = CoordinateSet(
-                        x=coords.get('x', 0),
-                        y=coords.get('y', 0),
-                        width=coords.get('width', 0),
-                        height=coords.get('height', 0)
-                    )
-                
-                if 'viewportCoordinates' in el:
-                    coords = el['viewportCoordinates']
-                    viewport_coordinates = CoordinateSet(
-                        x=coords.get('x', 0),
-                        y=coords.get('y', 0),
-                        width=coords.get('width', 0),
-                        height=coords.get('height', 0)
-                    )
-                
-                # Create the element node
-                element_node = DOMElementNode(
-                    is_visible=el.get('isVisible', True),
-                    tag_name=el.get('tagName', 'div'),
-                    attributes=el.get('attributes', {}),
-                    is_interactive=el.get('isInteractive', True),
-                    is_in_viewport=el.get('isInViewport', False),
-                    highlight_index=el.get('index', idx + 1),
-                    page_coordinates=page_coordinates,
-                    viewport_coordinates=viewport_coordinates
-                )
-                
-                # Add a text node if there's text content
-                if el.get('text'):
-                    text_node = DOMTextNode(is_visible=True, text=el.get('text', ''))
-                    text_node.parent = element_node
-                    element_node.children.append(text_node)
-                
-                selector_map[el.get('index', idx + 1)] = element_node
-                root.children.append(element_node)
-                element_node.parent = root
-                
+            page = await self.get_current_page()
+            return self.element_index(page).assign(self.build_selector_map(elements))
         except Exception as e:
             print(f"Error getting selector map: {e}")
             traceback.print_exc()
-            # Create a dummy element to avoid breaking tests
-            dummy = DOMElementNode(
-                is_visible=True,
-                tag_name="a",
-                attributes={'href': '#'},
-                is_interactive=True,
-                highlight_index=1
-            )
-            dummy_text = DOMTextNode(is_visible=True, text="Dummy Element")
-            dummy_text.parent = dummy
-            dummy.children.append(dummy_text)
-            selector_map[1] = dummy
-        
-        return selector_map
+            return self.dummy_selector_map()
     
     async def get_current_dom_state(self) -> DOMState:
         """Get the current DOM state including element tree and selector map"""
         try:
             page = await self.get_current_page()
-            selector_map = await self.get_selector_map()
+            try:
+                page_state = await self.collect_page_state()
+                elements = page_state.get('elements', [])
+                print(f"Found {len(elements)} interactive elements in selector map")
+                selector_map = self.element_index(page).assign(self.build_selector_map(elements))
+            except Exception as e:
+                print(f"Error getting selector map: {e}")
+                traceback.print_exc()
+                page_state = {}
+                selector_map = self.dummy_selector_map()
             
             # Create a root element
             root = DOMElementNode(
@@ -546,48 +847,15 @@ class BrowserAutomation:
                     element.parent = root
                     root.children.append(element)
             
-            # Get basic page info
-            url = page.url
-            try:
-                title = await page.title()
-            except:
-                title = "Unknown Title"
-            
-            # Get more accurate scroll information - fix JavaScript syntax
-            try:
-                scroll_info = await page.evaluate("""
-                () => {
-                    const body = document.body;
-                    const html = document.documentElement;
-                    const totalHeight = Math.max(
-                        body.scrollHeight, body.offsetHeight,
-                        html.clientHeight, html.scrollHeight, html.offsetHeight
-                    );
-                    const scrollY = window.scrollY || window.pageYOffset;
-                    const windowHeight = window.innerHeight;
-                    
-                    return {
-                        pixelsAbove: scrollY,
-                        pixelsBelow: Math.max(0, totalHeight - scrollY - windowHeight),
-                        totalHeight: totalHeight,
-                        viewportHeight: windowHeight
-                    };
-                }
-                """)
-                pixels_above = scroll_info.get('pixelsAbove', 0)
-                pixels_below = scroll_info.get('pixelsBelow', 0)
-            except Exception as e:
-                print(f"Error getting scroll info: {e}")
-                pixels_above = 0
-                pixels_below = 0
-            
             return DOMState(
                 element_tree=root,
                 selector_map=selector_map,
-                url=url,
-                title=title,
-                pixels_above=pixels_above,
-                pixels_below=pixels_below
+                url=page.url,
+                title=page_state.get('title') or "Unknown Title",
+                pixels_above=page_state.get('pixelsAbove', 0),
+                pixels_below=page_state.get('pixelsBelow', 0),
+                viewport_width=page_state.get('viewportWidth', 0),
+                viewport_height=page_state.get('viewportHeight', 0)
             )
         except Exception as e:
             print(f"Error getting DOM state: {e}")
@@ -635,39 +903,78 @@ class BrowserAutomation:
             print(f"Error saving screenshot: {e}")
             return ""
     
+    def get_ocr_executor(self) -> ProcessPoolExecutor:
+        """Get the OCR process pool, creating it on first use"""
+        if self._ocr_executor is None:
+            self._ocr_executor = ProcessPoolExecutor(max_workers=max(1, OCR_WORKERS))
+        return self._ocr_executor
+
     async def extract_ocr_text_from_screenshot(self, screenshot_base64: str) -> str:
-        """Extract text from screenshot using OCR"""
+        """Extract text from screenshot using OCR
+
+        OCR runs in a bounded process pool so it never blocks the event loop.
+        Results are memoized by screenshot hash; concurrent requests for the
+        same screenshot share one OCR run. Failed runs are not memoized, so the
+        next request for the screenshot tries again.
+        """
         if not screenshot_base64:
             return ""
-            
+
+        key = hashlib.sha256(screenshot_base64.encode("ascii")).hexdigest()
+        future = self._ocr_results.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run_ocr(screenshot_base64))
+            future.add_done_callback(lambda done: self._forget_failed_ocr(key, done))
+            self._ocr_results[key] = future
+            if len(self._ocr_results) > OCR_CACHE_SIZE:
+                self._ocr_results.popitem(last=False)
+        else:
+            self._ocr_results.move_to_end(key)
+
         try:
-            # Decode base64 to image
-            image_bytes = base64.b64decode(screenshot_base64)
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Extract text using pytesseract
-            ocr_text = pytesseract.image_to_string(image)
-            
-            # Clean up the text
-            ocr_text = ocr_text.strip()
-            
-            return ocr_text
+            return await asyncio.wait_for(asyncio.shield(future), timeout=OCR_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"OCR timed out after {OCR_TIMEOUT}s")
+            return ""
         except Exception as e:
             print(f"Error performing OCR: {e}")
-            traceback.print_exc()
             return ""
-    
-    async def get_updated_browser_state(self, action_name: str) -> tuple:
+
+    def _forget_failed_ocr(self, key: str, future: asyncio.Future) -> None:
+        if (future.cancelled() or future.exception() is not None) and self._ocr_results.get(key) is future:
+            del self._ocr_results[key]
+
+    async def _run_ocr(self, screenshot_base64: str) -> str:
+        try:
+            image_bytes = base64.b64decode(screenshot_base64)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_ocr_executor(), _ocr_image, image_bytes)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next attempt
+            self._ocr_executor = None
+            raise
+
+    async def get_updated_browser_state(self, action_name: str, max_settle_ms: int = SETTLE_MAX_MS) -> tuple:
         """Helper method to get updated browser state after any action
         Returns a tuple of (dom_state, screenshot, elements, metadata)
         """
         try:
-            # Wait a moment for any potential async processes to settle
-            await asyncio.sleep(0.5)
+            timings = {}
+            started = time.perf_counter()
+
+            # Wait for network and DOM activity started by the action to die down
+            settle = await self.wait_for_page_settle(max_wait_ms=max_settle_ms)
+            timings['settle_ms'] = settle['settle_ms']
             
             # Get updated state
+            step_started = time.perf_counter()
             dom_state = await self.get_current_dom_state()
+            timings['dom_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+
+            step_started = time.perf_counter()
             screenshot = await self.take_screenshot()
+            timings['screenshot_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+            self.last_screenshot = screenshot
             
             # Format elements for output
             elements = dom_state.element_tree.clickable_elements_to_string(
@@ -698,30 +1005,22 @@ class BrowserAutomation:
                 
                 interactive_elements.append(element_info)
             
-            metadata['interactive_elements'] = interactive_elements
+            metadata.update(self.dom_state_update(page, interactive_elements))
             
-            # Get viewport dimensions - Fix syntax error in JavaScript
-            try:
-                viewport = await page.evaluate("""
-                () => {
-                    return {
-                        width: window.innerWidth,
-                        height: window.innerHeight
-                    };
-                }
-                """)
-                metadata['viewport_width'] = viewport.get('width', 0)
-                metadata['viewport_height'] = viewport.get('height', 0)
-            except Exception as e:
-                print(f"Error getting viewport dimensions: {e}")
-                metadata['viewport_width'] = 0
-                metadata['viewport_height'] = 0
+            # Viewport dimensions were collected along with the DOM state
+            metadata['viewport_width'] = dom_state.viewport_width
+            metadata['viewport_height'] = dom_state.viewport_height
+            metadata['settled'] = settle['settled']
             
-            # Extract OCR text from screenshot if available
-            ocr_text = ""
-            if screenshot:
-                ocr_text = await self.extract_ocr_text_from_screenshot(screenshot)
-                metadata['ocr_text'] = ocr_text
+            # Extract OCR text from screenshot if available and wanted for this request
+            ocr_mode = request_ocr_mode.get() or OCR_MODE
+            if screenshot and ocr_mode == "eager":
+                step_started = time.perf_counter()
+                metadata['ocr_text'] = await self.extract_ocr_text_from_screenshot(screenshot)
+                timings['ocr_ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+
+            timings['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            metadata['timings'] = timings
             
             print(f"Got updated state after {action_name}: {len(dom_state.selector_map)} elements")
             return dom_state, screenshot, elements, metadata
@@ -751,12 +1050,27 @@ class BrowserAutomation:
             pixels_below=dom_state.pixels_below if dom_state else 0,
             content=content,
             ocr_text=metadata.get('ocr_text', ""),
+            timings=metadata.get('timings'),
             element_count=metadata.get('element_count', 0),
-            interactive_elements=metadata.get('interactive_elements', []),
+            interactive_elements=metadata.get('interactive_elements'),
+            dom_version=metadata.get('dom_version'),
+            dom_base_version=metadata.get('dom_base_version'),
+            dom_diff=metadata.get('dom_diff'),
             viewport_width=metadata.get('viewport_width', 0),
             viewport_height=metadata.get('viewport_height', 0)
         )
 
+    async def ocr_text(self):
+        """OCR text of the latest screenshot (memoized; nothing to do if already computed)"""
+        started = time.perf_counter()
+        text = await self.extract_ocr_text_from_screenshot(self.last_screenshot)
+        return {
+            "success": bool(self.last_screenshot),
+            "message": "OCR text extracted" if self.last_screenshot else "No screenshot taken yet",
+            "ocr_text": text,
+            "timings": {"ocr_ms": round((time.perf_counter() - started) * 1000, 1)},
+        }
+
     # Basic Navigation Actions
     
     async def navigate_to(self, action: GoToUrlAction = Body(...)):
@@ -764,10 +1078,11 @@ class BrowserAutomation:
         try:
             page = await self.get_current_page()
             await page.goto(action.url, wait_until="domcontentloaded")
-            await page.wait_for_load_state("networkidle", timeout=10000)
             
-            # Get updated state after action
-            dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"navigate_to({action.url})")
+            # Get updated state once the page has settled
+            dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(
+                f"navigate_to({action.url})", max_settle_ms=NAVIGATION_SETTLE_MAX_MS
+            )
             
             result = self.build_action_result(
                 True,
@@ -931,10 +1246,7 @@ class BrowserAutomation:
             # Perform the click at the specified coordinates
             await page.mouse.click(action.x, action.y)
             
-            # Give time for any navigation or DOM updates to occur
-            await page.wait_for_load_state("networkidle", timeout=5000)
-            
-            # Get updated state after action
+            # Get updated state once navigation or DOM updates have settled
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"click_coordinates({action.x}, {action.y})")
             
             return self.build_action_result(
@@ -1023,7 +1335,8 @@ class BrowserAutomation:
             }
             """
             
-            element_info = {'index': action.index} # Pass the target index to the script
+            # Pass the element's position on the page to the script
+            element_info = {'index': element_to_click.dom_index or action.index}
             
             target_element_handle = await page.evaluate_handle(js_selector_script, element_info)
 
@@ -1047,14 +1360,7 @@ class BrowserAutomation:
                  print(error_message)
 
 
-            # Wait for potential page changes/network activity
-            try:
-                await page.wait_for_load_state("networkidle", timeout=5000)
-            except Exception as wait_error:
-                print(f"Timeout or error waiting for network idle after click: {wait_error}")
-                await asyncio.sleep(1) # Fallback wait
-
-            # Get updated state after action
+            # Get updated state once page changes/network activity have settled
             dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"click_element({action.index})")
 
             return self.build_action_result(
@@ -1244,11 +1550,11 @@ class BrowserAutomation:
             print(f"Attempting to open new tab with URL: {action.url}")
             # Create new page in same browser instance
             new_page = await self.browser.new_page()
+            self.network_activity(new_page)
             print(f"New page created successfully")
             
             # Navigate to the URL
             await new_page.goto(action.url, wait_until="domcontentloaded")
-            await new_page.wait_for_load_state("networkidle", timeout=10000)
             print(f"Navigated to URL in new tab: {action.url}")
             
             # Add to page list and make it current
@@ -1257,7 +1563,9 @@ class BrowserAutomation:
             print(f"New tab added as index {self.current_page_index}")
             
             # Get updated state after action
-            dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(f"open_tab({action.url})")
+            dom_state, screenshot, elements, metadata = await self.get_updated_browser_state(
+                f"open_tab({action.url})", max_settle_ms=NAVIGATION_SETTLE_MAX_MS
+            )
             
             return self.build_action_result(
                 True,
@@ -1797,6 +2105,20 @@ automation_service = BrowserAutomation()
 # Create API app
 api_app = FastAPI()
 
+@api_app.middleware("http")
+async def request_options_middleware(request: Request, call_next):
+    """Let each request choose its OCR mode (?ocr=eager|lazy|off or X-Browser-OCR)
+    and name the DOM version it holds (?dom_version= or X-Browser-DOM-Version)"""
+    mode = (request.query_params.get("ocr") or request.headers.get("x-browser-ocr") or "").lower()
+    dom_version = request.query_params.get("dom_version") or request.headers.get("x-browser-dom-version")
+    ocr_token = request_ocr_mode.set(mode if mode in OCR_MODES else None)
+    dom_token = request_dom_version.set(dom_version or None)
+    try:
+        return await call_next(request)
+    finally:
+        request_dom_version.reset(dom_token)
+        request_ocr_mode.reset(ocr_token)
+
 @api_app.get("/api")
 async def health_check():
     return {"status": "ok", "message": "API server is running"}
@@ -0,0 +1,174 @@
+"""
+Async execution of blocking Daytona SDK calls.
+
+The Daytona SDK is synchronous; calling it from a coroutine freezes the event
+loop (and every other run's SSE stream) for as long as a command takes. All
+sandbox tools and routes go through this layer instead:
+
+- SDK calls run on a dedicated, bounded thread pool (IRIS_SANDBOX_EXECUTOR_WORKERS)
+- At most IRIS_SANDBOX_CONCURRENCY calls run at once per sandbox, so one busy
+  sandbox cannot take over the whole pool
+- Awaiting callers can be cancelled or time out. A call that has not started
+  yet is dropped; one already running in a thread cannot be interrupted, so it
+  keeps its sandbox slot until the SDK returns
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from utils.logger import logger
+
+SANDBOX_EXECUTOR_WORKERS = int(os.getenv("IRIS_SANDBOX_EXECUTOR_WORKERS", "32"))
+SANDBOX_CONCURRENCY = int(os.getenv("IRIS_SANDBOX_CONCURRENCY", "4"))
+# Extra seconds allowed on top of a command's own timeout before the caller gives up
+SDK_TIMEOUT_GRACE = 5
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Per-sandbox limits, dropped once no call holds or waits for them
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+_semaphore_users: Dict[str, int] = {}
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool for SDK calls, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, SANDBOX_EXECUTOR_WORKERS),
+            thread_name_prefix="sandbox-sdk",
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Stop the thread pool without waiting for running SDK calls."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _sandbox_semaphore(sandbox_id: str) -> asyncio.Semaphore:
+    semaphore = _semaphores.get(sandbox_id)
+    if semaphore is None:
+        semaphore = _semaphores[sandbox_id] = asyncio.Semaphore(max(1, SANDBOX_CONCURRENCY))
+    _semaphore_users[sandbox_id] = _semaphore_users.get(sandbox_id, 0) + 1
+    return semaphore
+
+
+def _done_with_semaphore(sandbox_id: str, semaphore: asyncio.Semaphore, acquired: bool) -> None:
+    if acquired:
+        semaphore.release()
+    users = _semaphore_users[sandbox_id] - 1
+    if users:
+        _semaphore_users[sandbox_id] = users
+    else:
+        del _semaphore_users[sandbox_id]
+        del _semaphores[sandbox_id]
+
+
+async def run_sandbox_call(
+    sandbox_id: str,
+    func: Callable[..., Any],
+    *args: Any,
+    timeout: Optional[float] = None,
+    **kwargs: Any
+) -> Any:
+    """Run a blocking SDK call for a sandbox on the executor.
+
+    Args:
+        sandbox_id: Sandbox the call is made against, for the concurrency limit.
+        func: Blocking callable, called with *args and **kwargs.
+        timeout: Seconds to wait for the result (including time queued behind
+            other calls for the same sandbox) before raising asyncio.TimeoutError.
+
+    Returns:
+        Whatever func returns; exceptions raised by func propagate.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    semaphore = _sandbox_semaphore(sandbox_id)
+
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=timeout)
+    except BaseException:
+        _done_with_semaphore(sandbox_id, semaphore, acquired=False)
+        raise
+    try:
+        future = get_executor().submit(functools.partial(func, *args, **kwargs))
+    except BaseException:
+        _done_with_semaphore(sandbox_id, semaphore, acquired=True)
+        raise
+
+    def _release(_future) -> None:
+        # The slot is held until the thread is done, even if the caller gave up
+        try:
+            loop.call_soon_threadsafe(_done_with_semaphore, sandbox_id, semaphore, True)
+        except RuntimeError:
+            # Event loop already closed
+            pass
+
+    future.add_done_callback(_release)
+
+    remaining = None if deadline is None else max(0.0, deadline - loop.time())
+    try:
+        # Cancelling the wrapper cancels the call if it has not started yet
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout=remaining)
+    except asyncio.TimeoutError:
+        logger.warning(f"Sandbox {sandbox_id} call {getattr(func, '__name__', func)} timed out after {timeout}s")
+        raise
+
+
+class AsyncSandbox:
+    """Awaitable facade over a Daytona sandbox.
+
+    Each method runs the matching SDK call through run_sandbox_call; use run()
+    for anything else, including the helpers in sandbox.sandbox.
+    """
+
+    def __init__(self, sandbox: Any):
+        self.sandbox = sandbox
+        self.sandbox_id = getattr(sandbox, "id", None) or str(id(sandbox))
+
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        return await run_sandbox_call(self.sandbox_id, func, *args, timeout=timeout, **kwargs)
+
+    # ----- fs ---------------------------------------------------------------
+
+    async def list_files(self, path: str) -> Any:
+        return await self.run(self.sandbox.fs.list_files, path)
+
+    async def download_file(self, path: str) -> Any:
+        return await self.run(self.sandbox.fs.download_file, path)
+
+    async def get_file_info(self, path: str) -> Any:
+        return await self.run(self.sandbox.fs.get_file_info, path)
+
+    async def create_folder(self, path: str, mode: Optional[str] = None) -> Any:
+        if mode is None:
+            return await self.run(self.sandbox.fs.create_folder, path)
+        return await self.run(self.sandbox.fs.create_folder, path, mode)
+
+    async def set_file_permissions(self, path: str, mode: str) -> Any:
+        return await self.run(self.sandbox.fs.set_file_permissions, path, mode)
+
+    async def delete_file(self, path: str) -> Any:
+        return await self.run(self.sandbox.fs.delete_file, path)
+
+    # ----- process ----------------------------------------------------------
+
+    async def exec(self, command: str, timeout: Optional[int] = None) -> Any:
+        if timeout is None:
+            return await self.run(self.sandbox.process.exec, command)
+        call = functools.partial(self.sandbox.process.exec, command, timeout=timeout)
+        # Give the SDK's own timeout a moment to fire before giving up locally
+        return await self.run(call, timeout=timeout + SDK_TIMEOUT_GRACE)
+
+    async def create_session(self, session_id: str) -> Any:
+        return await self.run(self.sandbox.process.create_session, session_id)
+
+    async def delete_session(self, session_id: str) -> Any:
+        return await self.run(self.sandbox.process.delete_session, session_id)
@@ -1,32 +1,139 @@
+"""
+Warm pool of pre-created Daytona sandboxes, so a run's first tool call does not
+wait for a cold start.
+
+- The pool sizes itself from the recent acquisition rate: it keeps enough idle
+  sandboxes to cover the acquisitions expected while a replacement is being
+  created, bounded by IRIS_SANDBOX_POOL_MIN and IRIS_SANDBOX_POOL_MAX
+- Sandboxes are created concurrently (IRIS_SANDBOX_POOL_CREATE_CONCURRENCY) on
+  the sandbox executor, off the event loop; a sandbox created on demand for an
+  empty pool does not wait for those slots
+- Idle sandboxes are health-checked before hand-out and periodically; dead
+  ones, and ones idle longer than IRIS_SANDBOX_POOL_MAX_IDLE seconds (before
+  the provider stops them), are deleted
+- stats() reports hits, misses and time-to-acquire
+"""
+
 import asyncio
+import functools
+import math
 import os
-from typing import Optional, Dict, Deque
+import time
 from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Set
 
 from utils.logger import logger
-from .sandbox import daytona, create_sandbox, ensure_workspace_dir_sdk
+from .executor import get_executor, run_sandbox_call
+from .sandbox import create_sandbox, ensure_workspace_dir_sdk, invalidate_sandbox_handle, _delete_sandbox_by_id, _get_sandbox_by_id, _get_state
+
+# States in which a pooled sandbox cannot be handed out
+DEAD_STATES = {
+    "stopped", "stopping", "archived", "archiving", "error", "build_failed",
+    "destroyed", "destroying", "deleted", "terminated", "shut_down",
+}
+# Assumed creation time until one has been measured
+DEFAULT_CREATE_SECONDS = 30.0
+HEALTH_CHECK_TIMEOUT = 10.0
+MAINTAIN_INTERVAL = 5.0
+
+
+@dataclass(eq=False)
+class _IdleSandbox:
+    sandbox: Any
+    idle_since: float
+    checked_at: float
+
+
+@dataclass
+class PoolMetrics:
+    hits: int = 0
+    misses: int = 0
+    created: int = 0
+    create_failures: int = 0
+    evicted: int = 0
+    # Seconds from acquire() to hand-out, most recent last
+    acquire_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=500))
+
+    def record_acquire(self, seconds: float, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.acquire_seconds.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        times = sorted(self.acquire_seconds)
+
+        def percentile(p: float) -> Optional[float]:
+            if not times:
+                return None
+            return round(times[min(len(times) - 1, int(p * len(times)))] * 1000, 1)
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "created": self.created,
+            "create_failures": self.create_failures,
+            "evicted": self.evicted,
+            "acquire_ms_p50": percentile(0.5),
+            "acquire_ms_p95": percentile(0.95),
+            "acquire_ms_max": percentile(1.0),
+        }
 
 
 class SandboxPool:
     """
-    Maintains a small pool of pre-warmed Daytona sandboxes ready for assignment.
+    Maintains an elastic pool of pre-warmed Daytona sandboxes ready for assignment.
     """
 
-    def __init__(self, target_size: int = 1):
-        self.target_size = max(0, int(target_size))
-        self._available: Deque = deque()
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 4,
+        window: float = 300.0,
+        max_idle: float = 600.0,
+        health_check_interval: float = 30.0,
+        create_concurrency: int = 2,
+    ):
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(self.min_size, int(max_size))
+        self.window = window
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.metrics = PoolMetrics()
+        self._available: Deque[_IdleSandbox] = deque()
         self._in_use: Dict[str, object] = {}
+        self._creating = 0
+        self._filling = 0
+        self._acquisitions: Deque[float] = deque()
+        self._create_seconds = DEFAULT_CREATE_SECONDS
+        self._create_semaphore = asyncio.Semaphore(max(1, int(create_concurrency)))
         self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
         self._task: Optional[asyncio.Task] = None
+        # Background fills and deletions; the event loop only keeps weak references
+        self._background: Set[asyncio.Task] = set()
+
+    @property
+    def target_size(self) -> int:
+        """Idle sandboxes to keep: acquisitions expected while one is being created."""
+        if self.max_size <= 0:
+            return 0
+        self._trim_acquisitions(time.monotonic())
+        rate = len(self._acquisitions) / self.window
+        return min(self.max_size, max(self.min_size, math.ceil(rate * self._create_seconds)))
 
     async def start(self):
-        if self.target_size <= 0:
-            logger.info("SandboxPool disabled (target_size=0)")
+        if self.max_size <= 0:
+            logger.info("SandboxPool disabled (max_size=0)")
             return
         if self._task and not self._task.done():
             return
         self._task = asyncio.create_task(self._maintainer())
-        logger.info(f"SandboxPool started (target_size={self.target_size})")
+        logger.info(f"SandboxPool started (min_size={self.min_size}, max_size={self.max_size})")
 
     async def stop(self):
         if self._task:
@@ -38,13 +145,27 @@ class SandboxPool:
             logger.info("SandboxPool stopped")
 
     async def acquire(self):
-        async with self._lock:
-            if self._available:
-                sb = self._available.popleft()
-                self._in_use[getattr(sb, 'id', str(id(sb)))] = sb
-                return sb
-        # If none available, create on demand
-        return await self._create_one()
+        started = time.monotonic()
+        self._acquisitions.append(started)
+        # Replace what is taken (and grow if demand rose) without waiting for the next tick
+        self._wake.set()
+
+        while True:
+            async with self._lock:
+                if not self._available:
+                    break
+                idle = self._available.popleft()
+            if time.monotonic() - idle.checked_at < self.health_check_interval or await self._is_healthy(idle.sandbox):
+                self._mark_in_use(idle.sandbox)
+                self.metrics.record_acquire(time.monotonic() - started, hit=True)
+                return idle.sandbox
+            self._evict(idle.sandbox, "failed health check")
+
+        # If none available, create on demand, beside (not behind) the background fills
+        sb = await self._create_one(bounded=False)
+        self._mark_in_use(sb)
+        self.metrics.record_acquire(time.monotonic() - started, hit=False)
+        return sb
 
     async def release(self, sandbox):
         sid = getattr(sandbox, 'id', None)
@@ -53,40 +174,150 @@ class SandboxPool:
                 self._in_use.pop(sid, None)
             # Return to pool if under target
             if len(self._available) < self.target_size:
-                self._available.append(sandbox)
-            else:
-                # Optionally delete extras later; keep for now
-                pass
+                now = time.monotonic()
+                self._available.append(_IdleSandbox(sandbox, idle_since=now, checked_at=0.0))
+                return
+        self._evict(sandbox, "pool is full")
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size and hit/miss and time-to-acquire metrics."""
+        return {
+            "target_size": self.target_size,
+            "available": len(self._available),
+            "in_use": len(self._in_use),
+            "creating": self._creating,
+            "create_seconds": round(self._create_seconds, 1),
+            **self.metrics.snapshot(),
+        }
+
+    def _mark_in_use(self, sandbox) -> None:
+        self._in_use[getattr(sandbox, 'id', str(id(sandbox)))] = sandbox
+
+    def _trim_acquisitions(self, now: float) -> None:
+        while self._acquisitions and now - self._acquisitions[0] > self.window:
+            self._acquisitions.popleft()
 
     async def _maintainer(self):
         try:
             while True:
+                self._wake.clear()
                 try:
+                    await self._evict_idle()
                     await self._fill_to_target()
                 except Exception as e:
                     logger.warning(f"SandboxPool maintainer error: {e}")
-                await asyncio.sleep(5)
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=MAINTAIN_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
         except asyncio.CancelledError:
             return
 
+    async def _evict_idle(self):
+        """Delete idle sandboxes that have been idle too long or are no longer running."""
+        now = time.monotonic()
+        async with self._lock:
+            idle = list(self._available)
+        stale = [i for i in idle if now - i.idle_since > self.max_idle]
+        due = [i for i in idle if i not in stale and now - i.checked_at >= self.health_check_interval]
+        healthy = await asyncio.gather(*[self._is_healthy(i.sandbox) for i in due])
+        dead = [i for i, ok in zip(due, healthy) if not ok]
+        for i, ok in zip(due, healthy):
+            if ok:
+                i.checked_at = time.monotonic()
+
+        async with self._lock:
+            for i in stale + dead:
+                # May have been handed out meanwhile
+                if i in self._available:
+                    self._available.remove(i)
+                    self._evict(i.sandbox, "idle too long" if i in stale else "failed health check")
+
     async def _fill_to_target(self):
         async with self._lock:
-            need = self.target_size - len(self._available)
+            need = self.target_size - len(self._available) - self._filling
+        # Created in the background; _filling keeps the next tick from overfilling
+        self._filling += max(0, need)
         for _ in range(max(0, need)):
-            try:
-                sb = await self._create_one()
-                async with self._lock:
-                    self._available.append(sb)
-            except Exception as e:
-                logger.warning(f"Failed to create warm sandbox: {e}")
+            self._spawn(self._add_one())
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _add_one(self):
+        try:
+            sb = await self._create_one()
+            now = time.monotonic()
+            async with self._lock:
+                self._available.append(_IdleSandbox(sb, idle_since=now, checked_at=now))
+        except Exception as e:
+            logger.warning(f"Failed to create warm sandbox: {e}")
+        finally:
+            self._filling -= 1
+
+    async def _create_one(self, bounded: bool = True):
+        """Create a sandbox; bounded creations share the create_concurrency slots."""
+        self._creating += 1
+        try:
+            if not bounded:
+                return await self._create_timed()
+            async with self._create_semaphore:
+                return await self._create_timed()
+        finally:
+            self._creating -= 1
 
-    async def _create_one(self):
+    async def _create_timed(self):
         # Minimal warm setup using same image and defaults as create_sandbox
         password = os.getenv("IRIS_WARM_POOL_PASSWORD", "warm-pass")
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        try:
+            sb = await loop.run_in_executor(get_executor(), functools.partial(self._create_sync, password))
+        except Exception:
+            self.metrics.create_failures += 1
+            raise
+        # Smoothed creation time drives how far ahead the pool fills
+        self._create_seconds = 0.7 * self._create_seconds + 0.3 * (time.monotonic() - started)
+        self.metrics.created += 1
+        return sb
+
+    @staticmethod
+    def _create_sync(password: str):
         sb = create_sandbox(password)
         ensure_workspace_dir_sdk(sb)
         return sb
 
+    async def _is_healthy(self, sandbox) -> bool:
+        sid = getattr(sandbox, 'id', None)
+        if not sid:
+            return False
+        try:
+            fresh = await run_sandbox_call(sid, _get_sandbox_by_id, sid, timeout=HEALTH_CHECK_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Health check failed for pooled sandbox {sid}: {e}")
+            return False
+        state = _get_state(fresh).rsplit(".", 1)[-1]
+        return state not in DEAD_STATES
+
+    def _evict(self, sandbox, reason: str) -> None:
+        """Delete a sandbox in the background."""
+        sid = getattr(sandbox, 'id', None)
+        self.metrics.evicted += 1
+        logger.info(f"Evicting pooled sandbox {sid}: {reason}")
+        if not sid:
+            return
+
+        async def _delete():
+            invalidate_sandbox_handle(sid)
+            try:
+                await run_sandbox_call(sid, _delete_sandbox_by_id, sid)
+            except Exception as e:
+                logger.warning(f"Failed to delete pooled sandbox {sid}: {e}")
+
+        self._spawn(_delete())
+
 
 _pool: Optional[SandboxPool] = None
 
@@ -94,7 +325,16 @@ _pool: Optional[SandboxPool] = None
 def get_pool() -> SandboxPool:
     global _pool
     if _pool is None:
-        size = int(os.getenv("IRIS_SANDBOX_POOL_SIZE", "1"))
-        _pool = SandboxPool(target_size=size)
+        # IRIS_SANDBOX_POOL_SIZE is the older name of the lower bound
+        min_size = int(os.getenv("IRIS_SANDBOX_POOL_MIN", os.getenv("IRIS_SANDBOX_POOL_SIZE", "1")))
+        # A lower bound of 0 keeps the pool disabled unless a maximum is set
+        max_size = int(os.getenv("IRIS_SANDBOX_POOL_MAX", str(max(min_size, 4)) if min_size > 0 else "0"))
+        _pool = SandboxPool(
+            min_size=min_size,
+            max_size=max_size,
+            window=float(os.getenv("IRIS_SANDBOX_POOL_WINDOW", "300")),
+            max_idle=float(os.getenv("IRIS_SANDBOX_POOL_MAX_IDLE", "600")),
+            health_check_interval=float(os.getenv("IRIS_SANDBOX_POOL_HEALTH_INTERVAL", "30")),
+            create_concurrency=int(os.getenv("IRIS_SANDBOX_POOL_CREATE_CONCURRENCY", "2")),
+        )
     return _pool
-
@@ -1,12 +1,18 @@
+import asyncio
 import os
+import time
+from collections import OrderedDict
 from typing import Any, Optional, List, Tuple, Dict
 from datetime import datetime
 
+import httpx
+
 # Import the real Daytona client
 from .daytona_client import Daytona, DaytonaConfig, CreateSandboxBaseParams, Sandbox
 from dotenv import load_dotenv
 
 from agentpress.tool import Tool
+from .executor import AsyncSandbox, run_sandbox_call
 from utils.logger import logger
 from utils.files_utils import clean_path
 
@@ -53,6 +59,12 @@ WORKSPACE_REL = "workspace"
 _preview_cache: Dict[tuple, str] = {}
 _PREVIEW_TTL = 30  # seconds
 
+# Sandbox handles from get_or_start_sandbox, reused until their state is re-checked
+SANDBOX_HANDLE_TTL = float(os.getenv("IRIS_SANDBOX_HANDLE_TTL", "15"))
+SANDBOX_HANDLE_CACHE_SIZE = int(os.getenv("IRIS_SANDBOX_HANDLE_CACHE_SIZE", "256"))
+_handles: "OrderedDict[str, Tuple[Sandbox, float]]" = OrderedDict()
+_handle_lookups: Dict[str, asyncio.Future] = {}
+
 # ----- FS helpers (handle SDK signature drift + safe fallbacks) --------------
 
 
@@ -297,11 +309,117 @@ def ensure_workspace_dir_sdk(sandbox: Sandbox) -> None:
 # ----- Public API --------------------------------------------------------------
 
 
-async def get_or_start_sandbox(sandbox_id: str) -> Sandbox:
+async def get_or_start_sandbox(sandbox_id: str, refresh: bool = False) -> Sandbox:
     """
     Retrieve a sandbox by ID, and start it if needed.
-    Always ensures ~/workspace is ready (SDK way).
+    Ensures ~/workspace is ready (SDK way) when the sandbox is first seen or started.
+    The SDK calls run on the sandbox executor, off the event loop.
+
+    Handles are cached per process: within IRIS_SANDBOX_HANDLE_TTL seconds the
+    cached handle is returned as is (unless refresh is set), after that its
+    state is re-checked. Concurrent calls for the same sandbox share one lookup.
+    """
+    cached = _handles.get(sandbox_id)
+    if cached is not None and not refresh and time.monotonic() - cached[1] < SANDBOX_HANDLE_TTL:
+        _handles.move_to_end(sandbox_id)
+        return cached[0]
+
+    lookup = _handle_lookups.get(sandbox_id)
+    if lookup is None:
+        previous = cached[0] if cached is not None else None
+        lookup = asyncio.ensure_future(_lookup_sandbox(sandbox_id, previous))
+        _handle_lookups[sandbox_id] = lookup
+        lookup.add_done_callback(lambda _: _forget_lookup(sandbox_id, lookup))
+    # A cancelled caller must not cancel the lookup others are waiting on
+    return await asyncio.shield(lookup)
+
+
+async def _lookup_sandbox(sandbox_id: str, previous: Optional[Sandbox]) -> Sandbox:
+    if previous is not None:
+        sandbox = await run_sandbox_call(sandbox_id, _refresh_sandbox_sync, sandbox_id)
+    else:
+        sandbox = await run_sandbox_call(sandbox_id, _get_or_start_sandbox_sync, sandbox_id)
+    # Invalidated while the lookup ran: the result may already be stale
+    if _handle_lookups.get(sandbox_id) is not asyncio.current_task():
+        return sandbox
+    _handles[sandbox_id] = (sandbox, time.monotonic())
+    _handles.move_to_end(sandbox_id)
+    while len(_handles) > max(1, SANDBOX_HANDLE_CACHE_SIZE):
+        _handles.popitem(last=False)
+    return sandbox
+
+
+def _forget_lookup(sandbox_id: str, lookup: asyncio.Future) -> None:
+    if _handle_lookups.get(sandbox_id) is lookup:
+        del _handle_lookups[sandbox_id]
+
+
+async def get_preview_url(sandbox: Sandbox, port: int) -> str:
+    """Preview URL of a sandbox port, cached for _PREVIEW_TTL seconds; "" if unavailable."""
+    key = (sandbox.id, port)
+    ts_key = (sandbox.id, port, 'ts')
+    now = time.time()
+    if now - _preview_cache.get(ts_key, 0) < _PREVIEW_TTL and key in _preview_cache:
+        return _preview_cache[key]
+    try:
+        link = await run_sandbox_call(sandbox.id, sandbox.get_preview_link, port)
+        # Some SDK variants return a coroutine
+        if asyncio.iscoroutine(link):
+            link = await link
+    except Exception:
+        return ""
+    url = getattr(link, "url", str(link))
+    _preview_cache[key] = url
+    _preview_cache[ts_key] = now
+    return url
+
+
+# Daytona SDK errors (by class name, across SDK versions) and HTTP statuses meaning
+# the sandbox itself could not be reached, and messages of a sandbox that is not running
+_UNAVAILABLE_ERROR_NAMES = {"DaytonaConnectionError", "DaytonaSpotEvictedError", "DaytonaQueueTimeoutError"}
+_UNAVAILABLE_STATUS_CODES = {502, 503, 504}
+_UNAVAILABLE_MESSAGES = ("not running", "not started", "is stopped", "archived", "destroyed", "no ip address")
+
+
+def is_sandbox_unavailable_error(error: BaseException) -> bool:
+    """Whether a failed call means the sandbox is stopped, gone or unreachable.
+
+    Only then is a cached handle stale; errors about the request itself, such
+    as a missing file or a bad path, leave it alone.
     """
+    if isinstance(error, (FileNotFoundError, IsADirectoryError, NotADirectoryError, PermissionError, ValueError)):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if any(cls.__name__ in _UNAVAILABLE_ERROR_NAMES for cls in type(error).__mro__):
+        return True
+    if getattr(error, "status_code", None) in _UNAVAILABLE_STATUS_CODES:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in _UNAVAILABLE_MESSAGES) or (
+        "sandbox" in message and "not found" in message
+    )
+
+
+def invalidate_sandbox_handle(sandbox_id: str) -> None:
+    """Forget a cached handle, e.g. after the sandbox was stopped or deleted or a call on it failed.
+
+    Must be called from the event loop. A lookup still in flight is detached
+    so its result is not cached and later calls start a new one.
+    """
+    _handles.pop(sandbox_id, None)
+    _handle_lookups.pop(sandbox_id, None)
+
+
+def _refresh_sandbox_sync(sandbox_id: str) -> Sandbox:
+    """Re-check a known sandbox; only goes through the full start path if it is not running."""
+    sandbox = _get_sandbox_by_id(sandbox_id)
+    if _get_state(sandbox).rsplit(".", 1)[-1] in {"started", "running"}:
+        return sandbox
+    return _get_or_start_sandbox_sync(sandbox_id)
+
+
+def _get_or_start_sandbox_sync(sandbox_id: str) -> Sandbox:
     logger.info(f"Getting or starting sandbox with ID: {sandbox_id}")
 
     # Enforce real Daytona if configured
@@ -473,6 +591,10 @@ class SandboxToolsBase(Tool):
     _workspace_ensured: set = set()  # Track sandboxes already ensured
 
     def __init__(self, sandbox: Sandbox):
+        """Wrap a sandbox handle, e.g. from get_or_start_sandbox; makes no SDK calls.
+
+        Await SandboxToolsBase.prepare(sandbox) once before using the tools.
+        """
         super().__init__()
         self.sandbox = sandbox
         self.daytona = daytona
@@ -480,49 +602,21 @@ class SandboxToolsBase(Tool):
         self.workspace_abs_for_shell = '$HOME/workspace'
         self.sandbox_id = sandbox.id
 
-        try:
-            logger.debug(f"Refreshing sandbox by ID: {self.sandbox_id}")
-            self.sandbox = _get_sandbox_by_id(self.sandbox_id)
-        except Exception as e:
-            logger.error(f"Error retrieving sandbox: {e}", exc_info=True)
-            raise
+        # Awaitable SDK calls; tools must not call self.sandbox.fs/process from coroutines
+        self.async_sandbox = AsyncSandbox(self.sandbox)
 
-        # Make sure ~/workspace exists only once per sandbox
-        try:
-            if self.sandbox_id not in SandboxToolsBase._workspace_ensured:
-                ensure_workspace_dir_sdk(self.sandbox)
-                SandboxToolsBase._workspace_ensured.add(self.sandbox_id)
-        except Exception:
-            pass
+    @classmethod
+    async def prepare(cls, sandbox: Sandbox) -> None:
+        """Make sure ~/workspace exists, once per sandbox, and log the preview URLs.
 
-        # Preview links (tolerate async/sync variants)
-        def _preview(port: int) -> str:
-            try:
-                import time
-                key = (self.sandbox_id, port)
-                ts_key = (self.sandbox_id, port, 'ts')
-                now = time.time()
-                ts = _preview_cache.get(ts_key, 0)
-                if now - ts < _PREVIEW_TTL and key in _preview_cache:
-                    return _preview_cache[key]
-                link = self.sandbox.get_preview_link(port)
-                import asyncio as _a
-                if _a.iscoroutine(link):
-                    loop = _a.new_event_loop()
-                    _a.set_event_loop(loop)
-                    try:
-                        link = loop.run_until_complete(self.sandbox.get_preview_link(port))
-                    finally:
-                        loop.close()
-                url = getattr(link, "url", str(link))
-                _preview_cache[key] = url
-                _preview_cache[ts_key] = now
-                return url
-            except Exception:
-                return ""
+        The SDK calls run on the sandbox executor.
+        """
+        if sandbox.id not in SandboxToolsBase._workspace_ensured:
+            await run_sandbox_call(sandbox.id, ensure_workspace_dir_sdk, sandbox)
+            SandboxToolsBase._workspace_ensured.add(sandbox.id)
 
-        vnc_url = _preview(6080)
-        site_url = _preview(8080)
+        vnc_url = await get_preview_url(sandbox, 6080)
+        site_url = await get_preview_url(sandbox, 8080)
 
         logger.info(f"Sandbox VNC URL: {vnc_url}")
         logger.info(f"Sandbox Website URL: {site_url}")
@@ -0,0 +1,339 @@
+"""
+Small Python helpers executed inside the sandbox through the process API.
+
+Work that would otherwise move whole files between the sandbox and this
+process (hashing the workspace, packing archives, editing a file) runs next
+to the data instead; only a compact JSON result comes back. Scripts use the
+standard library only and are passed base64-encoded, so no quoting of their
+source is needed.
+"""
+
+import base64
+import json
+import shlex
+from typing import Any
+
+from .executor import AsyncSandbox
+
+
+class SandboxScriptError(Exception):
+    """A helper script failed or printed something other than JSON."""
+
+
+def python_command(script: str, *args: str) -> str:
+    """Build a command line running script with python3 and the given arguments."""
+    encoded = base64.b64encode(script.encode()).decode("ascii")
+    quoted = " ".join(shlex.quote(str(arg)) for arg in args)
+    return f"python3 -c \"import base64; exec(base64.b64decode('{encoded}'))\" {quoted}".rstrip()
+
+
+async def run_script(sandbox: AsyncSandbox, script: str, *args: str, timeout: int = 120) -> Any:
+    """Run a helper script in the sandbox and return its JSON output."""
+    response = await sandbox.exec(python_command(script, *args), timeout=timeout)
+    output = getattr(response, "result", "") or ""
+    if getattr(response, "exit_code", 0) != 0:
+        raise SandboxScriptError(f"Sandbox script failed with exit code {response.exit_code}: {output[-2000:]}")
+    try:
+        return json.loads(output)
+    except ValueError as e:
+        raise SandboxScriptError(f"Sandbox script returned invalid JSON: {output[:500]} {e}")
+
+
+# Lists the files under a directory as [path, size, mtime, sha256] rows.
+# argv: root (relative to $HOME), JSON list of directory names to skip.
+# Hashes are cached under ~/.cache/iris by size and mtime, so unchanged
+# files are not read again on the next call.
+MANIFEST_SCRIPT = r'''
+import hashlib, json, os, stat, sys
+
+root = os.path.join(os.path.expanduser("~"), sys.argv[1])
+excluded_dirs = set(json.loads(sys.argv[2]))
+cache_dir = os.path.expanduser("~/.cache/iris")
+cache_path = os.path.join(cache_dir, "manifest-" + hashlib.sha1(root.encode()).hexdigest() + ".json")
+try:
+    with open(cache_path) as f:
+        cache = json.load(f)
+except Exception:
+    cache = {}
+
+entries, new_cache = [], {}
+for dirpath, dirnames, filenames in os.walk(root):
+    dirnames[:] = [d for d in dirnames if d not in excluded_dirs]
+    for name in filenames:
+        path = os.path.join(dirpath, name)
+        rel = os.path.relpath(path, root)
+        try:
+            st = os.lstat(path)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            key = [st.st_size, st.st_mtime_ns]
+            cached = cache.get(rel)
+            if cached and cached[:2] == key:
+                digest = cached[2]
+            else:
+                h = hashlib.sha256()
+                with open(path, "rb") as f:
+                    for chunk in iter(lambda: f.read(1 << 20), b""):
+                        h.update(chunk)
+                digest = h.hexdigest()
+        except OSError:
+            continue
+        new_cache[rel] = key + [digest]
+        entries.append([rel, st.st_size, st.st_mtime, digest])
+
+try:
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_path + ".tmp", "w") as f:
+        json.dump(new_cache, f)
+    os.replace(cache_path + ".tmp", cache_path)
+except OSError:
+    pass
+print(json.dumps(entries))
+'''
+
+
+# Extracts a tar archive (plain, gzip, or zstd via the zstd CLI) under a directory,
+# then deletes the archive. argv: archive path and destination, both relative to $HOME.
+# Only regular files and directories inside the destination are accepted; each file
+# is written to a temporary name and renamed into place.
+EXTRACT_SCRIPT = r'''
+import json, os, shutil, subprocess, sys, tarfile
+
+home = os.path.expanduser("~")
+archive = os.path.join(home, sys.argv[1])
+dest = os.path.realpath(os.path.join(home, sys.argv[2]))
+written, proc = [], None
+try:
+    if archive.endswith(".zst"):
+        proc = subprocess.Popen(["zstd", "-dcq", archive], stdout=subprocess.PIPE)
+        tar = tarfile.open(fileobj=proc.stdout, mode="r|")
+    else:
+        tar = tarfile.open(archive, mode="r|*")
+    with tar:
+        for member in tar:
+            target = os.path.realpath(os.path.join(dest, member.name))
+            if target != dest and not target.startswith(dest + os.sep):
+                raise ValueError("path outside destination: " + member.name)
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not member.isfile():
+                raise ValueError("unsupported archive member: " + member.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = target + ".iris-tmp"
+            with open(tmp, "wb") as f:
+                shutil.copyfileobj(tar.extractfile(member), f)
+            os.chmod(tmp, (member.mode & 0o777) or 0o644)
+            os.replace(tmp, target)
+            written.append(os.path.relpath(target, home))
+except Exception as e:
+    print(json.dumps({"error": str(e), "files": written}))
+    sys.exit(1)
+finally:
+    if proc is not None:
+        proc.wait()
+    os.remove(archive)
+print(json.dumps({"files": written}))
+'''
+
+# Packs a directory into a tar archive (gzip or zstd by the output name's suffix).
+# argv: directory and output path, both relative to $HOME, and a JSON list of
+# directory names to skip. Members are named relative to the directory's parent.
+PACK_SCRIPT = r'''
+import json, os, stat, subprocess, sys, tarfile
+
+home = os.path.expanduser("~")
+root = os.path.realpath(os.path.join(home, sys.argv[1]))
+out = os.path.join(home, sys.argv[2])
+excluded_dirs = set(json.loads(sys.argv[3]))
+base = os.path.dirname(root)
+count, proc = 0, None
+if out.endswith(".zst"):
+    proc = subprocess.Popen(["zstd", "-q", "-T0", "-o", out], stdin=subprocess.PIPE)
+    tar = tarfile.open(fileobj=proc.stdin, mode="w|")
+else:
+    tar = tarfile.open(out, mode="w:gz", compresslevel=6)
+with tar:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in excluded_dirs)
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            try:
+                if not stat.S_ISREG(os.lstat(path).st_mode):
+                    continue
+                tar.add(path, arcname=os.path.relpath(path, base), recursive=False)
+                count += 1
+            except OSError:
+                continue
+if proc is not None:
+    proc.stdin.close()
+    if proc.wait() != 0:
+        sys.exit(1)
+print(json.dumps({"path": sys.argv[2], "size": os.path.getsize(out), "files": count}))
+'''
+
+# Edits a text file in place and prints a short unified diff of the change.
+# argv: file path relative to $HOME, then the edit as JSON, or "@<path>" naming a
+# JSON file relative to $HOME (removed after reading) for edits too large for argv.
+# Edits: {"op": "replace", "old_str", "new_str"}, {"op": "patch", "patch"} (unified
+# diff hunks, located by context near their line numbers), or {"op": "lines",
+# "start_line", "end_line", "new_content"} (1-based, inclusive). Problems with the
+# edit itself are reported as {"error": ...} and leave the file untouched.
+EDIT_SCRIPT = r'''
+import difflib, json, os, re, sys
+
+home = os.path.expanduser("~")
+path = os.path.join(home, sys.argv[1])
+spec = sys.argv[2]
+if spec.startswith("@"):
+    spec_path = os.path.join(home, spec[1:])
+    with open(spec_path) as f:
+        spec = f.read()
+    os.remove(spec_path)
+edit = json.loads(spec)
+max_diff_lines = int(edit.get("max_diff_lines", 60))
+
+class EditError(Exception):
+    pass
+
+def replace(text):
+    old, new = edit["old_str"].expandtabs(), edit["new_str"].expandtabs()
+    count = text.count(old) if old else 0
+    if count == 0:
+        raise EditError("String not found")
+    if count > 1:
+        raise EditError("Multiple occurrences found; ensure uniqueness")
+    return text.replace(old, new)
+
+def lines(text):
+    rows = text.splitlines(True)
+    start, end = int(edit["start_line"]), int(edit["end_line"])
+    if start < 1 or start > len(rows) + 1 or end < start - 1 or end > len(rows):
+        raise EditError("Line range %d-%d is outside the file (%d lines)" % (start, end, len(rows)))
+    new = edit["new_content"]
+    if new and not new.endswith("\n") and end < len(rows):
+        new += "\n"
+    return "".join(rows[:start - 1]) + new + "".join(rows[end:])
+
+HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+def patch(text):
+    rows = text.splitlines(True)
+    hunks, current = [], None
+    for line in edit["patch"].splitlines():
+        match = HUNK.match(line)
+        if match:
+            current = {"start": int(match.group(1)), "old": [], "new": []}
+            hunks.append(current)
+        elif current is None or line.startswith(("--- ", "+++ ", "\\")):
+            continue
+        elif line.startswith("-"):
+            current["old"].append(line[1:])
+        elif line.startswith("+"):
+            current["new"].append(line[1:])
+        else:
+            context = line[1:] if line.startswith(" ") else line
+            current["old"].append(context)
+            current["new"].append(context)
+    if not hunks:
+        raise EditError("Patch contains no hunks")
+    keys = [row.rstrip("\r\n") for row in rows]
+    eol = "\r\n" if rows and rows[0].endswith("\r\n") else "\n"
+    offset, position = 0, 0
+    for number, hunk in enumerate(hunks, 1):
+        old, size = hunk["old"], len(hunk["old"])
+        # A hunk without old lines inserts after line "start" rather than at it
+        base = hunk["start"] - 1 if old else hunk["start"]
+        expected = max(base + offset, position)
+        found = None
+        for distance in range(0, len(keys) + 1):
+            for candidate in (expected - distance, expected + distance):
+                if position <= candidate <= len(keys) - size and keys[candidate:candidate + size] == old:
+                    found = candidate
+                    break
+            if found is not None:
+                break
+        if found is None:
+            raise EditError("Hunk %d does not match the file" % number)
+        new_rows = [row + eol for row in hunk["new"]]
+        if found + size == len(rows) and rows and not rows[-1].endswith("\n") and new_rows:
+            new_rows[-1] = new_rows[-1][:-len(eol)]
+        rows[found:found + size] = new_rows
+        keys[found:found + size] = hunk["new"]
+        offset += len(hunk["new"]) - size + found - expected
+        position = found + len(hunk["new"])
+    return "".join(rows)
+
+try:
+    with open(path, "rb") as f:
+        before = f.read().decode("utf-8", "surrogateescape")
+except FileNotFoundError:
+    print(json.dumps({"error": "File '%s' does not exist" % sys.argv[1]}))
+    sys.exit(0)
+try:
+    after = {"replace": replace, "lines": lines, "patch": patch}[edit["op"]](before)
+except EditError as e:
+    print(json.dumps({"error": str(e)}))
+    sys.exit(0)
+
+if after != before:
+    tmp = path + ".iris-tmp"
+    with open(tmp, "wb") as f:
+        f.write(after.encode("utf-8", "surrogateescape"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.chmod(tmp, os.stat(path).st_mode & 0o7777)
+    os.replace(tmp, path)
+
+diff = list(difflib.unified_diff(
+    before.splitlines(), after.splitlines(), sys.argv[1], sys.argv[1], n=2, lineterm=""))
+truncated = len(diff) > max_diff_lines
+diff = "\n".join(diff[:max_diff_lines]).encode("utf-8", "surrogateescape").decode("utf-8", "replace")
+print(json.dumps({"diff": diff, "truncated": truncated, "lines": len(after.splitlines())}))
+'''
+
+# Reads a command's log file from a byte offset. argv: log path relative to $HOME,
+# offset (negative: start that many bytes before the end), maximum bytes to return,
+# and "head" or "tail": which end of a longer range to return.
+# The exit code is read from "<log>.exit", written when the command finishes.
+TAIL_SCRIPT = r'''
+import json, os, sys
+
+path = os.path.join(os.path.expanduser("~"), sys.argv[1])
+offset, limit, mode = int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+# Exit code first: once it exists, the log is complete
+try:
+    with open(path + ".exit") as f:
+        exit_code = int(f.read().strip() or 0)
+except (OSError, ValueError):
+    exit_code = None
+try:
+    size = os.path.getsize(path)
+except OSError:
+    size = 0
+start = max(0, size + offset) if offset < 0 else min(offset, size)
+if mode == "tail":
+    start, end = max(start, size - limit), size
+else:
+    end = min(size, start + limit)
+data = b""
+if end > start:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+print(json.dumps({"offset": start, "next_offset": end, "size": size,
+                  "output": data.decode("utf-8", "replace"), "exit_code": exit_code}))
+'''
+
+# Reads a byte range of a file, base64-encoded. argv: path relative to $HOME,
+# offset and maximum number of bytes.
+READ_RANGE_SCRIPT = r'''
+import base64, json, os, sys
+
+path = os.path.join(os.path.expanduser("~"), sys.argv[1])
+offset, limit = int(sys.argv[2]), int(sys.argv[3])
+with open(path, "rb") as f:
+    f.seek(offset)
+    data = f.read(limit)
+print(json.dumps({"data": base64.b64encode(data).decode("ascii")}))
+'''
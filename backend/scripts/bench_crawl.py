@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark crawl_webpage against a local stand-in for the Tavily extract endpoint.
+
+Compares the old pattern (a new HTTP client, and so a new connection, per page,
+pages fetched one after another) with the shared pooled client crawling several
+pages per call. The stub answers after a fixed latency to model the extract API.
+
+Usage (from the backend directory):
+    python scripts/bench_crawl.py [--pages 60] [--per-call 6] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from agent.tools import web_search_tool  # noqa: E402
+from agent.tools.web_search_tool import WebSearchTool, close_crawl_client  # noqa: E402
+
+
+def make_handler(latency: float, page_bytes: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            url = json.loads(self.rfile.read(length))["urls"]
+            time.sleep(latency)
+            data = json.dumps({"results": [{"url": url, "title": url, "raw_content": "x" * page_bytes}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+async def crawl_unpooled(endpoint: str, urls):
+    """One client per page, sequentially, as crawl_webpage used to do."""
+    for url in urls:
+        async with httpx.AsyncClient(timeout=60) as client:
+            response = await client.post(endpoint, json={"urls": url, "include_images": False, "extract_depth": "basic"})
+            response.raise_for_status()
+            response.json()
+
+
+async def crawl_pooled(tool: WebSearchTool, urls, per_call: int):
+    """Shared client, several pages per crawl_webpage call."""
+    for i in range(0, len(urls), per_call):
+        result = await tool.crawl_webpage(",".join(urls[i:i + per_call]))
+        if not result.success:
+            raise RuntimeError(result.output)
+
+
+async def main(args):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency, args.page_bytes))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_port}/extract"
+    web_search_tool.TAVILY_EXTRACT_URL = endpoint
+    tool = WebSearchTool(api_key="bench")
+    urls = [f"https://example.com/page/{i}" for i in range(args.pages)]
+
+    try:
+        start = time.perf_counter()
+        await crawl_unpooled(endpoint, urls)
+        unpooled = args.pages / (time.perf_counter() - start)
+
+        # Distinct URLs per run so the tool result cache does not answer
+        urls = [url + "?pooled" for url in urls]
+        start = time.perf_counter()
+        await crawl_pooled(tool, urls, args.per_call)
+        pooled = args.pages / (time.perf_counter() - start)
+    finally:
+        await close_crawl_client()
+        server.shutdown()
+
+    print(f"pages={args.pages} per_call={args.per_call} latency={args.latency}s concurrency={web_search_tool.CRAWL_CONCURRENCY}")
+    print(f"client per page, serial : {unpooled:8.1f} crawls/sec")
+    print(f"pooled client, parallel : {pooled:8.1f} crawls/sec ({pooled / unpooled:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--per-call", type=int, default=6, help="URLs passed to one crawl_webpage call")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stub waits before answering")
+    parser.add_argument("--page-bytes", type=int, default=20_000)
+    asyncio.run(main(parser.parse_args()))
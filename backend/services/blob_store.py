@@ -0,0 +1,187 @@
+"""
+Content-addressed blob storage for large binary payloads such as browser
+screenshots.
+
+Blobs are keyed by the SHA-256 of their bytes, so writing the same screenshot
+twice stores it once, and a reference never goes stale. Messages hold only a
+small reference (see screenshot_ref) instead of the base64 payload.
+
+Backends, selected with IRIS_BLOB_STORE:
+- "supabase" (default): the private Supabase Storage bucket IRIS_BLOB_BUCKET
+- "local": files under IRIS_BLOB_STORE_PATH, for development and tests
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import struct
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.logger import logger
+
+BLOB_STORE_BACKEND = os.getenv("IRIS_BLOB_STORE", "supabase").lower()
+BLOB_BUCKET = os.getenv("IRIS_BLOB_BUCKET", "screenshots")
+BLOB_STORE_PATH = os.getenv("IRIS_BLOB_STORE_PATH", os.path.join("logs", "blobs"))
+# Keys known to be stored already, so repeated frames skip the upload
+KNOWN_KEYS_CACHE_SIZE = 4096
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def blob_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_blob_key(key: Any) -> bool:
+    return isinstance(key, str) and bool(_SHA256_RE.match(key))
+
+
+def blob_path(key: str) -> str:
+    """Storage path of a blob, fanned out by the first two hex digits."""
+    return f"sha256/{key[:2]}/{key}"
+
+
+def image_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    """Return (width, height) of a PNG or JPEG image from its header, if recognised."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    # Walk JPEG segments up to the start-of-frame marker
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+class BlobStore(ABC):
+    """Base class for content-addressed blob backends."""
+
+    def __init__(self):
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        """Store bytes and return their key; a no-op if the blob already exists."""
+        key = blob_key(data)
+        if key in self._known:
+            self._known.move_to_end(key)
+            return key
+        await self._write(key, data, content_type)
+        self._known[key] = None
+        if len(self._known) > KNOWN_KEYS_CACHE_SIZE:
+            self._known.popitem(last=False)
+        return key
+
+    async def get(self, key: str) -> bytes:
+        """Return the bytes stored under key.
+
+        Raises:
+            KeyError: If the key is invalid or no such blob exists.
+        """
+        if not is_blob_key(key):
+            raise KeyError(key)
+        return await self._read(key)
+
+    @abstractmethod
+    async def _write(self, key: str, data: bytes, content_type: str) -> None:
+        """Store data under key."""
+
+    @abstractmethod
+    async def _read(self, key: str) -> bytes:
+        """Return the bytes under key, raising KeyError if there are none."""
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs stored as files on local disk."""
+
+    def __init__(self, root: str = BLOB_STORE_PATH):
+        super().__init__()
+        self.root = root
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.root, *blob_path(key).split("/"))
+
+    async def _write(self, key: str, data: bytes, content_type: str) -> None:
+        await asyncio.to_thread(self._write_sync, self._file(key), data)
+
+    @staticmethod
+    def _write_sync(path: str, data: bytes) -> None:
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _read(self, key: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self._read_sync, self._file(key))
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    @staticmethod
+    def _read_sync(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+
+class SupabaseBlobStore(BlobStore):
+    """Blobs stored in a private Supabase Storage bucket."""
+
+    def __init__(self, bucket: str = BLOB_BUCKET, db=None):
+        super().__init__()
+        self.bucket = bucket
+        self._db = db
+
+    async def _bucket(self):
+        if self._db is None:
+            from services.supabase import DBConnection
+            self._db = DBConnection()
+        client = await self._db.get_client()
+        return client.storage.from_(self.bucket)
+
+    async def _write(self, key: str, data: bytes, content_type: str) -> None:
+        bucket = await self._bucket()
+        await bucket.upload(blob_path(key), data, {"content-type": content_type, "upsert": "true"})
+
+    async def _read(self, key: str) -> bytes:
+        bucket = await self._bucket()
+        try:
+            return await bucket.download(blob_path(key))
+        except Exception as e:
+            logger.debug(f"Blob {key} not found in bucket {self.bucket}: {str(e)}")
+            raise KeyError(key)
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store for the configured backend."""
+    global _store
+    if _store is None:
+        _store = LocalBlobStore() if BLOB_STORE_BACKEND == "local" else SupabaseBlobStore()
+    return _store
+
+
+def screenshot_ref(key: str, data: bytes, content_type: str) -> Dict[str, Any]:
+    """Build the reference stored in messages in place of a screenshot."""
+    ref: Dict[str, Any] = {"sha256": key, "content_type": content_type, "size": len(data)}
+    dimensions = image_dimensions(data)
+    if dimensions:
+        ref["width"], ref["height"] = dimensions
+    return ref
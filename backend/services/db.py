@@ -1,6 +1,14 @@
+import asyncio
 import os
-from typing import Union, Optional
+import time
+from collections import OrderedDict
+from typing import Dict, Union, Optional, Tuple
+
+import httpx
+import jwt
+from jwt.exceptions import PyJWTError
 from supabase import create_async_client, AsyncClient
+from supabase.lib.client_options import AsyncClientOptions
 from utils.logger import logger
 
 SUPABASE_URL = os.environ["SUPABASE_URL"]
@@ -8,28 +16,144 @@ ANON_KEY = os.environ["SUPABASE_ANON_KEY"]
 SERVICE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ["SUPABASE_SERVICE_KEY"]
 DB_SCHEMA = os.environ.get("SUPABASE_DB_SCHEMA", "public")
 
-# Cache clients for performance
-_user_clients: dict[str, AsyncClient] = {}
+# Per-token clients kept at once; the least recently used is dropped beyond this
+USER_CLIENT_CACHE_SIZE = int(os.getenv("IRIS_SUPABASE_USER_CLIENTS", "256"))
+# Lifetime of a user client whose token carries no exp claim
+USER_CLIENT_TTL = float(os.getenv("IRIS_SUPABASE_USER_CLIENT_TTL", "3600"))
+# Connections in the HTTP pool shared by all user clients
+USER_CLIENT_POOL_CONNECTIONS = int(os.getenv("IRIS_SUPABASE_POOL_CONNECTIONS", "100"))
+# Without a shared pool, evicted clients are closed only after requests that
+# may still be using them have had time to finish (the PostgREST timeout)
+USER_CLIENT_CLOSE_DELAY = 120
+
+# Cache clients for performance: token (or "anon") -> (expires_at, client)
+_user_clients: "OrderedDict[str, Tuple[float, AsyncClient]]" = OrderedDict()
 _admin_client: Optional[AsyncClient] = None
+_shared_http_client: Optional[httpx.AsyncClient] = None
+# Delayed closes of dropped clients -> the client being closed
+_pending_closes: Dict[asyncio.Task, AsyncClient] = {}
+
+
+def _shared_pool_supported() -> bool:
+    # ClientOptions.httpx_client arrived in supabase 2.16
+    return "httpx_client" in getattr(AsyncClientOptions, "__dataclass_fields__", {})
+
+
+def _token_expiry(token: str) -> float:
+    """When to drop the client of a user token: its exp claim."""
+    try:
+        # Only read the claim; the token is verified by PostgREST on every request
+        payload = jwt.decode(token, options={"verify_signature": False})
+    except PyJWTError:
+        payload = {}
+    exp = payload.get("exp")
+    return float(exp) if isinstance(exp, (int, float)) else time.time() + USER_CLIENT_TTL
+
+
+def _get_shared_http_client() -> httpx.AsyncClient:
+    """HTTP client whose connection pool all user clients share.
+
+    The SDK sends the full URL and the calling client's headers, including its
+    Authorization, with every request, so nothing user-specific lives here.
+    """
+    global _shared_http_client
+    if _shared_http_client is None or _shared_http_client.is_closed:
+        _shared_http_client = httpx.AsyncClient(
+            timeout=USER_CLIENT_CLOSE_DELAY,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(max_connections=USER_CLIENT_POOL_CONNECTIONS),
+        )
+    return _shared_http_client
+
+
+async def _create_user_client(token: Optional[str]) -> AsyncClient:
+    if _shared_pool_supported():
+        options = AsyncClientOptions(httpx_client=_get_shared_http_client())
+        sb = await create_async_client(SUPABASE_URL, ANON_KEY, options)
+    else:
+        sb = await create_async_client(SUPABASE_URL, ANON_KEY)
+    # Set schema directly after client creation - this is mandatory
+    # We need to explicitly set the schema for the client
+    if token:
+        sb.postgrest.auth(token)
+    if hasattr(sb.postgrest, 'headers'):
+        sb.postgrest.headers["apikey"] = ANON_KEY
+    # Note: postgrest schema setting is handled by the SUPABASE_DB_SCHEMA environment variable
+    # We don't need to explicitly set it here as the client respects the environment variable
+    return sb
+
+
+async def _close_user_client(sb: AsyncClient) -> None:
+    try:
+        await sb.postgrest.aclose()
+        await sb.auth.close()
+    except Exception as e:
+        logger.warning(f"Failed to close Supabase user client: {e}")
+
+
+def _release_user_client(sb: AsyncClient) -> None:
+    """Let go of a dropped client without cutting off requests still using it."""
+    if _shared_pool_supported():
+        # Its connections belong to the shared pool
+        return
+
+    async def _close_later():
+        await asyncio.sleep(USER_CLIENT_CLOSE_DELAY)
+        await _close_user_client(sb)
+
+    task = asyncio.create_task(_close_later())
+    _pending_closes[task] = sb
+    task.add_done_callback(lambda done: _pending_closes.pop(done, None))
+
 
 async def client_for_user(token: Optional[str] = None) -> AsyncClient:
-    """Get user client with proper schema configuration"""
-    # Use token as cache key, or "anon" for anonymous access
+    """Get user client with proper schema configuration
+
+    Clients are cached per token until its exp, in an LRU of
+    IRIS_SUPABASE_USER_CLIENTS entries, and share one HTTP connection pool
+    when the installed SDK supports it.
+    """
     cache_key = token or "anon"
+    now = time.time()
+    entry = _user_clients.get(cache_key)
+    if entry is not None:
+        expires_at, sb = entry
+        if expires_at > now:
+            _user_clients.move_to_end(cache_key)
+            return sb
+        del _user_clients[cache_key]
+        _release_user_client(sb)
+
+    # Drop expired clients, then the least recently used to make room
+    for key in [k for k, (expiry, _) in _user_clients.items() if expiry <= now]:
+        _release_user_client(_user_clients.pop(key)[1])
+    while len(_user_clients) >= max(1, USER_CLIENT_CACHE_SIZE):
+        _release_user_client(_user_clients.popitem(last=False)[1][1])
+
+    sb = await _create_user_client(token)
+    if cache_key in _user_clients:
+        # A concurrent call created this token's client first
+        _release_user_client(sb)
+        _user_clients.move_to_end(cache_key)
+        return _user_clients[cache_key][1]
+    _user_clients[cache_key] = (_token_expiry(token) if token else float("inf"), sb)
+    return sb
 
-    if cache_key not in _user_clients:
-        sb = await create_async_client(SUPABASE_URL, ANON_KEY)
-        # Set schema directly after client creation - this is mandatory
-        # We need to explicitly set the schema for the client
-        if token:
-            sb.postgrest.auth(token)
-        if hasattr(sb.postgrest, 'headers'):
-            sb.postgrest.headers["apikey"] = ANON_KEY
-        # Note: postgrest schema setting is handled by the SUPABASE_DB_SCHEMA environment variable
-        # We don't need to explicitly set it here as the client respects the environment variable
-        _user_clients[cache_key] = sb
 
-    return _user_clients[cache_key]
+async def close_user_clients() -> None:
+    """Close all cached user clients and the shared connection pool."""
+    global _shared_http_client
+    for task, sb in list(_pending_closes.items()):
+        task.cancel()
+        await _close_user_client(sb)
+    while _user_clients:
+        _, (_, sb) = _user_clients.popitem()
+        if not _shared_pool_supported():
+            await _close_user_client(sb)
+    if _shared_http_client is not None:
+        await _shared_http_client.aclose()
+        _shared_http_client = None
 
 async def admin_client() -> AsyncClient:
     """Get admin client (bypasses RLS) - server-only for mutations"""
@@ -170,4 +170,41 @@ async def keys(pattern):
 async def create_pubsub():
     """Create a Redis pubsub object."""
     redis_client = await get_client()
-    return redis_client.pubsub() 
\ No newline at end of file
+    return redis_client.pubsub() 
+
+async def exists(key):
+    """Check whether a Redis key exists with automatic retry."""
+    redis_client = await get_client()
+    return bool(await with_retry(redis_client.exists, key))
+
+async def xadd_batch(key, entries, maxlen=None, ex=None):
+    """Append (entry_id, fields) pairs to a stream in one round trip.
+
+    The stream is trimmed to approximately maxlen entries and its TTL refreshed
+    to ex seconds. Entries are added with raise_on_error=False so a retry after
+    a partially applied pipeline skips IDs that were already written.
+    """
+    redis_client = await get_client()
+
+    async def _execute():
+        pipe = redis_client.pipeline(transaction=False)
+        for entry_id, fields in entries:
+            pipe.xadd(key, fields, id=entry_id, maxlen=maxlen, approximate=True)
+        if ex:
+            pipe.expire(key, ex)
+        return await pipe.execute(raise_on_error=False)
+
+    return await with_retry(_execute)
+
+async def xread(streams, count=None, block=None):
+    """Read entries newer than the given IDs from one or more streams.
+
+    block is in milliseconds and must stay below the client's socket timeout.
+    """
+    redis_client = await get_client()
+    return await with_retry(redis_client.xread, streams, count=count, block=block)
+
+async def xrange(key, min="-", max="+", count=None):
+    """Read the entries of a stream with IDs between min and max (inclusive)."""
+    redis_client = await get_client()
+    return await with_retry(redis_client.xrange, key, min=min, max=max, count=count)
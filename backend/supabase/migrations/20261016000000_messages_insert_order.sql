@@ -0,0 +1,11 @@
+-- Migration: Order batched message inserts by insertion order
+-- Created: 2026-10-16
+--
+-- Messages are now written in batches (multi-row INSERTs). NOW() is fixed for
+-- the whole transaction, so every row in a batch would share one created_at and
+-- get_llm_formatted_messages (ORDER BY created_at) could reorder them.
+-- clock_timestamp() advances per row, preserving the order rows were queued in.
+
+ALTER TABLE messages
+    ALTER COLUMN created_at SET DEFAULT TIMEZONE('utc'::text, clock_timestamp()),
+    ALTER COLUMN updated_at SET DEFAULT TIMEZONE('utc'::text, clock_timestamp());
@@ -0,0 +1,8 @@
+-- Migration: Index messages by thread and creation time
+-- Created: 2026-10-16
+--
+-- The ThreadManager message cache reads only the rows of a thread created
+-- after a cursor on every agent iteration; serve those range scans (and the
+-- latest-summary lookup) from a composite index.
+
+CREATE INDEX IF NOT EXISTS idx_messages_thread_id_created_at ON messages(thread_id, created_at);
@@ -0,0 +1,5 @@
+-- Private bucket for content-addressed browser screenshots (services/blob_store.py).
+-- Objects are written and read by the backend with the service role key.
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('screenshots', 'screenshots', false)
+ON CONFLICT (id) DO NOTHING; -- Avoid error if bucket already exists
@@ -0,0 +1,85 @@
+"""
+Shared fixtures for the sandbox tests.
+
+local_sandbox stands in for a Daytona sandbox that SandboxToolsBase.prepare
+has run on: its home directory is a temporary directory holding an empty
+workspace, file calls read and write there, and commands run in a local bash
+with HOME pointing at it.
+"""
+
+import os
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from sandbox import sandbox as sandbox_module
+
+
+class LocalFS:
+    def __init__(self, home):
+        self.home = home
+        self.uploads = 0
+        # Paths downloaded, in order
+        self.downloads = []
+
+    def create_folder(self, path, mode=None):
+        os.makedirs(os.path.join(self.home, path), exist_ok=True)
+
+    def list_files(self, path):
+        return []
+
+    def upload_file(self, content, path):
+        self.uploads += 1
+        with open(os.path.join(self.home, path), "wb") as f:
+            f.write(content)
+
+    def download_file(self, path):
+        self.downloads.append(path)
+        with open(os.path.join(self.home, path), "rb") as f:
+            return f.read()
+
+    def delete_file(self, path):
+        os.remove(os.path.join(self.home, path))
+
+
+class LocalProcess:
+    def __init__(self, home):
+        self.home = home
+        self.env = {"HOME": home, "PATH": os.environ.get("PATH", "")}
+        # Number of exec calls
+        self.calls = 0
+        # Asynchronous session commands still to be killed at teardown
+        self.running = []
+
+    def exec(self, command, timeout=None):
+        self.calls += 1
+        done = subprocess.run(["bash", "-c", command],
+                              capture_output=True, text=True, env=self.env, timeout=timeout)
+        return SimpleNamespace(exit_code=done.returncode, result=done.stdout + done.stderr)
+
+    def create_session(self, session_id):
+        return None
+
+    def delete_session(self, session_id):
+        return None
+
+    def execute_session_command(self, session_id, payload, timeout=None):
+        if payload["var_async"]:
+            self.running.append(subprocess.Popen(["bash", "-c", payload["command"]], env=self.env))
+            return SimpleNamespace(cmd_id="cmd", exit_code=None)
+        done = subprocess.run(["bash", "-c", payload["command"]], capture_output=True, env=self.env)
+        return SimpleNamespace(cmd_id="cmd", exit_code=done.returncode)
+
+
+@pytest.fixture
+def local_sandbox(tmp_path, monkeypatch):
+    home = str(tmp_path)
+    os.makedirs(os.path.join(home, "workspace"), exist_ok=True)
+    sandbox = SimpleNamespace(id="sbx-local", fs=LocalFS(home), process=LocalProcess(home))
+    monkeypatch.setattr(sandbox_module, "_get_sandbox_by_id", lambda sandbox_id: sandbox)
+    # Every test starts from a fresh home, so tools set up the workspace again
+    monkeypatch.setattr(sandbox_module.SandboxToolsBase, "_workspace_ensured", set())
+    yield sandbox
+    for proc in sandbox.process.running:
+        proc.kill()
@@ -0,0 +1,62 @@
+"""
+Tests for batch file transfer through a single archive.
+
+The archive is extracted and packed by one command in the sandbox (here: a
+local directory standing in for the sandbox home).
+"""
+
+import io
+import os
+import tarfile
+
+import pytest
+
+from sandbox.archive import download_folder, stream_folder, upload_files
+from sandbox.executor import AsyncSandbox
+from sandbox.scripts import SandboxScriptError
+
+
+@pytest.fixture
+def sandbox(local_sandbox):
+    return AsyncSandbox(local_sandbox)
+
+
+@pytest.mark.asyncio
+async def test_upload_and_download_round_trip(sandbox):
+    files = {f"src/module_{i}.py": f"value = {i}\n".encode() for i in range(50)}
+    files["README.md"] = b"# Demo"
+
+    written = await upload_files(sandbox, files, dest="workspace", compression="gzip")
+    assert sorted(written) == sorted(f"workspace/{path}" for path in files)
+    # One upload and one exec for all 51 files
+    assert sandbox.sandbox.fs.uploads == 1 and sandbox.sandbox.process.calls == 1
+    home = sandbox.sandbox.fs.home
+    assert not [name for name in os.listdir(home) if name.startswith(".iris-transfer-")]
+
+    data = await download_folder(sandbox, "workspace/src", compression="gzip")
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as tar:
+        members = {m.name: tar.extractfile(m).read() for m in tar.getmembers()}
+    assert members == {f"src/{path[4:]}": content for path, content in files.items() if path.startswith("src/")}
+    assert not [name for name in os.listdir(home) if name.startswith(".iris-transfer-")]
+
+
+@pytest.mark.asyncio
+async def test_paths_outside_destination_are_rejected(sandbox):
+    with pytest.raises(SandboxScriptError):
+        await upload_files(sandbox, {"../escaped.txt": b"nope"}, dest="workspace", compression="gzip")
+    assert not os.path.exists(os.path.join(sandbox.sandbox.fs.home, "escaped.txt"))
+
+
+@pytest.mark.asyncio
+async def test_download_is_streamed_in_ranges(sandbox):
+    files = {f"data/blob_{i}.bin": os.urandom(10000) for i in range(5)}
+    await upload_files(sandbox, files, dest="workspace", compression="gzip")
+
+    size, chunks = await stream_folder(sandbox, "workspace/data", compression="gzip", chunk_size=8192)
+    received = [chunk async for chunk in chunks]
+    # Read back one range at a time, never as a whole
+    assert len(received) > 1 and all(len(chunk) <= 8192 for chunk in received)
+    assert sum(len(chunk) for chunk in received) == size
+    with tarfile.open(fileobj=io.BytesIO(b"".join(received)), mode="r:gz") as tar:
+        assert {m.name: tar.extractfile(m).read() for m in tar.getmembers()} == files
+    assert not [name for name in os.listdir(sandbox.sandbox.fs.home) if name.startswith(".iris-transfer-")]
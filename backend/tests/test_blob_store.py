@@ -0,0 +1,193 @@
+"""
+Tests for content-addressed screenshot storage and the run loop's browser frame.
+
+Screenshots are stored once by SHA-256, messages carry only a reference, and the
+run loop reuses the latest frame instead of downloading it again.
+"""
+
+import base64
+import json
+import struct
+
+import pytest
+
+from agent.browser_state import LatestBrowserState
+from services.blob_store import LocalBlobStore, blob_key, image_dimensions, screenshot_ref
+
+
+def _png(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x02\x00\x00\x00"
+
+
+def _jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 3) + b"\x00" * 3
+    return b"\xff\xd8" + app0 + sof0 + b"\xff\xd9"
+
+
+class CountingStore(LocalBlobStore):
+    def __init__(self, root):
+        super().__init__(root)
+        self.writes = 0
+        self.reads = 0
+
+    async def _write(self, key, data, content_type):
+        self.writes += 1
+        await super()._write(key, data, content_type)
+
+    async def _read(self, key):
+        self.reads += 1
+        return await super()._read(key)
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+
+    def eq(self, column, value):
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        return self
+
+    async def execute(self):
+        self.client.queries += 1
+        rows = self.client.rows[-1:]
+        return type('obj', (object,), {'data': [dict(r) for r in rows]})
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.queries = 0
+
+    def table(self, name):
+        assert name == 'messages'
+        return self
+
+    def select(self, columns):
+        assert columns == 'message_id, content'
+        return FakeQuery(self)
+
+    def add(self, message_id, content):
+        self.rows.append({'message_id': message_id, 'content': json.dumps(content)})
+
+
+def test_image_dimensions():
+    assert image_dimensions(_png(1024, 768)) == (1024, 768)
+    assert image_dimensions(_jpeg(800, 600)) == (800, 600)
+    assert image_dimensions(b"not an image") is None
+
+
+@pytest.mark.asyncio
+async def test_local_store_is_content_addressed(tmp_path):
+    store = CountingStore(str(tmp_path))
+    data = _jpeg(1024, 768)
+    key = await store.put(data, "image/jpeg")
+    assert key == blob_key(data)
+    assert await store.put(data, "image/jpeg") == key
+    assert store.writes == 1
+    assert await store.get(key) == data
+
+    with pytest.raises(KeyError):
+        await store.get("0" * 64)
+    with pytest.raises(KeyError):
+        await store.get("../etc/passwd")
+
+    ref = screenshot_ref(key, data, "image/jpeg")
+    assert ref == {"sha256": key, "content_type": "image/jpeg", "size": len(data), "width": 1024, "height": 768}
+
+
+@pytest.mark.asyncio
+async def test_run_loop_reuses_latest_frame(tmp_path):
+    store = CountingStore(str(tmp_path))
+    frame = _jpeg(1024, 768)
+    key = await store.put(frame, "image/jpeg")
+    ref = screenshot_ref(key, frame, "image/jpeg")
+
+    client = FakeClient()
+    state = LatestBrowserState("thread", store=store)
+    assert await state.temporary_message(client) is None
+
+    client.add("m1", {"url": "https://a.example", "screenshot": ref})
+    first = await state.temporary_message(client)
+    text, image = first["content"]
+    assert "https://a.example" in text["text"] and "sha256" not in text["text"]
+    assert image["image_url"]["url"] == "data:image/jpeg;base64," + base64.b64encode(frame).decode()
+
+    # No new browser_state: the same message is reused
+    assert await state.temporary_message(client) is first
+
+    # New state with an unchanged screenshot: no second download
+    client.add("m2", {"url": "https://a.example", "pixels_below": 10, "screenshot": ref})
+    second = await state.temporary_message(client)
+    assert second is not first
+    assert second["content"][1] == image
+    assert store.reads == 1
+
+    # Older rows with an inline screenshot still work
+    client.add("m3", {"url": "https://b.example", "screenshot_base64": "aGk="})
+    third = await state.temporary_message(client)
+    assert third["content"][1]["image_url"]["url"] == "data:image/jpeg;base64,aGk="
+
+
+class TableQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return TableQuery([r for r in self.rows if r.get(column) == value])
+
+    async def execute(self):
+        return type('obj', (object,), {'data': list(self.rows)})
+
+
+class TableClient:
+    def __init__(self, **tables):
+        self.tables = tables
+
+    def table(self, name):
+        return TableQuery(self.tables.get(name, []))
+
+
+@pytest.mark.asyncio
+async def test_screenshot_access_is_scoped_to_the_thread(monkeypatch):
+    from fastapi import HTTPException
+    from sandbox import api as sandbox_api
+
+    async def verify_thread_access(client, thread_id, user_id):
+        if user_id != "owner":
+            raise HTTPException(status_code=403, detail="Not authorized to access this thread")
+        return True
+
+    monkeypatch.setattr(sandbox_api, "verify_thread_access", verify_thread_access)
+    key = blob_key(_jpeg(10, 10))
+    ref = screenshot_ref(key, _jpeg(10, 10), "image/jpeg")
+    client = TableClient(
+        threads=[{"thread_id": "private", "project_id": "p1"}, {"thread_id": "shared", "project_id": "p2"}],
+        projects=[{"project_id": "p1", "is_public": False}, {"project_id": "p2", "is_public": True}],
+        messages=[
+            {"thread_id": "private", "type": "browser_state", "content": json.dumps({"screenshot": ref})},
+            {"thread_id": "shared", "type": "browser_state", "content": json.dumps({"screenshot": ref})},
+        ],
+    )
+
+    await sandbox_api.verify_screenshot_access(client, "private", key, "owner")
+    # Shared threads are readable without signing in
+    await sandbox_api.verify_screenshot_access(client, "shared", key, None)
+
+    for thread_id, screenshot, user_id, status in [
+        ("private", key, None, 401),
+        ("private", key, "someone-else", 403),
+        ("private", blob_key(b"other"), "owner", 404),
+        ("missing", key, "owner", 404),
+    ]:
+        with pytest.raises(HTTPException) as exc_info:
+            await sandbox_api.verify_screenshot_access(client, thread_id, screenshot, user_id)
+        assert exc_info.value.status_code == status
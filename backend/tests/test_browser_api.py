@@ -0,0 +1,212 @@
+"""
+Tests for OCR and page-settle detection in the in-sandbox browser API.
+
+OCR runs on a thread pool with a stand-in for tesseract, and settle detection
+is driven by a fake page whose requests and DOM activity the test controls.
+"""
+
+import asyncio
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("playwright")
+pytest.importorskip("pytesseract")
+pytest.importorskip("PIL")
+
+
+@pytest.fixture
+def browser_api(tmp_path, monkeypatch):
+    # BrowserAutomation creates ./screenshots
+    monkeypatch.chdir(tmp_path)
+    from sandbox.docker import browser_api
+    return browser_api
+
+
+@pytest.fixture
+def automation(browser_api, monkeypatch):
+    automation = browser_api.BrowserAutomation()
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(automation, "get_ocr_executor", lambda: executor)
+    yield automation
+    executor.shutdown()
+
+
+class OcrStub:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+
+    def __call__(self, image_bytes):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("tesseract crashed")
+        return f"text of {image_bytes.decode()}"
+
+
+def _screenshot(name):
+    return base64.b64encode(name.encode()).decode()
+
+
+@pytest.mark.asyncio
+async def test_ocr_is_memoized_and_failures_are_retried(browser_api, automation, monkeypatch):
+    ocr = OcrStub()
+    monkeypatch.setattr(browser_api, "_ocr_image", ocr)
+
+    results = await asyncio.gather(*[automation.extract_ocr_text_from_screenshot(_screenshot("a")) for _ in range(5)])
+    assert results == ["text of a"] * 5
+    assert await automation.extract_ocr_text_from_screenshot(_screenshot("a")) == "text of a"
+    assert ocr.calls == 1
+
+    # A failed run is reported as no text, and not remembered
+    ocr.failures = 1
+    assert await automation.extract_ocr_text_from_screenshot(_screenshot("b")) == ""
+    assert await automation.extract_ocr_text_from_screenshot(_screenshot("b")) == "text of b"
+    assert ocr.calls == 3
+
+
+class FakeDomState:
+    url = "https://example.com/"
+    title = "Example"
+    pixels_above = 0
+    pixels_below = 0
+    viewport_width = 1024
+    viewport_height = 768
+    selector_map = {}
+    element_tree = SimpleNamespace(clickable_elements_to_string=lambda include_attributes: "")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode, expect_ocr", [(None, True), ("eager", True), ("lazy", False), ("off", False)])
+async def test_ocr_mode_selects_whether_actions_run_ocr(browser_api, automation, monkeypatch, mode, expect_ocr):
+    ocr = OcrStub()
+    monkeypatch.setattr(browser_api, "_ocr_image", ocr)
+    monkeypatch.setattr(browser_api, "OCR_MODE", "eager")
+
+    async def settle(**kwargs):
+        return {"settle_ms": 0.0, "settled": True}
+
+    async def dom_state():
+        return FakeDomState()
+
+    async def screenshot():
+        return _screenshot("frame")
+
+    async def current_page():
+        return SimpleNamespace(url="https://example.com/")
+
+    monkeypatch.setattr(automation, "wait_for_page_settle", settle)
+    monkeypatch.setattr(automation, "get_current_dom_state", dom_state)
+    monkeypatch.setattr(automation, "take_screenshot", screenshot)
+    monkeypatch.setattr(automation, "get_current_page", current_page)
+
+    token = browser_api.request_ocr_mode.set(mode)
+    try:
+        _, _, _, metadata = await automation.get_updated_browser_state("test")
+    finally:
+        browser_api.request_ocr_mode.reset(token)
+
+    assert ("ocr_text" in metadata) is expect_ocr
+    assert ocr.calls == (1 if expect_ocr else 0)
+    # Lazy requests can still ask for the text afterwards
+    if mode == "lazy":
+        assert (await automation.ocr_text())["ocr_text"] == "text of frame"
+
+
+class FakeRequest:
+    def __init__(self, resource_type):
+        self.resource_type = resource_type
+
+
+class FakePage:
+    """Page whose requests the test starts and finishes, with a DOM that is quiet after dom_busy_checks."""
+
+    def __init__(self, dom_busy_checks=0):
+        self.handlers = {}
+        self.dom_busy_checks = dom_busy_checks
+        self.dom_checks = 0
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event, request):
+        for handler in self.handlers.get(event, []):
+            handler(request)
+
+    async def wait_for_load_state(self, state, timeout=None):
+        return None
+
+    async def evaluate(self, script, args):
+        self.dom_checks += 1
+        await asyncio.sleep(args["quietMs"] / 1000)
+        return self.dom_checks > self.dom_busy_checks
+
+
+@pytest.mark.asyncio
+async def test_settle_waits_for_requests_and_dom(browser_api, automation, monkeypatch):
+    monkeypatch.setattr(browser_api, "SETTLE_QUIET_MS", 10)
+    page = FakePage()
+    network = automation.network_activity(page)
+
+    # An idle page settles after one quiet window
+    result = await automation.wait_for_page_settle(page, max_wait_ms=1000)
+    assert result["settled"] and result["settle_ms"] < 500
+
+    # Long-lived connections are not waited for
+    page.emit("request", FakeRequest("websocket"))
+    assert network.idle.is_set()
+
+    request = FakeRequest("xhr")
+    page.emit("request", request)
+    asyncio.get_running_loop().call_later(0.2, page.emit, "requestfinished", request)
+    result = await automation.wait_for_page_settle(page, max_wait_ms=2000)
+    assert result["settled"] and result["settle_ms"] >= 200
+
+    # A DOM that keeps changing is checked again until it is quiet
+    page = FakePage(dom_busy_checks=2)
+    result = await automation.wait_for_page_settle(page, max_wait_ms=1000)
+    assert result["settled"] and page.dom_checks == 3
+
+
+@pytest.mark.asyncio
+async def test_settle_gives_up_at_the_cap(browser_api, automation, monkeypatch):
+    monkeypatch.setattr(browser_api, "SETTLE_QUIET_MS", 10)
+    page = FakePage()
+    page.emit("request", FakeRequest("fetch"))
+    automation.network_activity(page)
+    # Registered after the request started: it never finishes as far as the tracker knows
+    page.emit("request", FakeRequest("fetch"))
+
+    result = await automation.wait_for_page_settle(page, max_wait_ms=200)
+    assert not result["settled"]
+    assert 200 <= result["settle_ms"] < 1000
+
+
+def _elements(*texts):
+    return [{"index": i, "tag_name": "button", "text": text} for i, text in enumerate(texts)]
+
+
+def test_dom_diff_only_against_the_version_the_client_holds(browser_api, automation):
+    page = SimpleNamespace(url="https://example.com/")
+
+    def update(elements, held):
+        token = browser_api.request_dom_version.set(held)
+        try:
+            return automation.dom_state_update(page, elements)
+        finally:
+            browser_api.request_dom_version.reset(token)
+
+    first = update(_elements("a", "b"), None)
+    assert first["interactive_elements"] and "dom_diff" not in first
+
+    second = update(_elements("a", "c"), first["dom_version"])
+    assert second["dom_base_version"] == first["dom_version"]
+    assert second["dom_diff"] == {"added": [], "removed": [], "changed": [{"index": 1, "tag_name": "button", "text": "c"}]}
+
+    # A client that missed the second state, or another thread's client, gets the full list
+    third = update(_elements("a", "c", "d"), first["dom_version"])
+    assert "dom_diff" not in third and len(third["interactive_elements"]) == 3
+    assert "dom_diff" not in update(_elements("a"), None)
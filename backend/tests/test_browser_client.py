@@ -0,0 +1,70 @@
+"""
+Tests for the pooled browser API client.
+
+Browser actions must go straight to the sandbox's browser API over a reused
+HTTP connection, with one client per sandbox.
+"""
+
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from sandbox import browser_client
+from sandbox.browser_client import BrowserApiClient, BrowserApiError, get_browser_client
+
+
+def _handler(requests):
+    def handle(request):
+        requests.append(request)
+        if request.url.path.endswith("/fail"):
+            return httpx.Response(500, text="boom")
+        return httpx.Response(200, json={"url": "https://example.com", "path": request.url.path})
+    return handle
+
+
+@pytest.mark.asyncio
+async def test_request_posts_json_to_automation_endpoint():
+    requests = []
+    client = BrowserApiClient(
+        "https://8002-sbx.proxy.daytona.work/",
+        token="secret",
+        transport=httpx.MockTransport(_handler(requests)),
+    )
+    result = await client.request("navigate_to", {"url": "https://example.com"})
+    assert result["path"] == "/api/automation/navigate_to"
+
+    await client.request("scroll_down", None)
+    assert [json.loads(r.content) for r in requests] == [{"url": "https://example.com"}, {}]
+    assert requests[0].headers["X-Daytona-Preview-Token"] == "secret"
+
+    with pytest.raises(BrowserApiError) as error:
+        await client.request("fail", {})
+    assert error.value.status_code == 500
+
+    # The DOM version held is sent along so the elements come back as a diff against it
+    await client.request("scroll_down", None, dom_version="abcd:2")
+    assert requests[-1].url.params["dom_version"] == "abcd:2"
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_per_sandbox():
+    links = []
+
+    def get_preview_link(port):
+        links.append(port)
+        return SimpleNamespace(url=f"https://{port}-sbx-shared.proxy.daytona.work", token="t")
+
+    sandbox = SimpleNamespace(id="sbx-shared", get_preview_link=get_preview_link)
+    first = await get_browser_client(sandbox)
+    second = await get_browser_client(sandbox)
+    assert first is second
+    assert links == [8002]
+    assert first.base_url == "https://8002-sbx-shared.proxy.daytona.work"
+
+    await browser_client.invalidate_browser_client("sbx-shared")
+    assert first.closed
+    assert await get_browser_client(sandbox) is not first
+    await browser_client.close_browser_clients()
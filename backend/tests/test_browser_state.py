@@ -0,0 +1,114 @@
+"""
+Tests for rebuilding the browser's interactive elements from DOM diffs.
+
+The browser API sends the full element list only after navigation; other
+actions send the elements added, removed and changed since the previous state.
+"""
+
+import json
+
+import pytest
+
+from agent.browser_state import LatestBrowserState
+
+
+class FakeQuery:
+    def __init__(self, client):
+        self.client = client
+        self.count = None
+
+    def eq(self, column, value):
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    async def execute(self):
+        self.client.queries += 1
+        rows = list(reversed(self.client.rows))[:self.count]
+        return type('obj', (object,), {'data': [dict(r) for r in rows]})
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.queries = 0
+
+    def table(self, name):
+        return self
+
+    def select(self, columns):
+        return FakeQuery(self)
+
+    def add(self, content):
+        self.rows.append({'message_id': f"m{len(self.rows)}", 'content': json.dumps(content)})
+
+
+def _element(index, text, in_viewport=True):
+    return {"index": index, "tag_name": "a", "text": text, "is_in_viewport": in_viewport, "href": f"/{index}"}
+
+
+def _snapshot(version, elements):
+    return {"url": "https://a.example", "dom_version": version, "dom_base_version": None,
+            "interactive_elements": elements, "dom_diff": None}
+
+
+def _diff(version, base, added=(), removed=(), changed=()):
+    return {"url": "https://a.example", "dom_version": version, "dom_base_version": base,
+            "interactive_elements": None,
+            "dom_diff": {"added": list(added), "removed": list(removed), "changed": list(changed)}}
+
+
+def _text(message):
+    return message["content"][0]["text"]
+
+
+@pytest.mark.asyncio
+async def test_diffs_are_applied_to_the_held_elements():
+    client = FakeClient()
+    state = LatestBrowserState("thread")
+
+    client.add(_snapshot("s:1", [_element(1, "Home"), _element(2, "Docs"), _element(3, "More", in_viewport=False)]))
+    text = _text(await state.temporary_message(client))
+    assert '[1]<a href="/1">Home</a>' in text
+    assert '[3]<a href="/3">More</a> (offscreen)' in text
+    assert "interactive_elements" not in text and "dom_version" not in text
+
+    # Scrolled: one element gone, one new, one now in view
+    client.add(_diff("s:2", "s:1", added=[_element(4, "Blog")], removed=[1], changed=[_element(3, "More")]))
+    text = _text(await state.temporary_message(client))
+    assert "Home" not in text
+    assert '[2]<a href="/2">Docs</a>' in text
+    assert '*[3]<a href="/3">More</a>' in text and "offscreen" not in text
+    assert '*[4]<a href="/4">Blog</a>' in text
+    assert state.dom_replays == 0
+
+
+@pytest.mark.asyncio
+async def test_missed_states_are_replayed_from_the_last_snapshot():
+    client = FakeClient()
+    client.add(_snapshot("s:1", [_element(1, "Old page")]))
+    client.add(_snapshot("s:2", [_element(1, "Home"), _element(2, "Docs")]))
+    client.add(_diff("s:3", "s:2", added=[_element(3, "Blog")]))
+    client.add(_diff("s:4", "s:3", removed=[2]))
+
+    # A new run starts after several actions
+    state = LatestBrowserState("thread")
+    text = _text(await state.temporary_message(client))
+    assert state.dom_replays == 1
+    assert "Old page" not in text and "Docs" not in text
+    assert "[1]" in text and "[3]" in text
+
+
+@pytest.mark.asyncio
+async def test_broken_chain_falls_back_to_the_latest_diff():
+    client = FakeClient()
+    client.add(_diff("s:7", "s:6", added=[_element(5, "Next")]))
+
+    state = LatestBrowserState("thread")
+    text = _text(await state.temporary_message(client))
+    assert '*[5]<a href="/5">Next</a>' in text
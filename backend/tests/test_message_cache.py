@@ -0,0 +1,198 @@
+"""
+Tests for the incremental per-thread message cache.
+
+An in-memory fake of the Supabase query builder records every messages query
+so the tests can check that later refreshes only read rows newer than the
+cursor, and that a new summary resets the cached window.
+"""
+
+import json
+
+import pytest
+
+from agentpress.message_cache import ThreadMessageCache
+
+
+class FakeQuery:
+    def __init__(self, client, columns):
+        self.client = client
+        self.columns = columns
+        self.filters = []
+        self.descending = False
+        self.max_rows = None
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row[column] >= value)
+        return self
+
+    def order(self, column, desc=False):
+        self.descending = desc
+        return self
+
+    def limit(self, count):
+        self.max_rows = count
+        return self
+
+    async def execute(self):
+        rows = [r for r in self.client.rows if all(f(r) for f in self.filters)]
+        rows.sort(key=lambda r: r['created_at'], reverse=self.descending)
+        if self.max_rows is not None:
+            rows = rows[:self.max_rows]
+        self.client.rows_read += len(rows)
+        return type('obj', (object,), {'data': [dict(r) for r in rows]})
+
+
+class FakeClient:
+    def __init__(self):
+        self.rows = []
+        self.rows_read = 0
+
+    def table(self, name):
+        assert name == 'messages'
+        return self
+
+    def select(self, columns):
+        return FakeQuery(self, columns)
+
+    def add(self, message_id, content, type='assistant', is_llm_message=True):
+        created_at = f"2026-10-16T00:00:00.{len(self.rows):06d}+00:00"
+        self.rows.append({
+            'message_id': message_id,
+            'thread_id': 'thread',
+            'type': type,
+            'is_llm_message': is_llm_message,
+            'content': json.dumps(content),
+            'created_at': created_at,
+        })
+
+
+@pytest.mark.asyncio
+async def test_refresh_only_reads_new_rows():
+    """After the first load each refresh reads only rows at or after the cursor."""
+    client = FakeClient()
+    for i in range(100):
+        client.add(f"m{i}", {"role": "user", "content": str(i)})
+    client.add("status", {"status_type": "thread_run_start"}, type='status', is_llm_message=False)
+
+    cache = ThreadMessageCache('thread')
+    messages = await cache.refresh(client)
+    assert [m['content'] for m in messages] == [str(i) for i in range(100)]
+    assert cache.full_loads == 1
+
+    client.rows_read = 0
+    client.add("m100", {"role": "assistant", "content": "100"})
+    messages = await cache.refresh(client)
+    assert messages[-1]['content'] == "100"
+    assert len(messages) == 101
+    # The cursor row itself plus the new row
+    assert client.rows_read <= 2
+    assert cache.full_loads == 1
+
+
+@pytest.mark.asyncio
+async def test_appended_messages_are_not_duplicated():
+    """Messages appended by add_message are deduplicated against the delta fetch."""
+    client = FakeClient()
+    client.add("m0", {"role": "user", "content": "hi"})
+    cache = ThreadMessageCache('thread')
+    await cache.refresh(client)
+
+    content = json.dumps({"role": "assistant", "content": "hello"})
+    assert cache.append("m1", content)
+    client.add("m1", {"role": "assistant", "content": "hello"})
+    messages = await cache.refresh(client)
+    assert [m['content'] for m in messages] == ["hi", "hello"]
+
+
+@pytest.mark.asyncio
+async def test_new_summary_starts_a_new_window():
+    """A summary written by another process resets the cache to the summary window."""
+    client = FakeClient()
+    for i in range(5):
+        client.add(f"m{i}", {"role": "user", "content": str(i)})
+    cache = ThreadMessageCache('thread')
+    await cache.refresh(client)
+
+    client.add("s", {"role": "user", "content": "summary"}, type='summary')
+    client.add("m5", {"role": "assistant", "content": "5"})
+    messages = await cache.refresh(client)
+    assert [m['content'] for m in messages] == ["summary", "5"]
+    assert cache.full_loads == 2
+
+    # The summary row at the cursor does not trigger another reload
+    messages = await cache.refresh(client)
+    assert [m['content'] for m in messages] == ["summary", "5"]
+    assert cache.full_loads == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_forces_full_load():
+    client = FakeClient()
+    client.add("m0", {"role": "user", "content": "hi"})
+    cache = ThreadMessageCache('thread')
+    await cache.refresh(client)
+    cache.invalidate()
+    assert cache.messages == []
+    messages = await cache.refresh(client)
+    assert [m['content'] for m in messages] == ["hi"]
+    assert cache.full_loads == 2
+
+
+@pytest.mark.asyncio
+async def test_token_count_only_tokenizes_new_messages():
+    """The running token total counts each message once per model."""
+    client = FakeClient()
+    for i in range(50):
+        client.add(f"m{i}", {"role": "user", "content": "x" * i})
+    cache = ThreadMessageCache('thread')
+    await cache.refresh(client)
+
+    tokenized = []
+
+    def count(message):
+        tokenized.append(message)
+        return len(message['content'])
+
+    assert cache.token_count('gpt-4o', count) == sum(range(50))
+    assert len(tokenized) == 50
+
+    cache.append("m50", json.dumps({"role": "assistant", "content": "y" * 7}))
+    assert cache.token_count('gpt-4o', count) == sum(range(50)) + 7
+    assert len(tokenized) == 51
+
+    # Another model has its own tokenizer and is counted separately
+    cache.token_count('claude', count)
+    assert len(tokenized) == 102
+
+    # Counts survive a reload; only the new summary is tokenized
+    client.add("m50", {"role": "assistant", "content": "y" * 7})
+    client.add("s", {"role": "user", "content": "z" * 3}, type='summary')
+    await cache.refresh(client)
+    tokenized.clear()
+    assert cache.token_count('gpt-4o', count) == 3
+    assert len(tokenized) == 1
+    # Counts of messages before the summary are dropped with them
+    assert set(cache._message_tokens) == {('gpt-4o', 's')}
+
+
+@pytest.mark.asyncio
+async def test_thread_manager_keeps_a_bounded_number_of_threads(monkeypatch):
+    """The process-wide ThreadManager drops the least recently used thread caches."""
+    from agentpress import thread_manager as thread_manager_module
+    from agentpress.thread_manager import ThreadManager
+
+    client = FakeClient()
+
+    class FakeDB:
+        async def get_client(self):
+            return client
+
+    monkeypatch.setattr(thread_manager_module, "MESSAGE_CACHE_MAX_THREADS", 3)
+    manager = ThreadManager(db_connection=FakeDB(), write_behind=False, cache_messages=True)
+    for thread_id in ["a", "b", "c", "a", "d"]:
+        await manager.get_llm_messages(thread_id)
+    assert list(manager._message_caches) == ["c", "a", "d"]
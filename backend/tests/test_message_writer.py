@@ -0,0 +1,160 @@
+"""
+Tests for the write-behind MessageWriter.
+
+These tests use an in-memory fake of the Supabase client to verify that queued
+message rows are inserted in batches, in order, that a failed batch stays
+queued for the next durable flush, and that rows the database rejects are
+dropped without holding up the rest.
+"""
+
+import asyncio
+
+import pytest
+from postgrest.exceptions import APIError
+
+from agentpress.message_writer import MessageWriter
+from agentpress.thread_manager import ThreadManager
+
+
+class FakeInsert:
+    def __init__(self, db, rows):
+        self.db = db
+        self.rows = rows
+
+    async def execute(self):
+        if self.db.fail_next > 0:
+            self.db.fail_next -= 1
+            raise ConnectionError("temporary failure")
+        if any(row["thread_id"] in self.db.deleted_threads for row in self.rows):
+            raise APIError({"code": "23503", "message": "violates foreign key constraint"})
+        self.db.batches.append(list(self.rows))
+        return type('obj', (object,), {'data': []})
+
+
+class FakeTable:
+    def __init__(self, db):
+        self.db = db
+
+    def insert(self, rows, returning='representation'):
+        assert returning == 'minimal'
+        return FakeInsert(self.db, rows)
+
+
+class FakeDB:
+    """Stands in for DBConnection and the Supabase client it returns."""
+
+    def __init__(self):
+        self.batches = []
+        self.fail_next = 0
+        self.deleted_threads = set()
+
+    async def get_client(self):
+        return self
+
+    def table(self, name):
+        assert name == 'messages'
+        return FakeTable(self)
+
+
+def _row(i, thread_id="t"):
+    return {"message_id": f"id-{i}", "thread_id": thread_id, "type": "status", "content": "{}"}
+
+
+@pytest.mark.asyncio
+async def test_rows_are_batched_by_interval():
+    """Rows queued within the flush interval share one insert."""
+    db = FakeDB()
+    writer = MessageWriter(db, max_batch_size=50, flush_interval_ms=5)
+    for i in range(10):
+        writer.enqueue(_row(i))
+    assert db.batches == []
+
+    await asyncio.sleep(0.05)
+    assert writer.round_trips == 1
+    assert [r["message_id"] for r in db.batches[0]] == [f"id-{i}" for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_rows_are_batched_by_count():
+    """A full batch is flushed without waiting for the interval."""
+    db = FakeDB()
+    writer = MessageWriter(db, max_batch_size=4, flush_interval_ms=10000)
+    for i in range(8):
+        writer.enqueue(_row(i))
+    assert await writer.flush()
+    assert [len(b) for b in db.batches] == [4, 4]
+    flattened = [r["message_id"] for b in db.batches for r in b]
+    assert flattened == [f"id-{i}" for i in range(8)]
+    await writer.close()
+
+
+@pytest.mark.asyncio
+async def test_durable_flush_retries_and_keeps_order():
+    """A transient insert failure is retried and rows keep their order."""
+    db = FakeDB()
+    db.fail_next = 1
+    writer = MessageWriter(db, max_batch_size=50, flush_interval_ms=10000)
+    for i in range(3):
+        writer.enqueue(_row(i))
+    assert await writer.close()
+    assert writer.pending_count == 0
+    assert [r["message_id"] for r in db.batches[0]] == ["id-0", "id-1", "id-2"]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_stays_queued():
+    """Rows from a batch that exhausts its retries are kept for the next flush."""
+    db = FakeDB()
+    db.fail_next = 100
+    writer = MessageWriter(db, max_batch_size=50, flush_interval_ms=10000)
+    writer.enqueue(_row(0))
+    assert not await writer.flush()
+    assert writer.pending_count == 1
+
+    db.fail_next = 0
+    writer.enqueue(_row(1))
+    assert await writer.flush()
+    assert [r["message_id"] for r in db.batches[0]] == ["id-0", "id-1"]
+
+
+@pytest.mark.asyncio
+async def test_rejected_row_is_dropped_and_the_rest_written():
+    """A row the database refuses does not block the rows queued with or after it."""
+    db = FakeDB()
+    db.deleted_threads = {"gone"}
+    rejected = []
+    writer = MessageWriter(db, max_batch_size=50, flush_interval_ms=10000, on_rejected=rejected.extend)
+    writer.enqueue(_row(0))
+    writer.enqueue(_row(1, thread_id="gone"))
+    writer.enqueue(_row(2))
+    assert await writer.flush()
+    assert [r["message_id"] for b in db.batches for r in b] == ["id-0", "id-2"]
+    assert [r["message_id"] for r in rejected] == ["id-1"]
+    assert writer.rows_rejected == 1
+
+    writer.enqueue(_row(3))
+    assert await writer.flush()
+    assert db.batches[-1][0]["message_id"] == "id-3"
+
+
+@pytest.mark.asyncio
+async def test_thread_manager_handles_failed_flushes():
+    """Rejected rows evict their thread's message cache; unwritten rows stop reads."""
+    db = FakeDB()
+    manager = ThreadManager(db_connection=db, write_behind=True, cache_messages=True)
+    manager.message_writer.flush_interval = 10
+
+    db.deleted_threads = {"gone"}
+    await manager.add_message("gone", {"role": "user", "content": "hi"}, type="user", is_llm_message=True)
+    manager._message_caches["gone"] = object()
+    assert await manager.flush_messages()
+    assert "gone" not in manager._message_caches
+
+    db.fail_next = 100
+    await manager.add_message("t", {"role": "user", "content": "hi"}, type="user", is_llm_message=True)
+    with pytest.raises(RuntimeError):
+        await manager.get_llm_messages("t")
+    assert manager.message_writer.pending_count == 1
+
+    db.fail_next = 0
+    assert await manager.message_writer.close()
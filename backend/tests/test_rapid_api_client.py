@@ -0,0 +1,138 @@
+"""
+Tests for the shared async client behind the RapidAPI data providers.
+
+A local HTTP server stands in for RapidAPI: it counts requests, tracks how
+many are in flight and can answer with 429 or 5xx before succeeding.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from agent.tools.data_providers import RapidApiClient as client_module
+from agent.tools.data_providers.RapidApiClient import RapidApiError, close_rapid_api_client
+from agent.tools.data_providers.RapidDataProviderBase import RapidDataProviderBase
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failures = {}  # path -> list of status codes to answer before succeeding
+        self.delay = 0.0
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _answer(self, body):
+            url = urlparse(self.path)
+            with state.lock:
+                state.requests += 1
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+                pending = state.failures.get(url.path)
+                status = pending.pop(0) if pending else 200
+            try:
+                time.sleep(state.delay)
+                data = json.dumps({
+                    "path": url.path,
+                    "query": {k: v[0] for k, v in parse_qs(url.query).items()},
+                    "body": body,
+                    "key": self.headers.get("x-rapidapi-key"),
+                }).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def do_GET(self):
+            self._answer(None)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self._answer(json.loads(self.rfile.read(length) or b"null"))
+
+    return Handler
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setattr(client_module, "RAPID_API_BACKOFF", 0.01)
+    monkeypatch.setenv("RAPID_API_KEY", "test-key")
+    state = StubState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    provider = RapidDataProviderBase(f"http://127.0.0.1:{server.server_port}", {
+        "search": {"route": "/search", "method": "GET", "name": "Search", "description": "", "payload": {}},
+        "create": {"route": "/create", "method": "POST", "name": "Create", "description": "", "payload": {}},
+    })
+    yield state, provider
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_get_and_post(stub):
+    state, provider = stub
+    try:
+        result = await provider.call_endpoint_async("search", {"q": "iris"})
+        assert result == {"path": "/search", "query": {"q": "iris"}, "body": None, "key": "test-key"}
+        result = await provider.call_endpoint_async("/create", {"name": "x"})
+        assert result["body"] == {"name": "x"}
+        with pytest.raises(ValueError):
+            await provider.call_endpoint_async("missing")
+    finally:
+        await close_rapid_api_client()
+
+
+@pytest.mark.asyncio
+async def test_retries_on_429_and_5xx(stub):
+    state, provider = stub
+    try:
+        state.failures["/search"] = [429, 503]
+        result = await provider.call_endpoint_async("search", {"q": "retry"})
+        assert result["query"] == {"q": "retry"}
+        assert state.requests == 3
+
+        # Client errors are not retried
+        state.failures["/search"] = [404]
+        with pytest.raises(RapidApiError) as error:
+            await provider.call_endpoint_async("search", {"q": "gone"})
+        assert error.value.status_code == 404
+        assert state.requests == 4
+    finally:
+        await close_rapid_api_client()
+
+
+@pytest.mark.asyncio
+async def test_fan_out_is_bounded_per_provider(stub, monkeypatch):
+    state, provider = stub
+    monkeypatch.setattr(client_module, "RAPID_API_CONCURRENCY", 3)
+    monkeypatch.setattr(client_module, "RAPID_API_RETRIES", 0)
+    state.delay = 0.1
+    state.failures["/search"] = [500]
+    try:
+        results = await provider.call_endpoints([("search", {"q": str(i)}) for i in range(9)])
+        assert state.max_in_flight == 3
+        # One call failed; the others still returned, in order
+        errors = [r for r in results if isinstance(r, Exception)]
+        assert len(errors) == 1 and errors[0].status_code == 500
+        assert all(r["query"]["q"] == str(i) for i, r in enumerate(results) if r is not errors[0])
+    finally:
+        await close_rapid_api_client()
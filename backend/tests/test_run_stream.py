@@ -0,0 +1,265 @@
+"""
+Tests for the in-process SSE fan-out and run log of agent run responses.
+
+Subscribers must receive every frame in order, wake as soon as a response is
+published (no polling delay), share the same serialized bytes, and finish when
+the run's channel is closed. The run log merges streamed content chunks and
+keeps a bounded number of entries.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from agent.run_stream import RunResponseChannel, PING_FRAME, parse_last_event_id
+
+
+async def _collect(channel, **kwargs):
+    return [frame async for frame in channel.subscribe(**kwargs)]
+
+
+def _parse(frame):
+    header, data = frame.split(b"data: ", 1)
+    event_id = int(header[len(b"id: "):-1]) if header else None
+    return event_id, json.loads(data)
+
+
+def _chunk(text, thread_run_id="run-1"):
+    return {
+        "message_id": None, "thread_id": "t", "type": "assistant", "is_llm_message": True,
+        "content": json.dumps({"role": "assistant", "content": text}),
+        "metadata": json.dumps({"stream_status": "chunk", "thread_run_id": thread_run_id}),
+    }
+
+
+def _text(response):
+    return json.loads(response["content"])["content"]
+
+
+@pytest.mark.asyncio
+async def test_subscribers_share_frames_and_end_on_close():
+    channel = RunResponseChannel()
+    channel.publish({"type": "status", "status": "running"})
+
+    subscribers = [asyncio.create_task(_collect(channel)) for _ in range(50)]
+    await asyncio.sleep(0)
+    for i in range(3):
+        channel.publish({"type": "content", "content": str(i)})
+        await asyncio.sleep(0)
+    channel.close()
+
+    results = await asyncio.wait_for(asyncio.gather(*subscribers), timeout=1)
+    parsed = [_parse(f) for f in results[0]]
+    assert [event_id for event_id, _ in parsed] == [1, 2, 3, 4]
+    assert [r["type"] for _, r in parsed] == ["status", "content", "content", "content"]
+    for frames in results:
+        # Serialized once; every subscriber yields the same bytes objects
+        assert all(a is b for a, b in zip(frames, results[0]))
+
+
+@pytest.mark.asyncio
+async def test_subscriber_wakes_without_polling_delay():
+    channel = RunResponseChannel()
+    received = asyncio.Event()
+    latency = []
+
+    async def consume():
+        async for frame in channel.subscribe():
+            latency.append(time.perf_counter() - published_at)
+            received.set()
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.05)
+    published_at = time.perf_counter()
+    channel.publish({"type": "content"})
+    await asyncio.wait_for(received.wait(), timeout=1)
+    assert latency[0] < 0.05
+    channel.close()
+    await asyncio.wait_for(task, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_replay_without_follow_and_ping():
+    channel = RunResponseChannel()
+    channel.publish({"n": 1})
+    channel.publish({"n": 2})
+    assert len(await _collect(channel, follow=False)) == 2
+    assert len(await _collect(channel, start=1, follow=False)) == 1
+
+    frames = []
+    async for frame in channel.subscribe(start=2, ping_interval=0.01):
+        frames.append(frame)
+        if frame == PING_FRAME:
+            channel.close()
+    assert frames == [PING_FRAME]
+    assert channel.publish({"n": 3}) is None and channel.last_event_id == 2
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.entries = []
+        self.closed = False
+
+    def append(self, event_id, data):
+        self.entries.append((event_id, data))
+
+    def append_chunk(self, event_id, key, text, template):
+        self.entries.append((event_id, text))
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_resume_after_last_event_id():
+    """A reconnect only receives frames after its Last-Event-ID."""
+    writer = RecordingWriter()
+    channel = RunResponseChannel(writer=writer)
+    for i in range(5):
+        channel.publish({"n": i})
+    channel.close()
+
+    frames = await _collect(channel, start=parse_last_event_id("3"))
+    assert [_parse(f)[0] for f in frames] == [4, 5]
+    assert [event_id for event_id, _ in writer.entries] == [1, 2, 3, 4, 5]
+    assert writer.closed
+    assert parse_last_event_id("bogus") == 0
+
+
+@pytest.mark.asyncio
+async def test_content_chunks_are_merged_for_late_subscribers():
+    """Live subscribers see each chunk; replays get the merged segment or the missed part."""
+    channel = RunResponseChannel()
+    live = asyncio.create_task(_collect(channel))
+    await asyncio.sleep(0)
+
+    channel.publish({"type": "status", "status": "running"})
+    for word in ["Hello", " streaming", " world"]:
+        channel.publish(_chunk(word))
+        await asyncio.sleep(0.01)
+    channel.publish({"type": "assistant", "message_id": "m1", "content": "{}"})
+    channel.close()
+
+    live_frames = await asyncio.wait_for(live, timeout=1)
+    assert [_parse(f)[0] for f in live_frames] == [1, 2, 3, 4, 5]
+
+    # Status, one merged segment, final message
+    assert len(channel) == 3
+    replay = [_parse(f) for f in await _collect(channel)]
+    assert [event_id for event_id, _ in replay] == [1, 4, 5]
+    assert _text(replay[1][1]) == "Hello streaming world"
+
+    # Resuming in the middle of the segment sends only the missed text
+    resumed = [_parse(f) for f in await _collect(channel, start=2)]
+    assert [event_id for event_id, _ in resumed] == [4, 5]
+    assert _text(resumed[0][1]) == " streaming world"
+
+
+@pytest.mark.asyncio
+async def test_separate_messages_are_separate_segments():
+    channel = RunResponseChannel()
+    channel.publish(_chunk("a", "run-1"))
+    channel.publish(_chunk("b", "run-1"))
+    channel.publish(_chunk("c", "run-2"))
+    channel.close()
+    replay = [_parse(f) for f in await _collect(channel)]
+    assert [(event_id, _text(r)) for event_id, r in replay] == [(2, "ab"), (3, "c")]
+
+
+@pytest.mark.asyncio
+async def test_run_log_is_bounded():
+    """Memory holds at most max_entries entries, however many chunks were streamed."""
+    channel = RunResponseChannel(max_entries=10)
+    for i in range(100):
+        channel.publish({"type": "status", "n": i})
+        for _ in range(50):
+            channel.publish(_chunk("x", f"run-{i}"))
+    channel.close()
+
+    assert len(channel) == 10
+    assert channel.last_event_id == 100 * 51
+    frames = [_parse(f) for f in await _collect(channel, start=0)]
+    # Without a backfill, the dropped events are reported as a gap
+    assert frames[0] == (channel.first_event_id - 1, {
+        "type": "status", "status": "gap",
+        "message": f"Responses 1-{channel.first_event_id - 1} are no longer available",
+    })
+    assert frames[1][0] == channel.first_event_id
+    assert _text(frames[-1][1]) == "x" * 50
+
+
+@pytest.mark.asyncio
+async def test_channel_fed_from_redis_entries():
+    """Event IDs stay aligned for entries merged or trimmed upstream."""
+    channel = RunResponseChannel()
+    channel.append_entry(41, json.dumps({"n": 41}))
+    channel.append_entry(44, json.dumps(_chunk("abc")), first_id=42)
+    channel.append_entry(44, json.dumps({"n": 44}))
+    channel.append_entry(45, json.dumps(_chunk("d")))
+    channel.close()
+    assert channel.last_event_id == 45
+    replay = [_parse(f) for f in await _collect(channel, start=41)]
+    assert [(event_id, _text(r)) for event_id, r in replay] == [(45, "abcd")]
+    # Resuming inside a merged piece resends the whole piece
+    replay = [_parse(f) for f in await _collect(channel, start=43)]
+    assert _text(replay[0][1]) == "abcd"
+    replay = [_parse(f) for f in await _collect(channel, start=44)]
+    assert _text(replay[0][1]) == "d"
+
+
+@pytest.mark.asyncio
+async def test_dropped_events_are_backfilled():
+    """A subscriber behind the in-memory log reads the missing events back."""
+    persisted = {}
+    reads = []
+
+    async def backfill(after_id, before_id):
+        reads.append((after_id, before_id))
+        # Event 3 was trimmed from the persisted stream as well
+        return [(i, persisted[i], None) for i in range(after_id + 1, before_id) if i != 3]
+
+    channel = RunResponseChannel(max_entries=5, backfill=backfill)
+    for i in range(1, 21):
+        channel.publish({"n": i})
+        persisted[i] = json.dumps({"n": i})
+    channel.close()
+
+    frames = [_parse(f) for f in await _collect(channel, start=1)]
+    assert reads == [(1, 16)]
+    assert [event_id for event_id, _ in frames] == list(range(2, 21))
+    assert frames[1][1]["status"] == "gap"
+    assert [r["n"] for event_id, r in frames if event_id != 3] == [2] + list(range(4, 21))
+
+    # A failing backfill degrades to a gap frame
+    async def broken(after_id, before_id):
+        raise ConnectionError("redis down")
+
+    channel.backfill = broken
+    frames = [_parse(f) for f in await _collect(channel, start=0)]
+    assert frames[0] == (15, {"type": "status", "status": "gap", "message": "Responses 1-15 are no longer available"})
+    assert [event_id for event_id, _ in frames[1:]] == list(range(16, 21))
+
+
+@pytest.mark.asyncio
+async def test_follow_stops_once_the_run_is_no_longer_running():
+    """A channel that is never closed (its run died) does not keep subscribers forever."""
+    channel = RunResponseChannel()
+    channel.publish({"n": 1})
+    checks = []
+
+    async def still_running():
+        checks.append(channel.last_event_id)
+        if len(checks) == 2:
+            channel.publish({"n": 2})
+            return False
+        return True
+
+    frames = await asyncio.wait_for(
+        _collect(channel, ping_interval=0.01, still_running=still_running, status_check_interval=0.02),
+        timeout=1,
+    )
+    assert len(checks) == 2 and not channel.closed
+    # Frames published before the check failed are still sent
+    assert [_parse(f)[0] for f in frames if f != PING_FRAME] == [1, 2]
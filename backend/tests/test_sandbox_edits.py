@@ -0,0 +1,120 @@
+"""
+Tests for file edits applied inside the sandbox by SandboxFilesTool.
+
+Edits run as one command in the sandbox (here: a local directory standing in
+for the sandbox home); the file is never downloaded and only a diff comes back.
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from agent.tools import sb_files_tool
+from agent.tools.sb_files_tool import SandboxFilesTool
+
+
+@pytest.fixture
+def tool(local_sandbox):
+    return SandboxFilesTool(local_sandbox)
+
+
+def _write(tool, rel_path, text):
+    path = os.path.join(tool.sandbox.fs.home, "workspace", rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def _read(tool, rel_path):
+    with open(os.path.join(tool.sandbox.fs.home, "workspace", rel_path)) as f:
+        return f.read()
+
+
+@pytest.mark.asyncio
+async def test_str_replace_runs_in_sandbox(tool):
+    _write(tool, "app.py", "a = 1\nb = 2\nc = 3\n")
+
+    result = await tool.str_replace("app.py", "b = 2", "b = 20")
+    assert result.success
+    assert "-b = 2" in result.output and "+b = 20" in result.output
+    assert _read(tool, "app.py") == "a = 1\nb = 20\nc = 3\n"
+    assert tool.sandbox.fs.downloads == []
+
+    assert "String not found" in (await tool.str_replace("app.py", "zzz", "y")).output
+    _write(tool, "dup.py", "x\nx\n")
+    assert "Multiple occurrences" in (await tool.str_replace("dup.py", "x", "y")).output
+    assert _read(tool, "dup.py") == "x\nx\n"
+    assert "does not exist" in (await tool.str_replace("missing.py", "x", "y")).output
+
+
+@pytest.mark.asyncio
+async def test_apply_patch_with_shifted_hunks(tool):
+    _write(tool, "main.py", "".join(f"line {i}\n" for i in range(1, 31)))
+    # Line numbers are off by two; hunks are found by their context
+    patch = (
+        "--- a/main.py\n+++ b/main.py\n"
+        "@@ -3,3 +3,3 @@\n line 4\n-line 5\n+line five\n line 6\n"
+        "@@ -20,2 +20,3 @@\n line 22\n+inserted\n line 23\n"
+    )
+    result = await tool.apply_patch("main.py", patch)
+    assert result.success, result.output
+    lines = _read(tool, "main.py").splitlines()
+    assert lines[4] == "line five"
+    assert lines[22:24] == ["inserted", "line 23"]
+    assert len(lines) == 31
+
+    failed = await tool.apply_patch("main.py", "@@ -1,1 +1,1 @@\n-not here\n+x\n")
+    assert not failed.success and "Hunk 1" in failed.output
+
+
+@pytest.mark.asyncio
+async def test_apply_patch_prompt_example_applies(tool):
+    """The example shown to the model is a patch the tool accepts, even indented."""
+    schema = next(s for s in tool.get_schemas()["apply_patch"] if s.xml_schema)
+    example = schema.xml_schema.example
+    patch = example[example.index(">") + 1:example.index("</apply-patch>")]
+    _write(tool, "src/main.py", "import sys\nprint('hi')\n")
+    assert (await tool.apply_patch("src/main.py", patch)).success
+    assert _read(tool, "src/main.py") == "import sys\nprint('hello')\n"
+
+    indented = "".join("    " + line for line in patch.replace("hello", "bye").splitlines(True))
+    result = await tool.apply_patch("src/main.py", indented.replace("-print('hi')", "-print('hello')"))
+    assert result.success, result.output
+    assert _read(tool, "src/main.py") == "import sys\nprint('bye')\n"
+
+
+@pytest.mark.asyncio
+async def test_replace_lines_and_large_edits(tool, monkeypatch):
+    _write(tool, "notes.txt", "one\ntwo\nthree\n")
+    assert (await tool.replace_lines("notes.txt", 2, 2, "TWO")).success
+    assert _read(tool, "notes.txt") == "one\nTWO\nthree\n"
+    assert (await tool.replace_lines("notes.txt", 1, 0, "zero\n")).success
+    assert _read(tool, "notes.txt") == "zero\none\nTWO\nthree\n"
+    assert not (await tool.replace_lines("notes.txt", 7, 8, "x")).success
+
+    # Edits above the inline limit go through a staged file, which is removed
+    monkeypatch.setattr(sb_files_tool, "EDIT_INLINE_MAX_BYTES", 10)
+    assert (await tool.str_replace("notes.txt", "three", "3")).success
+    assert _read(tool, "notes.txt").endswith("3\n")
+    assert not [n for n in os.listdir(tool.sandbox.fs.home) if n.startswith(".iris-edit-")]
+
+    # The limit applies to the quoted command-line argument, not the raw JSON
+    monkeypatch.setattr(sb_files_tool, "EDIT_INLINE_MAX_BYTES", 64 * 1024)
+    quotes = "'" * 20000
+    uploads = tool.sandbox.fs.uploads
+    assert (await tool.str_replace("notes.txt", "3\n", quotes + "\n")).success
+    assert _read(tool, "notes.txt").endswith(quotes + "\n")
+    assert tool.sandbox.fs.uploads == uploads + 1
+
+
+@pytest.mark.asyncio
+async def test_edits_to_the_same_file_are_serialized(tool):
+    _write(tool, "counter.txt", "".join(f"slot {i}\n" for i in range(10)))
+    results = await asyncio.gather(*[
+        tool.str_replace("counter.txt", f"slot {i}\n", f"done {i}\n") for i in range(10)
+    ])
+    assert all(r.success for r in results)
+    assert _read(tool, "counter.txt") == "".join(f"done {i}\n" for i in range(10))
+    # Locks are not kept once the edits are done
+    assert not tool._edit_locks and not tool._edit_lock_users
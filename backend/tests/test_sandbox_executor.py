@@ -0,0 +1,176 @@
+"""
+Tests for the async sandbox executor.
+
+Blocking Daytona SDK calls must run off the event loop: a slow shell command in
+one sandbox must not delay SSE streams, calls are limited per sandbox, and a
+caller that times out gets control back without waiting for the SDK.
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agent.run_stream import RunResponseChannel
+from sandbox import executor
+from sandbox.executor import AsyncSandbox, run_sandbox_call
+
+
+class SlowProcess:
+    def __init__(self, delay):
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def exec(self, command, timeout=None):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            # Stands in for the synchronous SDK blocking on the sandbox
+            time.sleep(self.delay)
+            return SimpleNamespace(exit_code=0, result=command)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+def _fake_sandbox(sandbox_id, delay):
+    return SimpleNamespace(id=sandbox_id, process=SlowProcess(delay))
+
+
+@pytest.mark.asyncio
+async def test_slow_shell_command_does_not_delay_sse_stream():
+    sandbox = AsyncSandbox(_fake_sandbox("sbx-slow", delay=0.5))
+    channel = RunResponseChannel()
+    gaps = []
+
+    async def consume():
+        last = time.perf_counter()
+        async for _ in channel.subscribe():
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    async def produce():
+        for i in range(40):
+            channel.publish({"type": "content", "n": i})
+            await asyncio.sleep(0.01)
+        channel.close()
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    response, _ = await asyncio.gather(sandbox.exec("sleep 0.5", timeout=60), produce())
+    await asyncio.wait_for(consumer, timeout=1)
+
+    assert response.exit_code == 0
+    assert time.perf_counter() - started >= 0.5
+    assert len(gaps) == 40
+    # Frames kept flowing every ~10 ms while the command was running
+    assert max(gaps) < 0.2
+
+
+@pytest.mark.asyncio
+async def test_calls_are_limited_per_sandbox(monkeypatch):
+    monkeypatch.setattr(executor, "SANDBOX_CONCURRENCY", 2)
+    busy = _fake_sandbox("sbx-busy", delay=0.1)
+    other = _fake_sandbox("sbx-other", delay=0.1)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *[AsyncSandbox(busy).exec("true") for _ in range(6)],
+        *[AsyncSandbox(other).exec("true") for _ in range(2)],
+    )
+    elapsed = time.perf_counter() - started
+
+    assert busy.process.max_running == 2
+    assert other.process.max_running == 2
+    # Six calls two at a time take three rounds; the other sandbox is not held up
+    assert 0.3 <= elapsed < 0.6
+
+
+@pytest.mark.asyncio
+async def test_timeout_returns_control_and_holds_slot_until_sdk_returns(monkeypatch):
+    monkeypatch.setattr(executor, "SANDBOX_CONCURRENCY", 1)
+    sandbox = _fake_sandbox("sbx-timeout", delay=0.3)
+    calls = []
+
+    started = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        await run_sandbox_call("sbx-timeout", sandbox.process.exec, "sleep", timeout=0.05)
+    assert time.perf_counter() - started < 0.2
+
+    # The abandoned call still occupies the sandbox's only slot
+    await run_sandbox_call("sbx-timeout", calls.append, "next")
+    assert calls == ["next"]
+    assert time.perf_counter() - started >= 0.3
+
+
+@pytest.mark.asyncio
+async def test_cancelled_call_that_has_not_started_is_dropped(monkeypatch):
+    monkeypatch.setattr(executor, "SANDBOX_CONCURRENCY", 1)
+    sandbox = _fake_sandbox("sbx-cancel", delay=0.1)
+    calls = []
+
+    first = asyncio.create_task(run_sandbox_call("sbx-cancel", sandbox.process.exec, "sleep"))
+    queued = asyncio.create_task(run_sandbox_call("sbx-cancel", calls.append, "queued"))
+    await asyncio.sleep(0.02)
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+
+    await first
+    await run_sandbox_call("sbx-cancel", calls.append, "after")
+    assert calls == ["after"]
+
+
+@pytest.mark.asyncio
+async def test_idle_sandbox_limits_are_dropped(monkeypatch):
+    monkeypatch.setattr(executor, "SANDBOX_CONCURRENCY", 1)
+    sandbox = _fake_sandbox("sbx-idle", delay=0.05)
+
+    calls = [asyncio.create_task(run_sandbox_call(f"sbx-idle-{i}", sandbox.process.exec, "true")) for i in range(5)]
+    queued = asyncio.create_task(run_sandbox_call("sbx-idle-0", sandbox.process.exec, "true", timeout=0.01))
+    await asyncio.sleep(0)
+    assert len(executor._semaphores) >= 5
+
+    await asyncio.gather(*calls)
+    with pytest.raises(asyncio.TimeoutError):
+        await queued
+    # Release is scheduled from the worker thread
+    await asyncio.sleep(0.01)
+    assert not any(key.startswith("sbx-idle") for key in executor._semaphores)
+    assert not any(key.startswith("sbx-idle") for key in executor._semaphore_users)
+
+
+@pytest.mark.asyncio
+async def test_sandbox_tools_set_up_off_the_event_loop(local_sandbox, monkeypatch):
+    from agent.tools.sb_files_tool import SandboxFilesTool
+    from agent.tools.sb_shell_tool import SandboxShellTool
+    from sandbox.sandbox import SandboxToolsBase
+
+    loop_thread = threading.get_ident()
+    calls = []
+    upload_file = local_sandbox.fs.upload_file
+    monkeypatch.setattr(local_sandbox.fs, "create_folder", lambda path, mode=None: calls.append(threading.get_ident()))
+    monkeypatch.setattr(local_sandbox.fs, "upload_file", lambda content, path: calls.append(threading.get_ident()) or upload_file(content, path))
+    monkeypatch.setattr(local_sandbox.process, "exec", lambda *a, **k: calls.append(threading.get_ident()))
+    local_sandbox.get_preview_link = lambda port: calls.append(threading.get_ident()) or SimpleNamespace(url=f"https://{port}.preview")
+
+    # Constructing tools makes no SDK calls
+    SandboxShellTool(local_sandbox)
+    SandboxFilesTool(local_sandbox)
+    assert calls == []
+
+    await SandboxToolsBase.prepare(local_sandbox)
+    assert calls and loop_thread not in calls
+    assert "sbx-local" in SandboxToolsBase._workspace_ensured
+
+    # The workspace is set up once per sandbox and preview URLs are cached
+    calls.clear()
+    await SandboxToolsBase.prepare(local_sandbox)
+    assert calls == []
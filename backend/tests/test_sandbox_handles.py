@@ -0,0 +1,133 @@
+"""
+Tests for the per-process sandbox handle cache behind get_or_start_sandbox.
+
+Requests for a sandbox reuse its handle for a short TTL, concurrent requests
+share a single lookup, and the cache is dropped when the sandbox goes away.
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from sandbox import sandbox as sandbox_module
+from sandbox.sandbox import get_or_start_sandbox, invalidate_sandbox_handle
+
+
+class FakeDaytona:
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.state = "started"
+        self.full_lookups = 0
+        self.state_checks = 0
+        self._lock = threading.Lock()
+
+    def get_or_start(self, sandbox_id):
+        with self._lock:
+            self.full_lookups += 1
+        time.sleep(self.delay)
+        return SimpleNamespace(id=sandbox_id, state="started")
+
+    def get(self, sandbox_id):
+        with self._lock:
+            self.state_checks += 1
+        return SimpleNamespace(id=sandbox_id, state=self.state)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeDaytona()
+    monkeypatch.setattr(sandbox_module, "_get_or_start_sandbox_sync", fake.get_or_start)
+    monkeypatch.setattr(sandbox_module, "_get_sandbox_by_id", fake.get)
+    monkeypatch.setattr(sandbox_module, "_handles", type(sandbox_module._handles)())
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_lookup(fake):
+    handles = await asyncio.gather(*[get_or_start_sandbox("sbx-1") for _ in range(20)])
+    assert fake.full_lookups == 1
+    assert all(h is handles[0] for h in handles)
+
+    # Cached within the TTL
+    assert await get_or_start_sandbox("sbx-1") is handles[0]
+    assert fake.full_lookups == 1 and fake.state_checks == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_handle_is_rechecked(fake, monkeypatch):
+    monkeypatch.setattr(sandbox_module, "SANDBOX_HANDLE_TTL", 0)
+    await get_or_start_sandbox("sbx-2")
+
+    # Still running: a state check only, no start or workspace setup
+    await get_or_start_sandbox("sbx-2")
+    assert fake.full_lookups == 1 and fake.state_checks == 1
+
+    # Stopped meanwhile: goes through the start path again
+    fake.state = "stopped"
+    await get_or_start_sandbox("sbx-2")
+    assert fake.full_lookups == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_forces_a_new_lookup(fake):
+    await get_or_start_sandbox("sbx-3")
+    invalidate_sandbox_handle("sbx-3")
+    await get_or_start_sandbox("sbx-3")
+    assert fake.full_lookups == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_lookup(fake):
+    first = asyncio.create_task(get_or_start_sandbox("sbx-4"))
+    second = asyncio.create_task(get_or_start_sandbox("sbx-4"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    handle = await second
+    assert handle.id == "sbx-4"
+    assert fake.full_lookups == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_lookup_is_not_overwritten(fake):
+    stale = asyncio.create_task(get_or_start_sandbox("sbx-5"))
+    await asyncio.sleep(0.01)
+    invalidate_sandbox_handle("sbx-5")
+    await stale
+
+    # The stale result was not cached, and the next call does its own lookup
+    assert "sbx-5" not in sandbox_module._handles
+    await get_or_start_sandbox("sbx-5")
+    assert fake.full_lookups == 2
+    assert "sbx-5" in sandbox_module._handles
+
+
+@pytest.mark.asyncio
+async def test_refresh_rechecks_the_state_of_a_cached_handle(fake):
+    await get_or_start_sandbox("sbx-4")
+    await get_or_start_sandbox("sbx-4", refresh=True)
+    assert fake.full_lookups == 1 and fake.state_checks == 1
+
+
+class DaytonaConnectionError(Exception):
+    pass
+
+
+class SdkError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def test_only_unavailable_sandbox_errors_invalidate_handles():
+    from sandbox.sandbox import is_sandbox_unavailable_error
+
+    for error in (ConnectionError("reset"), asyncio.TimeoutError(), DaytonaConnectionError("dropped"),
+                  SdkError("bad gateway", 502), SdkError("Sandbox is not running"),
+                  SdkError("Sandbox with ID sbx-1 not found", 404)):
+        assert is_sandbox_unavailable_error(error), error
+    for error in (FileNotFoundError("workspace/missing.txt"), SdkError("File not found", 404),
+                  SdkError("invalid file path", 400), ValueError("bad path")):
+        assert not is_sandbox_unavailable_error(error), error
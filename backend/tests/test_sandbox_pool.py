@@ -0,0 +1,131 @@
+"""
+Tests for the elastic warm sandbox pool.
+
+The pool grows with the acquisition rate within its bounds, creates sandboxes
+concurrently off the event loop, never hands out a dead sandbox and reports
+hits and misses.
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from sandbox import pool as pool_module
+from sandbox.pool import SandboxPool
+
+
+class FakeProvider:
+    def __init__(self, create_delay=0.05):
+        self.create_delay = create_delay
+        self.states = {}
+        self.deleted = []
+        self.creating = 0
+        self.max_creating = 0
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def create(self, password):
+        with self._lock:
+            self._count += 1
+            sandbox_id = f"sbx-{self._count}"
+            self.creating += 1
+            self.max_creating = max(self.max_creating, self.creating)
+        try:
+            time.sleep(self.create_delay)
+        finally:
+            with self._lock:
+                self.creating -= 1
+        self.states[sandbox_id] = "started"
+        return SimpleNamespace(id=sandbox_id)
+
+    def get(self, sandbox_id):
+        if sandbox_id not in self.states:
+            raise KeyError(sandbox_id)
+        return SimpleNamespace(id=sandbox_id, state=self.states[sandbox_id])
+
+    def delete(self, sandbox_id):
+        self.deleted.append(sandbox_id)
+        self.states.pop(sandbox_id, None)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setattr(pool_module, "create_sandbox", provider.create)
+    monkeypatch.setattr(pool_module, "ensure_workspace_dir_sdk", lambda sb: None)
+    monkeypatch.setattr(pool_module, "_get_sandbox_by_id", provider.get)
+    monkeypatch.setattr(pool_module, "_delete_sandbox_by_id", provider.delete)
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_pool_grows_with_demand_within_bounds(provider):
+    pool = SandboxPool(min_size=1, max_size=3, window=10.0, create_concurrency=3)
+    assert pool.target_size == 1
+
+    # 5 acquisitions in 10 s with 4 s per creation: 2 expected while one is created
+    pool._create_seconds = 4.0
+    for _ in range(5):
+        pool._acquisitions.append(time.monotonic())
+    assert pool.target_size == 2
+    for _ in range(20):
+        pool._acquisitions.append(time.monotonic())
+    assert pool.target_size == 3
+
+    await pool._fill_to_target()
+    await asyncio.sleep(0.2)
+    assert len(pool._available) == 3
+    # Created concurrently on the executor
+    assert provider.max_creating == 3
+
+
+@pytest.mark.asyncio
+async def test_dead_sandboxes_are_not_handed_out(provider):
+    pool = SandboxPool(min_size=2, max_size=2, health_check_interval=0)
+    await pool._fill_to_target()
+    await asyncio.sleep(0.2)
+    first, second = [idle.sandbox for idle in pool._available]
+    provider.states[first.id] = "stopped"
+
+    sandbox = await pool.acquire()
+    await asyncio.sleep(0.05)
+    assert sandbox is second
+    assert provider.deleted == [first.id]
+
+    stats = pool.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 0 and stats["evicted"] == 1
+
+    # Empty pool: created on demand and counted as a miss
+    await pool.acquire()
+    assert pool.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_release_deletes_extras(provider):
+    pool = SandboxPool(min_size=0, max_size=1)
+    sandbox = await pool.acquire()
+    pool._acquisitions.clear()
+    await pool.release(sandbox)
+    await asyncio.sleep(0.05)
+    assert provider.deleted == [sandbox.id]
+    assert not pool._available
+
+
+@pytest.mark.asyncio
+async def test_miss_does_not_wait_behind_background_fills(provider):
+    provider.create_delay = 0.3
+    pool = SandboxPool(min_size=2, max_size=2, create_concurrency=2)
+    await pool._fill_to_target()
+    await asyncio.sleep(0.05)
+    # Both creation slots are taken by the fills, which are tracked until done
+    assert len(pool._background) == 2
+
+    started = time.monotonic()
+    await pool.acquire()
+    assert time.monotonic() - started < 0.5
+    assert provider.max_creating == 3
+    await asyncio.sleep(0.3)
+    assert not pool._background
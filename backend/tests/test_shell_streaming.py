@@ -0,0 +1,87 @@
+"""
+Tests for streamed and background commands in SandboxShellTool.
+
+Commands run in a local shell standing in for the sandbox: output goes to a
+log file under the home directory and is read back by byte offset.
+"""
+
+import json
+import os
+
+import pytest
+
+from agent.tools import sb_shell_tool
+from agent.tools.sb_shell_tool import SandboxShellTool
+from agentpress.tool import set_progress_sink
+
+
+@pytest.fixture
+def tool(local_sandbox, monkeypatch):
+    monkeypatch.setattr(sb_shell_tool, "SHELL_POLL_INTERVAL", 0.1)
+    return SandboxShellTool(local_sandbox)
+
+
+@pytest.mark.asyncio
+async def test_output_is_streamed_as_progress(tool):
+    updates = []
+    set_progress_sink(updates.append)
+    try:
+        result = await tool.execute_command("for i in 1 2 3; do echo step $i; sleep 0.3; done", timeout=10)
+    finally:
+        set_progress_sink(None)
+
+    assert result.success
+    assert json.loads(result.output) == {"output": "step 1\nstep 2\nstep 3\n", "exit_code": 0}
+    # Delivered in pieces while the command ran, each piece once
+    assert len(updates) >= 2
+    assert "".join(u["output"] for u in updates) == "step 1\nstep 2\nstep 3\n"
+
+
+@pytest.mark.asyncio
+async def test_background_command_can_be_polled_and_waited_on(tool):
+    started = await tool.execute_command("echo first; sleep 0.5; echo second; exit 3", background=True)
+    info = json.loads(started.output)
+    assert info["status"] == "running"
+    command_id = info["command_id"]
+
+    done = json.loads((await tool.check_command_output(command_id, wait=10)).output)
+    assert done["status"] == "completed" and done["exit_code"] == 3
+    assert done["output"] == "first\nsecond\n"
+
+    # Byte offsets page through the log
+    page = json.loads((await tool.check_command_output(command_id, offset=6)).output)
+    assert page["output"] == "second\n" and page["next_offset"] == page["size"] == 13
+
+    assert not (await tool.check_command_output("nope")).success
+
+
+@pytest.mark.asyncio
+async def test_large_output_is_capped_and_kept_in_the_log(tool, monkeypatch):
+    monkeypatch.setattr(sb_shell_tool, "SHELL_OUTPUT_MAX_BYTES", 100)
+    result = await tool.execute_command("seq 1 1000", timeout=10)
+    output = json.loads(result.output)["output"]
+    assert output.endswith("999\n1000\n")
+    assert "earlier bytes omitted" in output and len(output) < 200
+
+    log_dir = os.path.join(tool.sandbox.process.home, "workspace", ".iris", "logs")
+    (log_name,) = [name for name in os.listdir(log_dir) if name.endswith(".log")]
+    with open(os.path.join(log_dir, log_name)) as f:
+        assert f.read() == "".join(f"{i}\n" for i in range(1, 1001))
+
+
+@pytest.mark.asyncio
+async def test_foreground_timeout_leaves_command_running(tool):
+    result = await tool.execute_command("sleep 5", timeout=1)
+    assert not result.success
+    assert "still running" in result.output
+    command_id = next(iter(tool._commands))
+    status = json.loads((await tool.check_command_output(command_id)).output)
+    assert status["status"] == "running"
+
+    # The next command gets a new default session rather than queueing behind it
+    timed_out_session = tool._commands[command_id]["session_id"]
+    assert "default" not in tool._sessions
+    assert tool._sessions[f"bg-{command_id}"] == timed_out_session
+    result = await tool.execute_command("echo next", timeout=10)
+    assert json.loads(result.output)["output"] == "next\n"
+    assert tool._sessions["default"] != timed_out_session
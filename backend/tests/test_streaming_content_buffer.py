@@ -0,0 +1,122 @@
+"""
+Tests for the streamed assistant content buffer.
+
+Appends must report where each delta starts without copying earlier text, and
+when the XML tool-call limit cuts a response short, the saved message must end
+exactly at the last processed tool call, however the stream was split and
+whatever reasoning text was interleaved with it.
+"""
+
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from agentpress.response_processor import ProcessorConfig, ResponseProcessor, StreamingContentBuffer
+from agentpress.tool import ToolSchema, SchemaType, XMLTagSchema
+
+
+def test_append_reports_offsets_and_joins_once():
+    buffer = StreamingContentBuffer()
+    assert not buffer and len(buffer) == 0 and buffer.getvalue() == ""
+
+    assert buffer.append("Hello") == 0
+    assert buffer.append("") == 5
+    assert buffer.append(", world") == 5
+    assert buffer and len(buffer) == 12
+    assert buffer.getvalue() == "Hello, world"
+    # Joined once; later reads reuse the joined text
+    assert buffer.getvalue() is buffer.getvalue()
+
+    assert buffer.append("!") == 12
+    assert buffer.getvalue() == "Hello, world!"
+
+
+def test_getvalue_truncates_at_end():
+    buffer = StreamingContentBuffer()
+    for part in ("<ask>", "one", "</ask>", " rest"):
+        buffer.append(part)
+    buffer.mark_tool_chunk_end(len("<ask>one</ask>"))
+    assert buffer.tool_chunk_ends == [14]
+    assert buffer.getvalue(end=buffer.tool_chunk_ends[-1]) == "<ask>one</ask>"
+    assert buffer.getvalue(end=100) == "<ask>one</ask> rest"
+    assert buffer.getvalue(end=-1) == ""
+    # Truncating does not lose the rest
+    assert len(buffer) == 19 and buffer.getvalue() == "<ask>one</ask> rest"
+
+
+class AskRegistry:
+    """Registry knowing only the ask tool, enough to parse <ask> calls."""
+
+    def get_xml_tool(self, tag_name):
+        if tag_name != "ask":
+            return None
+        xml_schema = XMLTagSchema(tag_name="ask")
+        xml_schema.add_mapping("text", node_type="content", path=".")
+        return {"method": "ask", "schema": ToolSchema(schema_type=SchemaType.XML, schema={}, xml_schema=xml_schema)}
+
+
+def _delta(content=None, reasoning=None):
+    delta = SimpleNamespace(content=content, reasoning_content=reasoning, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)])
+
+
+async def _stream(deltas):
+    for delta in deltas:
+        yield delta
+
+
+async def _saved_content(deltas, max_xml_tool_calls):
+    saved = []
+
+    async def add_message(thread_id, type, content, is_llm_message=False, metadata=None):
+        message = {"message_id": f"m{len(saved)}", "thread_id": thread_id, "type": type, "content": content}
+        saved.append(message)
+        return message
+
+    processor = ResponseProcessor(AskRegistry(), add_message)
+    config = ProcessorConfig(xml_tool_calling=True, execute_tools=False, max_xml_tool_calls=max_xml_tool_calls)
+    async for _ in processor.process_streaming_response(_stream(deltas), "thread-1", [], "test-model", config):
+        pass
+    assistant = [m for m in saved if m["type"] == "assistant"]
+    assert len(assistant) == 1
+    return assistant[0]["content"]["content"]
+
+
+@pytest.mark.asyncio
+async def test_content_is_cut_at_the_last_tool_call_within_the_limit():
+    deltas = [
+        _delta(reasoning="Thinking it over. "),
+        _delta("Plan: <ask>fir"),
+        _delta("st</ask> then <ask>sec"),
+        _delta(reasoning="Still thinking. "),
+        _delta("ond</ask> and <ask>third</ask> tail"),
+    ]
+    # Reasoning is saved with the content but never scanned for tool calls
+    assert await _saved_content(deltas, 1) == "Thinking it over. Plan: <ask>first</ask>"
+    assert await _saved_content(deltas, 2) == (
+        "Thinking it over. Plan: <ask>first</ask> then <ask>sec" "Still thinking. " "ond</ask>"
+    )
+    # Without a limit nothing is cut
+    assert (await _saved_content(deltas, 0)).endswith("<ask>third</ask> tail")
+
+
+@pytest.mark.asyncio
+async def test_cut_offset_does_not_depend_on_how_the_stream_is_split():
+    content = "Intro <ask>one</ask> middle <ask>two</ask> trailing text <ask>three</ask>"
+    expected = content[:content.index("</ask>", content.index("two")) + len("</ask>")]
+    rng = random.Random(3)
+
+    for _ in range(25):
+        deltas = []
+        pos = 0
+        while pos < len(content):
+            size = rng.randint(1, 9)
+            deltas.append(_delta(content[pos:pos + size]))
+            if rng.random() < 0.2:
+                deltas.append(_delta(reasoning="~"))
+            pos += size
+        saved = await _saved_content(deltas, 2)
+        # Reasoning deltas are interleaved, so compare the content with them taken out
+        assert saved.replace("~", "") == expected
@@ -0,0 +1,142 @@
+"""
+Tests and micro-benchmark for the incremental streaming XML tool-call scanner.
+
+The scanner must detect exactly the chunks XMLToolParser.extract_xml_chunks finds
+in the full text, regardless of how the stream is split into deltas, and the cost
+of feeding a delta must not grow with the amount of text already streamed.
+"""
+
+import random
+import sys
+import time
+
+from agentpress.xml_parser import StreamingXMLScanner, XMLToolParser
+
+SAMPLE_CONTENT = """
+Let me create the file first.
+<create-file file_path="src/app.py">print('hello')</create-file>
+Now run it:
+<execute-command>python src/app.py</execute-command>
+Replace a line:
+<str-replace file_path="src/app.py"><old_str>hello</old_str><new_str>world</new_str></str-replace>
+Nested asks are matched as a whole: <ask>outer <ask>inner</ask> done</ask>
+Self closing: <ask attachments="a.txt"/>
+Not a tool tag: <asking>ignored</asking>
+Unterminated at the end: <ask>still typing
+"""
+
+
+def _stream(scanner, content, sizes):
+    """Feed content to the scanner in deltas of the given sizes, collecting chunks."""
+    chunks = []
+    pos = 0
+    i = 0
+    while pos < len(content):
+        size = sizes[i % len(sizes)]
+        chunks.extend(scanner.feed(content[pos:pos + size]))
+        pos += size
+        i += 1
+    return chunks
+
+
+def _build_stream(total_bytes=200 * 1024, tool_calls=12):
+    """Build a synthetic assistant turn with prose and large create-file calls."""
+    segment = total_bytes // (tool_calls * 2)
+    prose_line = "The quick brown fox explains the plan in <b>some</b> detail.\n"
+    code_line = "def handler(request):  # if a < b and b > c: return '<div>'\n"
+    parts = []
+    for i in range(tool_calls):
+        parts.append((prose_line * (segment // len(prose_line) + 1))[:segment])
+        body = (code_line * (segment // len(code_line) + 1))[:segment]
+        parts.append(f'<create-file file_path="src/module_{i}.py">{body}</create-file>')
+    return "".join(parts)
+
+
+def test_scanner_matches_full_text_extraction():
+    """Chunks match XMLToolParser.extract_xml_chunks for every delta split."""
+    expected = XMLToolParser().extract_xml_chunks(SAMPLE_CONTENT)
+    # extract_xml_chunks matches tag prefixes; the scanner requires a tag boundary
+    expected = [c for c in expected if not c.startswith("<asking")]
+    rng = random.Random(7)
+
+    for _ in range(200):
+        scanner = StreamingXMLScanner()
+        sizes = [rng.randint(1, 12) for _ in range(32)]
+        chunks = _stream(scanner, SAMPLE_CONTENT, sizes)
+        assert [c.xml_content for c in chunks] == expected
+        for chunk in chunks:
+            assert SAMPLE_CONTENT[chunk.start:chunk.end] == chunk.xml_content
+        assert scanner.in_tool_call
+        assert scanner.pending_text().startswith("<ask>still typing")
+
+
+def test_scanner_drops_text_outside_tool_calls():
+    """Only a short possible-tag tail is retained between tool calls."""
+    scanner = StreamingXMLScanner()
+    scanner.feed("plain prose " * 1000)
+    assert scanner.pending_text() == ""
+    scanner.feed("more prose <execute-comm")
+    assert scanner.pending_text() == "<execute-comm"
+    chunks = scanner.feed("and>ls</execute-command> trailing")
+    assert [c.tag_name for c in chunks] == ["execute-command"]
+    assert scanner.pending_text() == ""
+    assert scanner.consumed == len("plain prose " * 1000) + len("more prose <execute-comm") + len("and>ls</execute-command> trailing")
+
+
+def test_scanner_custom_tags():
+    """Only the configured tags are detected."""
+    scanner = StreamingXMLScanner(["complete"])
+    chunks = scanner.feed("<ask>no</ask><complete></complete>")
+    assert [c.xml_content for c in chunks] == ["<complete></complete>"]
+
+
+def benchmark_per_delta_cost(delta_size=20, buckets=10, repeats=3):
+    """Return per-bucket feed timings (seconds) over the synthetic 200 KB stream."""
+    content = _build_stream()
+    deltas = [content[i:i + delta_size] for i in range(0, len(content), delta_size)]
+    bucket_len = len(deltas) // buckets
+    best = [float("inf")] * buckets
+    chunk_count = 0
+
+    for _ in range(repeats):
+        scanner = StreamingXMLScanner()
+        chunk_count = 0
+        for b in range(buckets):
+            start = time.perf_counter()
+            for delta in deltas[b * bucket_len:(b + 1) * bucket_len]:
+                chunk_count += len(scanner.feed(delta))
+            best[b] = min(best[b], time.perf_counter() - start)
+        for delta in deltas[buckets * bucket_len:]:
+            chunk_count += len(scanner.feed(delta))
+
+    return content, deltas, best, chunk_count
+
+
+def test_per_delta_cost_stays_flat():
+    """Late deltas in a 200 KB stream cost about the same as early ones."""
+    content, deltas, timings, chunk_count = benchmark_per_delta_cost()
+    assert len(content) >= 200 * 1024 - 100
+    assert chunk_count == 12
+
+    ordered = sorted(timings)
+    median = ordered[len(ordered) // 2]
+    # Quadratic rescanning would make the last bucket many times slower than the first
+    assert timings[-1] <= max(4 * median, 0.005), timings
+    assert max(timings) <= max(6 * median, 0.01), timings
+
+
+if __name__ == "__main__":
+    content, deltas, timings, chunk_count = benchmark_per_delta_cost()
+    per_delta_us = [t / (len(deltas) // len(timings)) * 1e6 for t in timings]
+    print(f"Stream: {len(content) / 1024:.0f} KB, {len(deltas)} deltas, {chunk_count} tool calls")
+    print("Per-delta cost by stream decile (us): " + ", ".join(f"{t:.2f}" for t in per_delta_us))
+    try:
+        test_scanner_matches_full_text_extraction()
+        test_scanner_drops_text_outside_tool_calls()
+        test_scanner_custom_tags()
+        test_per_delta_cost_stays_flat()
+        print("✅ All streaming scanner tests passed")
+        sys.exit(0)
+    except AssertionError as e:
+        print(f"❌ Test failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,65 @@
+"""
+Tests for the cached final system prompt built by ThreadManager.
+
+The prompt with XML tool examples must be built once per tool registry version
+and be byte-identical across turns so provider-side prompt caching can hit.
+"""
+
+from agentpress.thread_manager import ThreadManager
+from agentpress.tool import Tool, xml_schema
+
+
+class PromptCacheProbeTool(Tool):
+    @xml_schema(tag_name="prompt-cache-probe", example="<prompt-cache-probe>hi</prompt-cache-probe>")
+    async def prompt_cache_probe(self, text: str):
+        return self.success_response(text)
+
+
+class PromptCacheExtraTool(Tool):
+    @xml_schema(tag_name="prompt-cache-extra", example="<prompt-cache-extra>more</prompt-cache-extra>")
+    async def prompt_cache_extra(self, text: str):
+        return self.success_response(text)
+
+
+def test_system_prompt_is_built_once_per_registry_version():
+    """Later turns and later runs reuse the same prompt object."""
+    base_prompt = {"role": "system", "content": "You are a test agent."}
+
+    manager = ThreadManager(write_behind=False, cache_messages=False)
+    manager.add_tool(PromptCacheProbeTool)
+    first = manager.build_system_prompt(base_prompt, include_xml_examples=True)
+    assert "<prompt-cache-probe> Example:" in first["content"]
+    assert base_prompt["content"] == "You are a test agent."
+    assert manager.build_system_prompt(base_prompt, include_xml_examples=True) is first
+
+    # A new run registers the same tool again with a new instance
+    version = manager.tool_registry.version
+    other_run = ThreadManager(write_behind=False, cache_messages=False)
+    other_run.add_tool(PromptCacheProbeTool)
+    assert other_run.tool_registry.version == version
+    assert other_run.build_system_prompt(dict(base_prompt), include_xml_examples=True) is first
+
+    # Registering a new tool changes the examples
+    other_run.add_tool(PromptCacheExtraTool)
+    updated = other_run.build_system_prompt(base_prompt, include_xml_examples=True)
+    assert updated is not first
+    assert "<prompt-cache-extra> Example:" in updated["content"]
+
+
+def test_system_prompt_without_examples_is_unchanged():
+    base_prompt = {"role": "system", "content": [{"type": "text", "text": "Base"}]}
+    manager = ThreadManager(write_behind=False, cache_messages=False)
+    prompt = manager.build_system_prompt(base_prompt, include_xml_examples=False)
+    assert prompt == base_prompt
+
+
+def test_examples_block_matches_the_uncached_format():
+    """The cached prompt carries the same header and example lines run_thread used to build."""
+    base_prompt = {"role": "system", "content": "Base"}
+    manager = ThreadManager(write_behind=False, cache_messages=False)
+    manager.add_tool(PromptCacheProbeTool)
+    content = manager.build_system_prompt(base_prompt, include_xml_examples=True)["content"]
+
+    assert content.startswith("Base\n--- XML TOOL CALLING ---\n\nIn this environment")
+    assert "regular expressions.\n\nHere are the XML tools available with examples:\n<" in content
+    assert "<prompt-cache-probe> Example: <prompt-cache-probe>hi</prompt-cache-probe>\\n" in content
@@ -0,0 +1,109 @@
+"""
+Tests for the tool result cache and the cached_result decorator.
+"""
+
+import pytest
+
+from agentpress import tool_cache
+from agentpress.tool import Tool, ToolResult, cached_result, openapi_schema
+from agentpress.tool_cache import ToolResultCache, cache_key
+
+
+class CountingTool(Tool):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    @cached_result(ttl=60)
+    @openapi_schema({"type": "function", "function": {"name": "search", "parameters": {}}})
+    async def search(self, query: str, limit: int = 10, payload: str = "{}") -> ToolResult:
+        self.calls += 1
+        if query == "fail":
+            return self.fail_response("upstream error")
+        return self.success_response(f"{query}:{limit}:{self.calls}")
+
+    @cached_result(ttl=60, cacheable=lambda result: "error" not in result.output)
+    async def fan_out(self, queries: str) -> ToolResult:
+        self.calls += 1
+        return self.success_response([{"error": "timeout"} if q == "slow" else {"q": q} for q in queries.split(",")])
+
+    @cached_result(ttl=60, max_bytes=10)
+    async def big(self, size: int) -> ToolResult:
+        self.calls += 1
+        return self.success_response("x" * size)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ToolResultCache(max_entries=3, use_redis=False)
+    monkeypatch.setattr(tool_cache, "_cache", cache)
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_hit_the_cache(cache):
+    tool = CountingTool()
+    first = await tool.search("iris", limit=5)
+    # Same call as XML would make it: string arguments, reordered JSON, extra whitespace
+    again = await tool.search(" iris ", "5")
+    assert again.output == first.output and tool.calls == 1
+    await tool.search("iris", 5, payload='{"b": 1, "a": 2}')
+    await tool.search("iris", 5, payload='{ "a": 2, "b": 1 }')
+    assert tool.calls == 2
+
+    # Schemas are still registered on the wrapped method
+    assert "search" in tool.get_schemas()
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_and_oversized_results_are_not_cached(cache):
+    tool = CountingTool()
+    await tool.search("fail")
+    await tool.search("fail")
+    assert tool.calls == 2
+
+    await tool.big(100)
+    await tool.big(100)
+    assert tool.calls == 4 and cache.stats()["oversized"] == 2
+
+    # Results with a failed item are retried rather than served from the cache
+    await tool.fan_out("a,slow")
+    await tool.fan_out("a,slow")
+    await tool.fan_out("a,b")
+    await tool.fan_out("a,b")
+    assert tool.calls == 7
+
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_are_evicted_lru(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tool_cache.time, "time", lambda: now[0])
+    await cache.put("a", "A", ttl=10)
+    await cache.put("b", "B", ttl=100)
+    await cache.put("c", "C", ttl=100)
+    assert await cache.get("a") == "A"
+    await cache.put("d", "D", ttl=100)
+    # "b" was least recently used
+    assert await cache.get("b") is None
+    now[0] += 20
+    assert await cache.get("a") is None
+    assert await cache.get("c") == "C"
+
+
+def test_keys_depend_on_tool_and_arguments():
+    assert cache_key("T.search", {"q": "a"}) == cache_key("T.search", {"q": "a "})
+    assert cache_key("T.search", {"q": "a"}) != cache_key("T.crawl", {"q": "a"})
+    assert cache_key("T.search", {"q": "a"}) != cache_key("T.search", {"q": "b"})
+    # Numbers only when they read back the same: leading zeros are significant
+    assert cache_key("T.search", {"limit": "5"}) == cache_key("T.search", {"limit": 5})
+    assert cache_key("T.search", {"zip": "02134"}) != cache_key("T.search", {"zip": 2134})
+    assert cache_key("T.search", {"code": "007"}) != cache_key("T.search", {"code": "7"})
+
+
+def test_data_provider_results_with_failed_calls_are_not_cacheable():
+    from agent.tools.data_providers_tool import _no_failed_calls
+
+    assert _no_failed_calls(ToolResult(success=True, output='[{"name": "a"}, {"name": "b"}]'))
+    assert not _no_failed_calls(ToolResult(success=True, output='[{"name": "a"}, {"error": "timeout"}]'))
+    assert _no_failed_calls(ToolResult(success=True, output="plain text"))
@@ -0,0 +1,138 @@
+"""
+Tests for the per-user Supabase client cache in services.db.
+
+A local HTTP server stands in for PostgREST: it records the Authorization
+header of every request.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "service-key")
+
+from services import db  # noqa: E402
+
+
+def make_token(user_id, expires_in=3600, **claims):
+    return jwt.encode({"sub": user_id, "exp": int(time.time() + expires_in), **claims}, "secret", algorithm="HS256")
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.authorizations = []
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with state.lock:
+                state.authorizations.append(self.headers.get("Authorization"))
+            data = json.dumps([]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    state = StubState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(db, "SUPABASE_URL", f"http://127.0.0.1:{server.server_port}")
+    # The SDK checks that keys look like JWTs
+    monkeypatch.setattr(db, "ANON_KEY", jwt.encode({"role": "anon"}, "secret", algorithm="HS256"))
+    monkeypatch.setattr(db, "_user_clients", db.OrderedDict())
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_clients_are_cached_per_token(postgrest):
+    try:
+        alice, bob = make_token("alice"), make_token("bob")
+        client = await db.client_for_user(alice)
+        assert await db.client_for_user(alice) is client
+        await client.table("threads").select("*").execute()
+        await (await db.client_for_user(bob)).table("threads").select("*").execute()
+        await (await db.client_for_user()).table("threads").select("*").execute()
+
+        # Each request carried its own user's token
+        assert postgrest.authorizations == [f"Bearer {alice}", f"Bearer {bob}", f"Bearer {db.ANON_KEY}"]
+
+        # Another token claiming alice's sub, even an older one, gets its own client
+        forged = make_token("alice", expires_in=60, role="attacker")
+        other = await db.client_for_user(forged)
+        assert other is not client
+        await other.table("threads").select("*").execute()
+        await client.table("threads").select("*").execute()
+        assert postgrest.authorizations[-2:] == [f"Bearer {forged}", f"Bearer {alice}"]
+
+        # All of them share one connection pool
+        assert client.postgrest.session is other.postgrest.session is db._shared_http_client
+    finally:
+        await db.close_user_clients()
+    assert client.postgrest.session.is_closed and db._shared_http_client is None
+
+
+@pytest.mark.asyncio
+async def test_clients_expire_with_the_token_and_are_evicted_lru(postgrest, monkeypatch):
+    monkeypatch.setattr(db, "USER_CLIENT_CACHE_SIZE", 2)
+    try:
+        carol = make_token("carol")
+        expiring = await db.client_for_user(make_token("carol", expires_in=-1))
+        fresh = await db.client_for_user(carol)
+        assert fresh is not expiring
+
+        dave_token = make_token("dave")
+        dave = await db.client_for_user(dave_token)
+        await db.client_for_user(make_token("erin"))
+        # carol's client was least recently used and is dropped
+        assert len(db._user_clients) == 2 and carol not in db._user_clients
+        # A request that still holds a dropped client can finish
+        await fresh.table("threads").select("*").execute()
+        await dave.table("threads").select("*").execute()
+        assert postgrest.authorizations == [f"Bearer {carol}", f"Bearer {dave_token}"]
+    finally:
+        await db.close_user_clients()
+    assert not db._user_clients
+
+
+@pytest.mark.asyncio
+async def test_without_shared_pool_dropped_clients_are_closed_later(postgrest, monkeypatch):
+    monkeypatch.setattr(db, "_shared_pool_supported", lambda: False)
+    monkeypatch.setattr(db, "USER_CLIENT_CACHE_SIZE", 1)
+    monkeypatch.setattr(db, "USER_CLIENT_CLOSE_DELAY", 0.05)
+    try:
+        first = await db.client_for_user(make_token("frank"))
+        second = await db.client_for_user(make_token("grace"))
+        assert first.postgrest.session is not second.postgrest.session
+        assert not first.postgrest.session.is_closed
+        await first.table("threads").select("*").execute()
+
+        await asyncio.sleep(0.1)
+        assert first.postgrest.session.is_closed
+        assert not second.postgrest.session.is_closed
+    finally:
+        await db.close_user_clients()
+    assert second.postgrest.session.is_closed
@@ -0,0 +1,143 @@
+"""
+Tests for crawl_webpage over the shared crawl client.
+
+A local HTTP server stands in for the Tavily extract endpoint: it echoes the
+requested URL back as an extract result and tracks how many requests are in
+flight and how many connections were opened.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agentpress import tool_cache
+from agentpress.tool_cache import ToolResultCache
+from agent.tools import web_search_tool
+from agent.tools.web_search_tool import WebSearchTool, close_crawl_client
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0.0
+        self.page_size = 100
+        self.failing = set()
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            url = json.loads(self.rfile.read(length))["urls"]
+            with state.lock:
+                state.requests += 1
+                state.connections.add(self.client_address)
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                time.sleep(state.delay)
+                status = 500 if url in state.failing else 200
+                data = json.dumps({"results": [{
+                    "url": url,
+                    "title": f"Title of {url}",
+                    "raw_content": "é\"x" * state.page_size,
+                }]}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+    return Handler
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    state = StubState()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(tool_cache, "_cache", ToolResultCache(use_redis=False))
+    monkeypatch.setattr(web_search_tool, "TAVILY_EXTRACT_URL", f"http://127.0.0.1:{server.server_port}/extract")
+    yield state, WebSearchTool(api_key="test-key")
+    server.shutdown()
+    server.server_close()
+
+
+def _results(result):
+    assert result.success, result.output
+    return json.loads(result.output)
+
+
+@pytest.mark.asyncio
+async def test_single_url_reuses_pooled_connection(stub):
+    state, tool = stub
+    try:
+        pages = _results(await tool.crawl_webpage("example.com/a"))
+        assert pages == [{
+            "Title": "Title of https://example.com/a",
+            "URL": "https://example.com/a",
+            "Text": "é\"x" * 100,
+        }]
+        await tool.crawl_webpage("https://example.com/b")
+        assert state.requests == 2 and len(state.connections) == 1
+    finally:
+        await close_crawl_client()
+
+
+@pytest.mark.asyncio
+async def test_multiple_urls_are_crawled_concurrently(stub, monkeypatch):
+    state, tool = stub
+    monkeypatch.setattr(web_search_tool, "CRAWL_CONCURRENCY", 3)
+    state.delay = 0.1
+    state.failing.add("https://example.com/2")
+    try:
+        urls = [f"https://example.com/{i}" for i in range(7)]
+        pages = _results(await tool.crawl_webpage("\n".join(urls)))
+        assert state.max_in_flight == 3
+        # One entry per URL, in order; the failed page is reported in place
+        assert [page["URL"] for page in pages] == urls
+        assert "Error" in pages[2] and "Text" not in pages[2]
+        assert all(page["Text"] for i, page in enumerate(pages) if i != 2)
+
+        result = await tool.crawl_webpage(" ".join(["example.com"] * 21))
+        assert not result.success
+
+        # A comma is part of a single URL
+        pages = _results(await tool.crawl_webpage("https://example.com/a,b?ids=1,2"))
+        assert [page["URL"] for page in pages] == ["https://example.com/a,b?ids=1,2"]
+    finally:
+        await close_crawl_client()
+
+
+@pytest.mark.asyncio
+async def test_large_pages_are_cut_while_streaming(stub, monkeypatch):
+    state, tool = stub
+    monkeypatch.setattr(web_search_tool, "CRAWL_MAX_BYTES", 4096)
+    state.page_size = 100_000
+    try:
+        page, = _results(await tool.crawl_webpage("https://example.com/big"))
+        assert page["Truncated"] is True
+        assert page["URL"] == "https://example.com/big"
+        assert page["Title"] == "Title of https://example.com/big"
+        assert 1000 < len(page["Text"]) < 4096
+        assert page["Text"] == ("é\"x" * 100_000)[:len(page["Text"])]
+    finally:
+        await close_crawl_client()
@@ -0,0 +1,63 @@
+"""
+Tests for the manifest-based workspace state of SandboxFilesTool.
+
+The manifest is built by one command in the sandbox (here: a local directory
+standing in for the sandbox home), and only new or changed files are downloaded.
+"""
+
+import os
+
+import pytest
+
+from agent.tools import sb_files_tool
+from agent.tools.sb_files_tool import SandboxFilesTool
+
+
+@pytest.fixture
+def tool(local_sandbox):
+    return SandboxFilesTool(local_sandbox)
+
+
+def _write(tool, rel_path, data):
+    path = os.path.join(tool.sandbox.fs.home, "workspace", rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+@pytest.mark.asyncio
+async def test_only_changed_files_are_downloaded(tool):
+    _write(tool, "index.html", b"<h1>hi</h1>")
+    _write(tool, "src/app.js", b"console.log(1)")
+    _write(tool, "node_modules/dep/index.js", b"module.exports = 1")
+    _write(tool, "logo.bin", b"\x00\xff")
+    # Background command logs and their exit codes
+    _write(tool, ".iris/logs/cmd-1.log", b"output")
+    _write(tool, ".iris/logs/cmd-1.log.exit", b"0\n")
+
+    state = await tool.get_workspace_state()
+    assert set(state) == {"index.html", "src/app.js"}
+    assert state["src/app.js"]["content"] == "console.log(1)"
+    assert len(tool.sandbox.fs.downloads) == 2
+
+    # Nothing changed: no downloads
+    assert await tool.get_workspace_state() == state
+    assert len(tool.sandbox.fs.downloads) == 2
+
+    # One file changed, one removed
+    _write(tool, "src/app.js", b"console.log(2)")
+    os.remove(os.path.join(tool.sandbox.fs.home, "workspace", "index.html"))
+    state = await tool.get_workspace_state()
+    assert set(state) == {"src/app.js"}
+    assert state["src/app.js"]["content"] == "console.log(2)"
+    assert tool.sandbox.fs.downloads[2:] == ["workspace/src/app.js"]
+
+
+@pytest.mark.asyncio
+async def test_byte_budget_limits_downloads(tool, monkeypatch):
+    monkeypatch.setattr(sb_files_tool, "WORKSPACE_STATE_MAX_FILE_BYTES", 10)
+    _write(tool, "small.txt", b"short")
+    _write(tool, "large.txt", b"x" * 100)
+
+    state = await tool.get_workspace_state()
+    assert set(state) == {"small.txt"}
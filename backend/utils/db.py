@@ -1,4 +1,4 @@
-from typing import Optional, List, Any
+from typing import Optional
 from datetime import datetime, timezone
 import logging
 
@@ -8,8 +8,7 @@ async def update_agent_run_status(
     client,
     agent_run_id: str,
     status: str,
-    error: Optional[str] = None,
-    responses: Optional[List[Any]] = None
+    error: Optional[str] = None
 ) -> bool:
     """
     Centralized function to update agent run status.
@@ -24,9 +23,6 @@ async def update_agent_run_status(
         if error:
             update_data["error"] = error
             
-        if responses:
-            update_data["responses"] = responses
-            
         # Retry up to 3 times
         for retry in range(3):
             try:
@@ -35,6 +35,8 @@ EXCLUDED_DIRS: set[str] = {
     ".mypy_cache",
     ".tox",
     ".coverage",
+    # Sandbox tool state, e.g. background command logs and exit codes
+    ".iris",
 }
 
 # File extensions to ignore (lowercased; include the leading dot)
@@ -825,6 +825,50 @@ export const createSandboxFile = async (sandboxId: string, filePath: string, con
   }
 };
 
+// Upload many files in one request; the backend extracts them in the sandbox as one archive
+export const createSandboxFiles = async (
+  sandboxId: string,
+  files: { path: string; content: string | Blob }[],
+  basePath: string = 'workspace',
+): Promise<{ created: number; paths: string[] }> => {
+  try {
+    const supabase = createClient();
+    const { data: { session } } = await supabase.auth.getSession();
+
+    const formData = new FormData();
+    formData.append('base_path', basePath);
+    for (const file of files) {
+      const blob = typeof file.content === 'string'
+        ? new Blob([file.content], { type: 'application/octet-stream' })
+        : file.content;
+      formData.append('files', blob, file.path.split('/').pop() || 'file');
+      formData.append('paths', file.path);
+    }
+
+    const headers: Record<string, string> = {};
+    if (session?.access_token) {
+      headers['Authorization'] = `Bearer ${session.access_token}`;
+    }
+
+    const response = await fetch(`${API_URL}/api/sandboxes/${sandboxId}/files/batch`, {
+      method: 'POST',
+      headers,
+      body: formData,
+    });
+
+    if (!response.ok) {
+      const errorText = await response.text().catch(() => 'No error details available');
+      console.error(`Error creating sandbox files: ${response.status} ${response.statusText}`, errorText);
+      throw new Error(`Error creating sandbox files: ${response.statusText} (${response.status})`);
+    }
+
+    return response.json();
+  } catch (error) {
+    console.error('Failed to create sandbox files:', error);
+    throw error;
+  }
+};
+
 // Fallback method for legacy support using JSON
 export const createSandboxFileJson = async (sandboxId: string, filePath: string, content: string): Promise<void> => {
   try {
@@ -936,6 +980,30 @@ export const getSandboxFileContent = async (sandboxId: string, path: string): Pr
   }
 };
 
+export const getScreenshot = async (threadId: string, sha256: string): Promise<Blob> => {
+  try {
+    const supabase = createClient();
+    const { data: { session } } = await supabase.auth.getSession();
+
+    const headers: Record<string, string> = {};
+    if (session?.access_token) {
+      headers['Authorization'] = `Bearer ${session.access_token}`;
+    }
+
+    const response = await fetch(`${API_URL}/api/threads/${threadId}/screenshots/${sha256}`, {
+      headers,
+    });
+
+    if (!response.ok) {
+      throw new Error(`Error getting screenshot: ${response.statusText} (${response.status})`);
+    }
+    return await response.blob();
+  } catch (error) {
+    console.error('Failed to get screenshot:', error);
+    throw error;
+  }
+};
+
 export const downloadSandboxFile = async (sandboxId: string, path: string): Promise<void> => {
   const content = await getSandboxFileContent(sandboxId, path);
   const filename = path.split('/').pop() || 'download';
@@ -955,6 +1023,44 @@ export const downloadSandboxFile = async (sandboxId: string, path: string): Prom
   URL.revokeObjectURL(url);
 };
 
+// Download a whole folder as one .tar.gz archive packed in the sandbox
+export const downloadSandboxFolder = async (sandboxId: string, path: string): Promise<void> => {
+  try {
+    const supabase = createClient();
+    const { data: { session } } = await supabase.auth.getSession();
+
+    const url = new URL(`${API_URL}/api/sandboxes/${sandboxId}/files/archive`);
+    url.searchParams.append('path', path);
+    url.searchParams.append('compression', 'gzip');
+
+    const headers: Record<string, string> = {};
+    if (session?.access_token) {
+      headers['Authorization'] = `Bearer ${session.access_token}`;
+    }
+
+    const response = await fetch(url.toString(), { headers });
+
+    if (!response.ok) {
+      const errorText = await response.text().catch(() => 'No error details available');
+      console.error(`Error downloading sandbox folder: ${response.status} ${response.statusText}`, errorText);
+      throw new Error(`Error downloading sandbox folder: ${response.statusText} (${response.status})`);
+    }
+
+    const blob = await response.blob();
+    const objectUrl = URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = objectUrl;
+    a.download = `${path.replace(/\/+$/, '').split('/').pop() || 'workspace'}.tar.gz`;
+    document.body.appendChild(a);
+    a.click();
+    a.remove();
+    URL.revokeObjectURL(objectUrl);
+  } catch (error) {
+    console.error('Failed to download sandbox folder:', error);
+    throw error;
+  }
+};
+
 export const updateThread = async (threadId: string, data: Partial<Thread>): Promise<Thread> => {
   const supabase = createClient();
   